@@ -0,0 +1,5 @@
+"""Benchmarks for the download engine.
+
+Each module can be run on its own, e.g. ``python -m benchmarks.bench_progress``,
+and prints its results as a single JSON object.
+"""
@@ -0,0 +1,145 @@
+"""Run the benchmark suite and write one JSON document.
+
+    python -m benchmarks                          # everything, default sizes
+    python -m benchmarks --quick -o before.json   # smaller sizes, e.g. per commit
+    python -m benchmarks history progress --profile sample
+    python -m benchmarks --quick -o after.json --compare before.json
+
+Every benchmark runs offline against the local media server (and the stub
+extractor where yt-dlp is involved). Benchmarks whose dependencies are
+missing are reported as skipped. ``--compare`` lists every number that
+changed by more than ``--threshold`` against an earlier result file.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.profiling import PROFILERS, profiler, timestamp
+
+# name: (module, full-size arguments, --quick arguments)
+SUITE = {
+    'sessions': ("benchmarks.bench_sessions", {'fetches': 50}, {'fetches': 10}),
+    'download': ("benchmarks.bench_download", {'size_mb': 64, 'connections': (1, 4), 'fetches': 20},
+                 {'size_mb': 16, 'connections': (1, 4), 'fetches': 5}),
+    'preview': ("benchmarks.bench_preview", {'rounds': 10}, {'rounds': 3}),
+    'progress': ("benchmarks.bench_progress", {'megabytes': 200}, {'megabytes': 20}),
+    'history': ("benchmarks.bench_history", {'entries': (1000, 10000, 50000)}, {'entries': (1000, 10000)}),
+    'segmented': ("benchmarks.bench_segmented", {'size_mb': 32, 'connections': (1, 4, 8)},
+                  {'size_mb': 8, 'connections': (1, 4)}),
+    'bandwidth': ("benchmarks.bench_bandwidth", {'seconds': 4.0}, {'seconds': 1.0}),
+    'retry': ("benchmarks.bench_retry", {'jobs': 12}, {'jobs': 4}),
+    'ingest': ("benchmarks.bench_ingest", {'lines': 100000}, {'lines': 10000}),
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(name, quick=False, profile=None, profile_dir="."):
+    module_name, full, small = SUITE[name]
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        return {'benchmark': name, 'skipped': f"missing dependency: {e.name}"}
+
+    capture = profiler(profile) if profile else None
+    started = time.perf_counter()
+    if capture:
+        with capture:
+            result = module.run(**(small if quick else full))
+    else:
+        result = module.run(**(small if quick else full))
+    result['wall_seconds'] = round(time.perf_counter() - started, 3)
+    if capture:
+        os.makedirs(profile_dir, exist_ok=True)
+        result['profile'] = capture.save(os.path.join(profile_dir, f"{name}-{timestamp()}"))
+    return result
+
+
+def numbers(value, path=""):
+    """``{dotted.path: number}`` for every number in a result document"""
+    if isinstance(value, bool):
+        return {}
+    if isinstance(value, (int, float)):
+        return {path: value}
+    found = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key not in ('profile', 'wall_seconds'):
+                found.update(numbers(item, f"{path}.{key}" if path else key))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            found.update(numbers(item, f"{path}[{index}]"))
+    return found
+
+
+def compare(baseline, current, threshold=0.1):
+    """Numbers that moved by more than ``threshold`` (relative) between two result documents"""
+    old, new = numbers(baseline.get('results', {})), numbers(current.get('results', {}))
+    changes = []
+    for path in sorted(old.keys() & new.keys()):
+        before, after = old[path], new[path]
+        if before == after:
+            continue
+        ratio = after / before if before else None
+        if ratio is None or abs(ratio - 1) > threshold:
+            changes.append({'metric': path, 'before': before, 'after': after,
+                            'ratio': round(ratio, 3) if ratio is not None else None})
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", metavar="NAME",
+                        help=f"benchmarks to run (default: all of {', '.join(SUITE)})")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes for a fast check")
+    parser.add_argument("-o", "--output", help="write the results here instead of stdout")
+    parser.add_argument("--profile", choices=PROFILERS,
+                        help="capture a cProfile or all-thread sampling profile of each benchmark")
+    parser.add_argument("--profile-dir", default="benchmark-profiles", help="where profiles are written")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change reported by --compare (default 0.1 = 10%%)")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in SUITE]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    document = {
+        'commit': git_commit(),
+        'date': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': args.quick,
+        'results': {},
+    }
+    for name in args.names or list(SUITE):
+        print(f"Running {name}...", file=sys.stderr)
+        document['results'][name] = run_benchmark(name, args.quick, args.profile, args.profile_dir)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            document['compared_to'] = args.compare
+            document['changes'] = compare(json.load(f), document, args.threshold)
+
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
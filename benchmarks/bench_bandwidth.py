@@ -0,0 +1,95 @@
+"""Global bandwidth limit and weighted sharing against a local server.
+
+Several downloads run at once under one :class:`BandwidthScheduler`; halfway
+through, the limit is changed live. Each job reports the throughput it got
+before and after the change, which should split the limit by weight.
+
+    python -m benchmarks.bench_bandwidth --limit 8 --weights 4 2 1 --new-limit 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.server import MediaServer
+from downloader.bandwidth import BandwidthScheduler
+from downloader.segmented import SegmentedDownload
+
+MB = 1024 * 1024
+
+
+def run(limit=8.0, weights=(4, 2, 1), new_limit=4.0, seconds=4.0, connections=2):
+    scheduler = BandwidthScheduler(limit * MB)
+    # Large enough that nobody finishes before the measurement ends
+    size = int(limit * MB * seconds * 2)
+    received = {}
+    lock = threading.Lock()
+
+    def throttle(job_id):
+        def charge(nbytes, check):
+            with lock:
+                received[job_id] += nbytes
+            scheduler.throttle(job_id, nbytes, check)
+        return charge
+
+    with MediaServer(size=size) as server, tempfile.TemporaryDirectory() as tmp:
+        downloads = []
+        for index, weight in enumerate(weights):
+            job_id = f"job{index}"
+            received[job_id] = 0
+            scheduler.register(job_id, weight)
+            download = SegmentedDownload(server.url(f"/{job_id}.mp4"), os.path.join(tmp, f"{job_id}.mp4"),
+                                         connections=connections, throttle=throttle(job_id))
+            thread = threading.Thread(target=lambda d=download: _run_quietly(d), daemon=True)
+            downloads.append((job_id, weight, download, thread))
+            thread.start()
+
+        phases = []
+        for phase_limit in (limit, new_limit):
+            scheduler.set_rate(phase_limit * MB)
+            time.sleep(1)  # let the buckets settle at the new rate
+            with lock:
+                before = dict(received)
+            started = time.monotonic()
+            time.sleep(seconds)
+            elapsed = time.monotonic() - started
+            with lock:
+                rates = {job_id: (received[job_id] - before[job_id]) / elapsed / MB for job_id in received}
+            phases.append({
+                'limit_mb_s': phase_limit,
+                'total_mb_s': round(sum(rates.values()), 3),
+                'jobs': [{'job': job_id, 'weight': weight, 'mb_s': round(rates[job_id], 3),
+                          'expected_mb_s': round(phase_limit * weight / sum(weights), 3)}
+                         for job_id, weight, _, _ in downloads],
+            })
+
+        for _, _, download, thread in downloads:
+            download.cancel()
+            thread.join()
+
+    return {'benchmark': 'bandwidth', 'connections': connections, 'phases': phases}
+
+
+def _run_quietly(download):
+    try:
+        download.run()
+    except Exception:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=float, default=8.0, help="initial limit in MB/s")
+    parser.add_argument("--new-limit", type=float, default=4.0, help="limit set halfway, in MB/s")
+    parser.add_argument("--weights", type=float, nargs="+", default=[4, 2, 1])
+    parser.add_argument("--seconds", type=float, default=4.0, help="measurement time per phase")
+    parser.add_argument("--connections", type=int, default=2, help="range requests per download")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.limit, args.weights, args.new_limit, args.seconds, args.connections),
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Metadata latency and sustained download throughput through the engine.
+
+Jobs for the offline stub extractor go through DownloadEngine exactly as the
+app runs them, against a local server serving ``--size-mb`` of synthetic
+media at ``--bitrate`` MB/s per connection (unlimited by default).
+
+    python -m benchmarks.bench_download --size-mb 64 --connections 1 4 --fetches 20
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.server import MediaServer
+from benchmarks.stub import add_stub, stub_url
+from downloader.download_queue import DownloadJob
+from downloader.engine import DownloadEngine
+from downloader.sessions import SessionPool
+
+MB = 1024 * 1024
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def measure_metadata(engine, server, fetches):
+    latencies = []
+    for i in range(fetches):
+        started = time.perf_counter()
+        engine.fetch_info(stub_url(server, f"meta{i:04d}"))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        'fetches': fetches,
+        'first_ms': round(latencies[0], 3),
+        'median_ms': round(statistics.median(latencies[1:] or latencies), 3),
+        'p95_ms': round(percentile(latencies[1:] or latencies, 0.95), 3),
+    }
+
+
+def measure_download(engine, server, directory, connections, size):
+    callbacks = [0]
+    engine.on_progress = lambda job, progress: callbacks.__setitem__(0, callbacks[0] + 1)
+    engine.connections = connections
+    job = DownloadJob(stub_url(server, f"media{connections}"), directory, "mp4")
+    started = time.perf_counter()
+    engine.download(job)
+    seconds = time.perf_counter() - started
+    return {
+        'connections': connections,
+        'seconds': round(seconds, 4),
+        'throughput_mb_s': round(size / seconds / MB, 3),
+        'progress_callbacks': callbacks[0],
+        'verified': bool(job.filepath) and os.path.getsize(job.filepath) == size,
+    }
+
+
+def run(size_mb=64, bitrate=None, connections=(1, 4), fetches=20):
+    size = int(size_mb * MB)
+    sessions = SessionPool(setup=add_stub)
+    engine = DownloadEngine(quiet=True, sessions=sessions)
+    with MediaServer(size=size, per_connection_rate=bitrate * MB if bitrate else None) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        metadata = measure_metadata(engine, server, fetches)
+        downloads = [measure_download(engine, server, tmp, count, size) for count in connections]
+    sessions.close()
+
+    return {
+        'benchmark': 'download',
+        'size_mb': size_mb,
+        'bitrate_mb_s': bitrate,
+        'metadata': metadata,
+        'downloads': downloads,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=64)
+    parser.add_argument("--bitrate", type=float, help="server cap in MB/s per connection")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--fetches", type=int, default=20, help="metadata fetches to time")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.size_mb, args.bitrate, args.connections, args.fetches), indent=2))
+
+
+if __name__ == "__main__":
+    main()
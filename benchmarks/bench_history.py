@@ -0,0 +1,82 @@
+"""History store cost at N entries.
+
+Builds a legacy JSON history of ``--entries`` downloads, then times the
+one-time import, a cold reopen (what every app start pays), a page of
+recent entries as the history list shows it, a title search and an append.
+
+    python -m benchmarks.bench_history --entries 1000 10000 50000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from downloader.history import HistoryStore
+
+WORDS = ("music", "live", "tutorial", "review", "trailer", "podcast", "remix", "highlights")
+
+
+def legacy_entries(count):
+    """Newest first, like the JSON file the app used to write"""
+    return [{
+        'title': f"{WORDS[i % len(WORDS)]} video {i}",
+        'url': f"https://www.youtube.com/watch?v=bench{i:06d}",
+        'format': ("mp4", "mp3", "original")[i % 3],
+        'date': f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:00:00",
+    } for i in reversed(range(count))]
+
+
+def timed_ms(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return round((time.perf_counter() - started) * 1000, 3), result
+
+
+def measure(entries, directory):
+    legacy_path = os.path.join(directory, f"history-{entries}.json")
+    path = os.path.join(directory, f"history-{entries}.sqlite3")
+    with open(legacy_path, 'w') as f:
+        json.dump(legacy_entries(entries), f)
+
+    store = HistoryStore(path, legacy_path)
+    migrate_ms, _ = timed_ms(store.load)
+    store.close()
+
+    store = HistoryStore(path, legacy_path)
+    open_ms, _ = timed_ms(store.load)
+    count_ms, count = timed_ms(store.count)
+    page_ms, _ = timed_ms(store.recent, 100, 0)
+    search_ms, found = timed_ms(store.search, "tutorial")
+    add_ms, _ = timed_ms(store.add, {'title': "appended", 'url': "https://youtu.be/appended000",
+                                      'format': "mp4", 'date': "2026-01-01 00:00:00"})
+    store.close()
+
+    return {
+        'entries': count,
+        'migrate_ms': migrate_ms,
+        'open_ms': open_ms,
+        'count_ms': count_ms,
+        'recent_page_ms': page_ms,
+        'search_ms': search_ms,
+        'search_hits': len(found),
+        'add_ms': add_ms,
+        'fts': store.has_fts,
+    }
+
+
+def run(entries=(1000, 10000, 50000)):
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [measure(count, tmp) for count in entries]
+    return {'benchmark': 'history', 'results': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.entries), indent=2))
+
+
+if __name__ == "__main__":
+    main()
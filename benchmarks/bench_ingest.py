@@ -0,0 +1,137 @@
+"""Importing URL lists: throughput, memory and appends at 100k lines.
+
+Writes a list of ``--lines`` lines (mixed URL forms, duplicates, comments
+and junk) and times a first import through :class:`downloader.ingest.Ingestor`
+with history deduplication, then an import after lines were appended, which
+should only read the new ones. A ticker thread stands in for the Tk loop and
+records how late its 10 ms callbacks run while a file is imported. Peak
+memory is compared with reading the file whole.
+
+    python -m benchmarks.bench_ingest --lines 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from downloader.download_queue import RUNNING
+from downloader.history import HistoryStore
+from downloader.ingest import Ingestor, OffsetStore
+
+TICK = 0.01
+
+
+def video_id(i):
+    return f"v{i:010d}"
+
+
+def list_line(i):
+    """Every 10th line repeats an earlier video, every 50th is a comment or junk"""
+    if i % 50 == 0:
+        return "# exported batch" if i % 100 == 0 else "n/a"
+    vid = video_id(i - 5 if i % 10 == 0 else i)
+    forms = (f"https://www.youtube.com/watch?v={vid}", f"https://youtu.be/{vid}?si=share",
+             f"youtube.com/shorts/{vid}")
+    return forms[i % 3]
+
+
+def write_list(path, first, count):
+    with open(path, 'a', encoding='utf-8') as f:
+        for i in range(first, first + count):
+            f.write(list_line(i) + "\n")
+
+
+class Ticker:
+    """Measures how late periodic callbacks run, like Tk's after() queue would"""
+    def __init__(self):
+        self.worst = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            time.sleep(TICK)
+            self.worst = max(self.worst, time.perf_counter() - started - TICK)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return round(self.worst * 1000, 2)
+
+
+def started(job):
+    """Stand-in for a queue whose workers pick jobs up at once, so none are kept waiting"""
+    job.state = RUNNING
+    job.started = True
+
+
+def import_once(tmp, path, history, name):
+    ingestor = Ingestor(started, skip=history.contains, offsets=OffsetStore(os.path.join(tmp, name)))
+    started_at = time.perf_counter()
+    counts = ingestor.ingest(path, tmp)
+    return ingestor, counts, time.perf_counter() - started_at
+
+
+def run(lines=100000, appended=1000, history_entries=10000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "urls.txt")
+        write_list(path, 1, lines)
+
+        history = HistoryStore(os.path.join(tmp, "history.sqlite3"), legacy_path="")
+        for i in range(1, history_entries + 1):
+            history.add({'url': f"https://www.youtube.com/watch?v={video_id(i * 7)}", 'title': str(i)})
+
+        ticker = Ticker()
+        ingestor, first, first_seconds = import_once(tmp, path, history, "offsets.json")
+        worst_tick_ms = ticker.stop()
+
+        write_list(path, lines + 1, appended)
+        started_at = time.perf_counter()
+        second = ingestor.ingest(path, tmp)
+        append_seconds = time.perf_counter() - started_at
+
+        tracemalloc.start()
+        import_once(tmp, path, history, "offsets-memory.json")
+        _, ingest_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        with open(path, 'r', encoding='utf-8') as f:
+            whole = f.read().splitlines()
+        _, whole_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del whole
+        file_size = os.path.getsize(path)
+        history.close()
+
+    return {
+        'benchmark': 'ingest',
+        'lines': lines,
+        'file_mb': round(file_size / 1024 / 1024, 2),
+        'first_import': dict(first),
+        'first_import_seconds': round(first_seconds, 3),
+        'lines_per_second': round(lines / first_seconds),
+        'peak_memory_mb': round(ingest_peak / 1024 / 1024, 2),
+        'read_whole_peak_memory_mb': round(whole_peak / 1024 / 1024, 2),
+        'worst_tick_delay_ms': worst_tick_ms,
+        'append': dict(second),
+        'append_ms': round(append_seconds * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--appended", type=int, default=1000, help="lines added before the second import")
+    parser.add_argument("--history", type=int, default=10000, help="entries in the download history")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.lines, args.appended, args.history), indent=2))
+
+
+if __name__ == "__main__":
+    main()
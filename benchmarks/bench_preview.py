@@ -0,0 +1,107 @@
+"""Preview latency: from a pasted URL to its metadata on screen.
+
+Compares the old fixed one-second debounce followed by an extraction with
+the prefetcher, cold and after the URL was warmed from the clipboard, and
+checks that a burst of superseded lookups delivers only the newest one.
+
+    python -m benchmarks.bench_preview --rounds 10
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from benchmarks.server import MediaServer
+from benchmarks.stub import add_stub, stub_url
+from downloader.engine import DownloadEngine
+from downloader.prefetch import AdaptiveDebounce, Prefetcher
+from downloader.sessions import SessionPool
+
+FIXED_DEBOUNCE = 1.0
+PASTED = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def preview_seconds(prefetcher, url, delay=0.0):
+    """Seconds from the edit to the info being delivered"""
+    delivered = threading.Event()
+    started = time.perf_counter()
+    time.sleep(delay)
+    prefetcher.request(url, lambda info, token: delivered.set())
+    delivered.wait(30)
+    return time.perf_counter() - started
+
+
+def typed_delay(gap, characters=len(PASTED)):
+    """Debounce after typing a URL one character every ``gap`` seconds, before its ID is complete"""
+    debounce = AdaptiveDebounce()
+    now = 0.0
+    for end in range(1, characters - 1):
+        delay = debounce.delay(PASTED[:end], now)
+        now += gap
+    return delay
+
+
+def superseded(prefetcher, server, burst):
+    delivered = []
+    done = threading.Event()
+    urls = [stub_url(server, f"burst{i:03d}") for i in range(burst)]
+    for url in urls:
+        prefetcher.request(url, lambda info, token, url=url: (delivered.append(url), done.set()))
+    done.wait(30)
+    time.sleep(0.2)
+    return {'requests': burst, 'delivered': len(delivered), 'newest_delivered': delivered == urls[-1:]}
+
+
+def run(rounds=10, burst=8):
+    sessions = SessionPool(setup=add_stub)
+    engine = DownloadEngine(quiet=True, sessions=sessions)
+    sessions.warm(1)
+    with MediaServer(size=1024 * 1024) as server:
+        prefetcher = Prefetcher(engine.fetch_info)
+        pasted_delay = AdaptiveDebounce().delay(PASTED)
+
+        fixed = [preview_seconds(prefetcher, stub_url(server, f"fixed{i:03d}"), FIXED_DEBOUNCE)
+                 for i in range(min(rounds, 3))]
+        cold = [preview_seconds(prefetcher, stub_url(server, f"cold{i:03d}"), pasted_delay)
+                for i in range(rounds)]
+
+        warmed = []
+        for i in range(rounds):
+            url = stub_url(server, f"warm{i:03d}")
+            prefetcher.warm(url)
+            time.sleep(0.1)
+            warmed.append(preview_seconds(prefetcher, url, pasted_delay))
+
+        burst_result = superseded(prefetcher, server, burst)
+        stats = dict(prefetcher.stats)
+        prefetcher.close()
+    sessions.close()
+
+    def ms(values):
+        return round(statistics.median(values) * 1000, 3)
+
+    return {
+        'benchmark': 'preview',
+        'rounds': rounds,
+        'fixed_debounce_ms': ms(fixed),
+        'prefetch_cold_ms': ms(cold),
+        'prefetch_warmed_ms': ms(warmed),
+        'pasted_debounce_ms': round(pasted_delay * 1000, 1),
+        'typed_debounce_ms': {'fast_typist': round(typed_delay(0.08) * 1000, 1),
+                              'slow_typist': round(typed_delay(0.3) * 1000, 1)},
+        'burst': burst_result,
+        'stats': stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=8, help="URLs entered in quick succession")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.rounds, args.burst), indent=2))
+
+
+if __name__ == "__main__":
+    main()
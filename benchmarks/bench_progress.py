@@ -0,0 +1,187 @@
+"""Cost of progress reporting per downloaded MB.
+
+Feeds synthetic yt-dlp progress callbacks through the old per-callback
+``root.after`` delivery and through the ProgressBoard sampled at
+UI_REFRESH_HZ, against a fake Tk root, and reports the time spent on the
+download thread and on the UI thread for each.
+
+    python -m benchmarks.bench_progress --megabytes 200 --callbacks-per-mb 100
+"""
+import argparse
+import json
+import time
+from collections import deque
+
+from downloader.download_queue import DownloadJob, RUNNING
+from downloader.engine import DownloadEngine
+from downloader.progress import ProgressBoard, UI_REFRESH_HZ, progress_text, short_progress_text
+
+
+class FakeWidget:
+    def __init__(self):
+        self.options = {}
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+
+class FakeRoot:
+    """Collects root.after() callbacks; run_pending() plays the Tk main loop"""
+    def __init__(self):
+        self.pending = deque()
+        self.calls = 0
+
+    def after(self, delay, callback):
+        self.pending.append(callback)
+
+    def run_pending(self):
+        while self.pending:
+            self.pending.popleft()()
+            self.calls += 1
+
+
+class FakeUI:
+    def __init__(self):
+        self.root = FakeRoot()
+        self.progress_bar = FakeWidget()
+        self.progress_label = FakeWidget()
+        self.status_label = FakeWidget()
+        self.rows = {}
+
+    def update_progress(self, percent, text):
+        self.progress_bar['value'] = percent
+        self.progress_label.configure(text=text)
+        self.status_label.configure(text=text)
+
+    def update_job_row(self, job, status):
+        self.rows[job.id] = (job.title or job.url, job.format_selection, status)
+
+
+def legacy_hook(ui, job, d):
+    """download_progress_hook as it was before the progress board"""
+    if d['status'] == 'downloading':
+        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
+        downloaded_bytes = d.get('downloaded_bytes', 0)
+
+        if total_bytes > 0:
+            percent = (downloaded_bytes / total_bytes) * 100
+            speed = d.get('speed', 0)
+            eta = d.get('eta', 0)
+
+            if speed:
+                speed_str = f"{speed / 1024 / 1024:.2f} MB/s"
+            else:
+                speed_str = "-- MB/s"
+
+            if eta:
+                eta_str = f"{eta} seconds remaining"
+            else:
+                eta_str = "calculating..."
+
+            progress_text = f"Downloading: {percent:.1f}% ({speed_str}, {eta_str})"
+            status = f"{percent:.1f}% ({speed_str})"
+
+            ui.root.after(0, lambda: ui.update_progress(percent, progress_text))
+            ui.root.after(0, lambda: ui.update_job_row(job, status))
+
+
+def synthetic_callbacks(megabytes, callbacks_per_mb, rate):
+    total = megabytes * 1024 * 1024
+    count = megabytes * callbacks_per_mb
+    step = total / count
+    for i in range(1, count + 1):
+        downloaded = int(i * step)
+        yield {
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'speed': rate * 1024 * 1024,
+            'eta': int((total - downloaded) / (rate * 1024 * 1024)),
+            'filename': 'video.mp4',
+            'tmpfilename': 'video.mp4.part',
+        }
+
+
+def measure(deliver, sample, callbacks, callbacks_per_frame):
+    hook_time = 0.0
+    ui_time = 0.0
+    for i, d in enumerate(callbacks, 1):
+        start = time.perf_counter()
+        deliver(d)
+        hook_time += time.perf_counter() - start
+
+        if i % callbacks_per_frame == 0:
+            start = time.perf_counter()
+            sample()
+            ui_time += time.perf_counter() - start
+
+    start = time.perf_counter()
+    sample()
+    ui_time += time.perf_counter() - start
+    return hook_time, ui_time
+
+
+def run(megabytes=200, callbacks_per_mb=100, rate=20.0):
+    # Frames happen at UI_REFRESH_HZ of simulated transfer time
+    callbacks_per_frame = max(1, int(rate * callbacks_per_mb / UI_REFRESH_HZ))
+    job = DownloadJob("https://www.youtube.com/watch?v=benchmark00", ".")
+    job.state = RUNNING
+
+    ui = FakeUI()
+    hook_time, ui_time = measure(lambda d: legacy_hook(ui, job, d), ui.root.run_pending,
+                                 synthetic_callbacks(megabytes, callbacks_per_mb, rate), callbacks_per_frame)
+    legacy = {
+        'hook_us_per_mb': hook_time * 1e6 / megabytes,
+        'ui_us_per_mb': ui_time * 1e6 / megabytes,
+        'ui_calls_per_mb': ui.root.calls / megabytes,
+    }
+
+    ui = FakeUI()
+    board = ProgressBoard()
+    engine = DownloadEngine(on_progress=board.update)
+    frames = [0]
+
+    def sample():
+        changed = board.drain()
+        for changed_job, progress in changed:
+            ui.update_job_row(changed_job, short_progress_text(progress))
+        if changed:
+            progress = changed[-1][1]
+            ui.update_progress(progress['percent'], progress_text(progress))
+        frames[0] += 1
+
+    hook_time, ui_time = measure(lambda d: engine.progress_hook(job, d), sample,
+                                 synthetic_callbacks(megabytes, callbacks_per_mb, rate), callbacks_per_frame)
+    board_result = {
+        'hook_us_per_mb': hook_time * 1e6 / megabytes,
+        'ui_us_per_mb': ui_time * 1e6 / megabytes,
+        'ui_calls_per_mb': frames[0] / megabytes,
+    }
+
+    return {
+        'benchmark': 'progress',
+        'megabytes': megabytes,
+        'callbacks_per_mb': callbacks_per_mb,
+        'rate_mb_s': rate,
+        'refresh_hz': UI_REFRESH_HZ,
+        'legacy': legacy,
+        'board': board_result,
+        'speedup': (legacy['hook_us_per_mb'] + legacy['ui_us_per_mb'])
+                   / max(board_result['hook_us_per_mb'] + board_result['ui_us_per_mb'], 1e-9),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=int, default=200)
+    parser.add_argument("--callbacks-per-mb", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=20.0, help="simulated transfer rate in MB/s")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.megabytes, args.callbacks_per_mb, args.rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Retries, stall detection and circuit breaking against a faulty server.
+
+Jobs for the stub extractor run through DownloadQueue and DownloadEngine
+against a MediaServer injecting failures (see :class:`benchmarks.server.Faults`):
+
+* ``errors``: a share of media requests answer 403, like expired stream
+  URLs; compared with the same run without a retry policy
+* ``stalls``: some responses slow to a trickle and must be restarted
+* ``outage``: one host answers every request with an error after a
+  second; with its circuit breaker open, the jobs for a healthy host no
+  longer wait behind it
+
+    python -m benchmarks.bench_retry --jobs 12
+"""
+import argparse
+import json
+import tempfile
+import time
+
+from benchmarks.server import Faults, MediaServer
+from benchmarks.stub import add_stub, stub_url
+from downloader.download_queue import DownloadQueue, DownloadJob, QUEUED, DONE, FAILED
+from downloader.engine import DownloadEngine
+from downloader.retry import Backoff, RetryPolicy, StallDetector
+from downloader.sessions import SessionPool
+
+MB = 1024 * 1024
+
+
+def run_jobs(sessions, faults, jobs, retry, size=MB, workers=2, timeout=120):
+    retried = []
+
+    def on_update(job):
+        if job.state == QUEUED and job.error:
+            retried.append(job.id)
+
+    with MediaServer(size=size, faults=faults) as server, tempfile.TemporaryDirectory() as tmp:
+        engine = DownloadEngine(quiet=True, sessions=sessions, retry=retry)
+        queue = DownloadQueue(engine.download, max_workers=workers, on_update=on_update)
+        started = time.perf_counter()
+        submitted = [queue.submit(DownloadJob(stub_url(server, f"job{i:03d}"), tmp, "mp4")) for i in range(jobs)]
+        finished = queue.join(timeout)
+        seconds = time.perf_counter() - started
+        for job in submitted:
+            queue.cancel(job.id)
+    return {
+        'jobs': jobs,
+        'done': sum(1 for job in submitted if job.state == DONE),
+        'failed': sum(1 for job in submitted if job.state == FAILED),
+        'retries': len(retried),
+        'injected': dict(faults.injected),
+        'server_requests': server.requests,
+        'seconds': round(seconds, 3),
+        'finished': finished,
+    }
+
+
+def run_outage(sessions, jobs, retry, workers=2, timeout=120):
+    """Seconds until the jobs for a healthy host are done while another host times out"""
+    done = {}
+
+    def on_update(job):
+        if job.state == DONE:
+            done[job.id] = time.perf_counter()
+
+    failing_faults = Faults(error_rate=1.0, delay=1.0)
+    with MediaServer(size=MB) as healthy, MediaServer(size=MB, faults=failing_faults) as failing, \
+            tempfile.TemporaryDirectory() as tmp:
+        engine = DownloadEngine(quiet=True, sessions=sessions, retry=retry)
+        queue = DownloadQueue(engine.download, max_workers=workers, on_update=on_update)
+        # Same server process, but a different host name for the breakers
+        failing_base = f"stub:http://localhost:{failing.server_address[1]}"
+        started = time.perf_counter()
+        submitted = [queue.submit(DownloadJob(f"{failing_base}/down{i:03d}", tmp, "mp4")) for i in range(jobs)]
+        healthy_jobs = [queue.submit(DownloadJob(stub_url(healthy, f"up{i:03d}"), tmp, "mp4"))
+                        for i in range(jobs)]
+        queue.join(timeout)
+        for job in submitted + healthy_jobs:
+            queue.cancel(job.id)
+    healthy_done = [done[job.id] for job in healthy_jobs if job.id in done]
+    return {
+        'jobs_per_host': jobs,
+        'healthy_done': len(healthy_done),
+        'healthy_seconds': round(max(healthy_done) - started, 3) if healthy_done else None,
+        'failing_host_requests': failing_faults.injected['error'],
+    }
+
+
+def fast_policy(**kwargs):
+    """Short waits so the benchmark finishes quickly"""
+    return RetryPolicy(backoff=Backoff(base=0.05, throttled_base=0.2, maximum=1.0), **kwargs)
+
+
+def run(jobs=12, error_rate=0.3):
+    sessions = SessionPool(setup=add_stub)
+    errors = {
+        'without_retry': run_jobs(sessions, Faults(error_rate=error_rate, seed=1), jobs, None),
+        'with_retry': run_jobs(sessions, Faults(error_rate=error_rate, seed=1), jobs,
+                               fast_policy(attempts=6, breaker_threshold=jobs)),
+    }
+    stalls = run_jobs(sessions, Faults(stall_rate=0.3, stall_after=128 * 1024, trickle_rate=16 * 1024, seed=2),
+                      jobs, fast_policy(attempts=6, stall=StallDetector(min_speed=64 * 1024, window=1.0)))
+    outage = {
+        'without_breaker': run_outage(sessions, jobs // 2, fast_policy(attempts=3, breaker_threshold=10 ** 6)),
+        'with_breaker': run_outage(sessions, jobs // 2,
+                                   fast_policy(attempts=3, breaker_threshold=2, breaker_cooldown=5.0)),
+    }
+    sessions.close()
+    return {
+        'benchmark': 'retry',
+        'error_rate': error_rate,
+        'errors': errors,
+        'stalls': stalls,
+        'outage': outage,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=12)
+    parser.add_argument("--error-rate", type=float, default=0.3, help="share of media requests failing")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.jobs, args.error_rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Aggregate throughput of segmented downloads against a local server.
+
+The server throttles every connection to ``--per-connection-rate`` MB/s, so
+N connections should approach N times the single-connection throughput.
+
+    python -m benchmarks.bench_segmented --size-mb 32 --connections 1 4 8
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from benchmarks.server import MediaServer, synthetic_bytes
+from downloader.segmented import SegmentedDownload
+
+MB = 1024 * 1024
+
+
+def verify(path, size):
+    with open(path, 'rb') as f:
+        position = 0
+        while position < size:
+            chunk = f.read(MB)
+            if chunk != synthetic_bytes(position, len(chunk)):
+                return False
+            position += len(chunk)
+    return position == size
+
+
+def run(size_mb=32, connections=(1, 4, 8), per_connection_rate=8.0):
+    size = int(size_mb * MB)
+    results = []
+    with MediaServer(size=size, per_connection_rate=per_connection_rate * MB) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        for count in connections:
+            path = os.path.join(tmp, f"media-{count}.mp4")
+            download = SegmentedDownload(server.url(), path, connections=count,
+                                         min_segment_size=MB, max_segment_size=4 * MB)
+            stats = download.run()
+            results.append({
+                'connections': count,
+                'seconds': stats['seconds'],
+                'throughput_mb_s': stats['throughput'] / MB,
+                'segments': stats['segments'],
+                'retries': stats['retries'],
+                'verified': verify(path, size),
+            })
+
+    return {
+        'benchmark': 'segmented',
+        'size_mb': size_mb,
+        'per_connection_rate_mb_s': per_connection_rate,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=32)
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--per-connection-rate", type=float, default=8.0, help="server cap in MB/s per connection")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.size_mb, args.connections, args.per_connection_rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Metadata fetches through a new YoutubeDL per call vs. the warm session pool.
+
+The stub extractor (see :mod:`benchmarks.stub`) resolves URLs by fetching a
+small JSON document from the local media server, so the numbers show the
+cost of building YoutubeDL instances and opening connections rather than
+YouTube's latency.
+
+    python -m benchmarks.bench_sessions --fetches 50
+"""
+import argparse
+import json
+import time
+
+from yt_dlp import YoutubeDL
+
+from benchmarks.server import MediaServer
+from benchmarks.stub import add_stub, stub_url
+from downloader.sessions import SessionPool
+
+FETCH_OPTS = {'quiet': True, 'no_warnings': True, 'skip_download': True, 'noplaylist': True}
+
+
+def fetch_fresh(urls):
+    for url in urls:
+        with YoutubeDL(FETCH_OPTS) as ydl:
+            add_stub(ydl)
+            ydl.extract_info(url, download=False, ie_key='Stub')
+
+
+def fetch_pooled(urls, pool):
+    for url in urls:
+        with pool.lease(FETCH_OPTS) as ydl:
+            ydl.extract_info(url, download=False, ie_key='Stub')
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def run(fetches=50):
+    with MediaServer(size=1024 * 1024) as server:
+        urls = [stub_url(server, f"video{i:04d}") for i in range(fetches)]
+
+        requests_before = server.requests
+        fresh = timed(fetch_fresh, urls)
+        fresh_requests = server.requests - requests_before
+
+        pool = SessionPool(setup=add_stub)
+        warm = timed(pool.warm, 1)
+        requests_before = server.requests
+        pooled = timed(fetch_pooled, urls, pool)
+        pooled_requests = server.requests - requests_before
+        stats = pool.stats()
+        pool.close()
+
+    return {
+        'benchmark': 'sessions',
+        'fetches': fetches,
+        'fresh': {'seconds': round(fresh, 4), 'ms_per_fetch': round(fresh * 1000 / fetches, 3),
+                  'requests': fresh_requests},
+        'pooled': {'seconds': round(pooled, 4), 'ms_per_fetch': round(pooled * 1000 / fetches, 3),
+                   'requests': pooled_requests, 'warm_up_seconds': round(warm, 4), 'pool': stats},
+        'speedup': round(fresh / pooled, 2) if pooled else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fetches", type=int, default=50, help="metadata fetches per variant")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.fetches), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Profilers for benchmark runs.
+
+``cprofile`` is exact but only sees the thread that runs the benchmark;
+download, segment and conversion work happens on other threads, which the
+``sample`` profiler covers by periodically reading every thread's stack.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+PROFILERS = ("cprofile", "sample")
+
+
+class CProfileCapture:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+
+    def save(self, path_base):
+        """Write ``<path_base>.prof`` (for snakeviz, pstats ...) and return a summary"""
+        path = path_base + ".prof"
+        self.profile.dump_stats(path)
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        top = []
+        for (filename, line, name), (_, calls, own, cumulative, _) in sorted(
+                stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:20]:
+            top.append({'function': f"{_short(filename)}:{line}({name})", 'calls': calls,
+                        'own_s': round(own, 4), 'cumulative_s': round(cumulative, 4)})
+        return {'profiler': "cprofile", 'file': path, 'top_cumulative': top}
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads every ``interval`` seconds"""
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self.own = Counter()
+        self.cumulative = Counter()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{_short(code.co_filename)}:{code.co_firstlineno}({code.co_name})")
+                    frame = frame.f_back
+                self.samples += 1
+                self.own[stack[0]] += 1
+                for function in set(stack):
+                    self.cumulative[function] += 1
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self, path_base):
+        """Write ``<path_base>.folded`` (flamegraph.pl / speedscope input) and return a summary"""
+        path = path_base + ".folded"
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        total = self.samples or 1
+        return {
+            'profiler': "sample",
+            'file': path,
+            'samples': self.samples,
+            'interval_s': self.interval,
+            'top_own': [{'function': name, 'share': round(count / total, 4)}
+                        for name, count in self.own.most_common(20)],
+            'top_cumulative': [{'function': name, 'share': round(count / total, 4)}
+                               for name, count in self.cumulative.most_common(20)],
+        }
+
+
+def profiler(kind):
+    if kind == "cprofile":
+        return CProfileCapture()
+    if kind == "sample":
+        return SamplingProfiler()
+    raise ValueError(f"Unknown profiler: {kind}")
+
+
+@lru_cache(maxsize=None)
+def _short(filename):
+    """Path relative to the project or the library directory it lives in"""
+    for prefix in [os.getcwd()] + sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+def timestamp():
+    return time.strftime("%Y%m%d-%H%M%S")
@@ -0,0 +1,210 @@
+"""Local HTTP server serving synthetic media for benchmarks.
+
+Every path serves ``size`` deterministic bytes with byte-range support.
+``per_connection_rate`` (bytes/s) throttles each connection separately,
+like the per-stream throttling seen on video CDNs. Paths ending in
+``.json`` serve a small info document instead, for stub extractors.
+:class:`Faults` makes media requests fail or stall on purpose.
+"""
+import json
+import posixpath
+import random
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BLOCK = 64 * 1024
+
+
+def synthetic_bytes(start, length):
+    """Deterministic content: byte i of the file is i % 251"""
+    pattern = bytes(range(251))
+    offset = start % 251
+    repeated = pattern[offset:] + pattern * (length // 251 + 2)
+    return repeated[:length]
+
+
+class Faults:
+    """Failures injected into media requests, to exercise retries.
+
+    The first ``fail_first`` requests fail, then each one fails with
+    probability ``error_rate``; failures are answered with ``status`` (403
+    like an expired stream URL, 429, 503 ...) after ``delay`` seconds, as
+    from an overloaded host. With probability
+    ``stall_rate`` a response slows to ``trickle_rate`` bytes/s after
+    ``stall_after`` bytes.
+    """
+    def __init__(self, error_rate=0.0, status=403, fail_first=0, stall_rate=0.0, stall_after=256 * 1024,
+                 trickle_rate=2048, delay=0.0, seed=0):
+        self.error_rate = error_rate
+        self.delay = delay
+        self.status = status
+        self.fail_first = fail_first
+        self.stall_rate = stall_rate
+        self.stall_after = stall_after
+        self.trickle_rate = trickle_rate
+        self.injected = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def pick(self):
+        """'error', 'stall' or None for the next media request"""
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                fault = 'error'
+            elif self._rng.random() < self.error_rate:
+                fault = 'error'
+            elif self._rng.random() < self.stall_rate:
+                fault = 'stall'
+            else:
+                return None
+            self.injected[fault] += 1
+            return fault
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            # Cancelled clients reset idle keep-alive connections
+            pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        try:
+            self._serve(send_body=True)
+        except (ConnectionError, BrokenPipeError):
+            # Clients drop connections when they are cancelled or retry
+            self.close_connection = True
+
+    def _serve(self, send_body):
+        server = self.server
+        server.count_request()
+        if self.path.endswith(".json"):
+            self._serve_info(send_body)
+            return
+        size = server.size
+        fault = server.faults.pick() if server.faults is not None else None
+        if fault == 'error':
+            time.sleep(server.faults.delay)
+            self.send_response(server.faults.status)
+            self.send_header('Content-Length', "0")
+            self.end_headers()
+            return
+
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith("bytes=") and server.ranges:
+            first, _, last = range_header[6:].partition("-")
+            start = int(first) if first else 0
+            end = min(int(last), size - 1) if last else size - 1
+            if start > end or start >= size:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', "0")
+                self.end_headers()
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header('Content-Type', server.content_type)
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', "bytes" if server.ranges else "none")
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not send_body:
+            return
+
+        position = start
+        started = time.monotonic()
+        sent = 0
+        while position <= end:
+            block = min(BLOCK, end - position + 1)
+            self.wfile.write(synthetic_bytes(position, block))
+            position += block
+            sent += block
+            if server.per_connection_rate:
+                ahead = sent / server.per_connection_rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+            if fault == 'stall' and sent >= server.faults.stall_after:
+                self._trickle(position, end, server.faults.trickle_rate)
+                return
+
+    def _trickle(self, position, end, rate):
+        chunk = max(1, rate // 4)
+        while position <= end:
+            block = min(chunk, end - position + 1)
+            self.wfile.write(synthetic_bytes(position, block))
+            self.wfile.flush()
+            position += block
+            time.sleep(block / rate)
+
+    def _serve_info(self, send_body):
+        video_id = posixpath.splitext(posixpath.basename(self.path))[0]
+        rate = self.server.per_connection_rate
+        body = json.dumps({'id': video_id, 'title': f"Synthetic video {video_id}",
+                           'duration': 60, 'filesize': self.server.size,
+                           'tbr': rate * 8 / 1000 if rate else None}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, size=32 * 1024 * 1024, per_connection_rate=None, ranges=True,
+                 content_type="video/mp4", address=("127.0.0.1", 0), faults=None):
+        super().__init__(address, MediaRequestHandler)
+        self.size = size
+        self.faults = faults
+        self.per_connection_rate = per_connection_rate
+        self.ranges = ranges
+        self.content_type = content_type
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path="/media.mp4"):
+        return self.base_url + path
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,46 @@
+"""Offline yt-dlp extractor for benchmarks.
+
+``stub:<server base URL>/<id>`` URLs resolve to one MP4 format served by a
+:class:`~benchmarks.server.MediaServer`, with the server's size and
+per-connection rate as the format's filesize and bitrate.
+"""
+from yt_dlp.extractor.common import InfoExtractor
+
+
+def stub_url(server, video_id):
+    return f"stub:{server.base_url}/{video_id}"
+
+
+class StubIE(InfoExtractor):
+    IE_NAME = 'stub'
+    _VALID_URL = r'stub:(?P<base>https?://[^/]+)/(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        base, video_id = self._match_valid_url(url).group('base', 'id')
+        data = self._download_json(f"{base}/info/{video_id}.json", video_id)
+        return {
+            'id': video_id,
+            'title': data['title'],
+            'duration': data['duration'],
+            'formats': [{
+                'format_id': 'http-mp4',
+                'url': f"{base}/media/{video_id}.mp4",
+                'ext': 'mp4',
+                'filesize': data['filesize'],
+                'tbr': data.get('tbr'),
+                'protocol': 'http',
+            }],
+        }
+
+
+def add_stub(ydl):
+    """SessionPool ``setup``: register the stub ahead of the generic extractor.
+
+    The generic extractor accepts any URL, so without the reordering
+    (private to YoutubeDL, fine for a benchmark) only calls passing
+    ``ie_key='Stub'`` would reach the stub.
+    """
+    ydl.add_info_extractor(StubIE())
+    ies = ydl._ies
+    stub = ies.pop(StubIE.ie_key())
+    ydl._ies = {StubIE.ie_key(): stub, **ies}
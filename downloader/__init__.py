@@ -0,0 +1,5 @@
+"""Download engine shared by the desktop app and the command line tools.
+
+Nothing in this package imports tkinter or PIL at module level, so it can be
+used on machines without a display.
+"""
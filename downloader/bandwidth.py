@@ -0,0 +1,142 @@
+import re
+import threading
+import time
+from datetime import datetime
+
+MB = 1024 * 1024
+
+# Weights used for fair sharing, by queue priority (0 = high)
+PRIORITY_WEIGHTS = {0: 4, 1: 2, 2: 1}
+
+# A job that has not transferred anything for this long no longer takes a share
+IDLE_AFTER = 2.0
+
+# Longest single sleep, so live rate changes take effect quickly
+MAX_SLEEP = 0.25
+
+RATE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)(?:i?[bB](?:/s)?)?\s*$')
+RULE_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)$')
+
+
+def parse_rate(text):
+    """Bytes per second from ``"5M"``, ``"800k"``, ``"2.5"`` (MB/s) ...; 0 or empty means unlimited"""
+    if text is None or str(text).strip() in ("", "0"):
+        return None
+    match = RATE_RE.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid rate: {text!r}")
+    value, unit = float(match.group(1)), match.group(2).lower()
+    multiplier = {'': MB, 'k': 1024, 'm': MB, 'g': 1024 * MB}[unit]
+    rate = int(value * multiplier)
+    return rate or None
+
+
+def parse_schedule(text):
+    """Rules from ``"08:00-18:00=5M, 18:00-08:00=0"``; ranges may wrap midnight"""
+    rules = []
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        match = RULE_RE.match(part)
+        if not match:
+            raise ValueError(f"Invalid schedule rule: {part.strip()!r}")
+        start = int(match.group(1)) * 60 + int(match.group(2))
+        end = int(match.group(3)) * 60 + int(match.group(4))
+        rules.append((start, end, parse_rate(match.group(5))))
+    return rules
+
+
+class BandwidthScheduler:
+    """Global token bucket shared by every active download.
+
+    The current limit (``rate``, or the schedule rule covering the local
+    time) is split between jobs that transferred data in the last
+    ``IDLE_AFTER`` seconds in proportion to their weights; each job has its
+    own bucket refilled at its share. :meth:`throttle` is called by the
+    download threads with the bytes they just received and sleeps as long
+    as the job is over its share. Changing the rate or schedule takes
+    effect on the next sleep slice, without restarting anything.
+    """
+    def __init__(self, rate=None, schedule=None, burst_seconds=0.5):
+        self.rate = rate
+        self.schedule = list(schedule or [])
+        self.burst_seconds = burst_seconds
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def set_rate(self, rate):
+        self.rate = rate
+
+    def set_schedule(self, schedule):
+        self.schedule = list(schedule or [])
+
+    def current_rate(self, now=None):
+        now = now or datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                return rate
+        return self.rate
+
+    def register(self, job_id, weight=1):
+        with self._lock:
+            self._jobs[job_id] = {'weight': max(weight, 0.01), 'tokens': 0.0,
+                                  'updated': time.monotonic(), 'active': 0.0}
+
+    def unregister(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def share(self, job_id):
+        """Bytes per second currently granted to ``job_id``; None when unlimited"""
+        rate = self.current_rate()
+        if rate is None:
+            return None
+        with self._lock:
+            return self._share(job_id, rate, time.monotonic())
+
+    def throttle(self, job_id, nbytes, check=None):
+        """Account ``nbytes`` received by ``job_id`` and sleep while it is over budget.
+
+        ``check`` is called between sleep slices so a paused or cancelled job
+        can abort.
+        """
+        if nbytes <= 0:
+            return
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is None:
+                return
+            now = time.monotonic()
+            state['active'] = now
+            state['tokens'] -= nbytes
+
+        while True:
+            rate = self.current_rate()
+            with self._lock:
+                now = time.monotonic()
+                if rate is None:
+                    state['tokens'] = 0.0
+                    state['updated'] = now
+                    return
+                share = self._share(job_id, rate, now)
+                state['tokens'] = min(state['tokens'] + (now - state['updated']) * share,
+                                      share * self.burst_seconds)
+                state['updated'] = now
+                if state['tokens'] >= 0:
+                    return
+                delay = min(-state['tokens'] / share, MAX_SLEEP)
+            time.sleep(delay)
+            if check:
+                check()
+
+    def _share(self, job_id, rate, now):
+        active = [s for s in self._jobs.values() if now - s['active'] < IDLE_AFTER]
+        state = self._jobs.get(job_id)
+        if state is None:
+            return rate
+        total = sum(s['weight'] for s in active) or state['weight']
+        if state not in active:
+            total += state['weight']
+        return max(rate * state['weight'] / total, 1.0)
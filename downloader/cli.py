@@ -0,0 +1,307 @@
+"""Headless batch downloader.
+
+Reads URLs from the command line, a file, or stdin and downloads them in
+parallel, printing one JSON object per line on stdout::
+
+    python -m downloader -i urls.txt -o ~/Downloads -f mp3 -j 4
+    cat urls.txt | python -m downloader -i -
+    python -m downloader --playlist "https://www.youtube.com/playlist?list=..."
+    python -m downloader -i urls.txt --limit 5M --schedule "22:00-07:00=0"
+    python -m downloader -i urls.txt --metrics-port 9464 --metrics-log metrics.jsonl
+    python -m downloader --import export.csv --watch ~/incoming
+    python -m downloader -i urls.txt -o /mnt/disk1 --volume /mnt/disk2 --min-free 5G
+
+Event objects always carry an ``event`` key (``queued``, ``started``,
+``progress``, ``converting``, ``retrying``, ``done``, ``failed``, ``cancelled``,
+``paused``, ``resumed``, ``summary``) and, except for the summary, the ``job`` id and
+``url``. Playlist expansion adds ``playlist``, ``skipped``, ``unavailable``
+and ``playlist_finished`` events. ``--import`` and ``--watch`` add an
+``imported`` event per list file read.
+With ``--metrics-port`` or ``--metrics-log`` the summary also carries the
+final ``metrics`` snapshot. It always lists the output ``volumes`` with their
+free space and measured write throughput.
+
+Ctrl-C pauses the unfinished jobs instead of cancelling them, so with
+``--journal`` the next ``--resume`` picks them up again.
+"""
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+
+from downloader.bandwidth import BandwidthScheduler, parse_rate, parse_schedule
+from downloader.download_queue import (DownloadQueue, DownloadJob, QUEUED, RUNNING, PROCESSING, PAUSED, DONE,
+                                       FAILED, CANCELLED)
+from downloader.engine import DownloadEngine, FORMATS, default_download_dir
+from downloader.history import HistoryStore
+from downloader.ingest import FolderWatcher, Ingestor
+from downloader.journal import JobJournal
+from downloader.library_index import LibraryIndex
+from downloader.metadata_cache import MetadataCache, DEFAULT_TTL
+from downloader.metrics import Metrics, PrometheusExporter, JsonlMetricsLog
+from downloader.output import OutputManager, DEFAULT_HEADROOM, parse_size
+from downloader.playlist import PlaylistExpander, is_playlist_url, DEFAULT_RESOLVERS
+from downloader.postprocess import PostProcessingStage, default_workers
+from downloader.retry import (RetryPolicy, StallDetector, DEFAULT_ATTEMPTS, DEFAULT_STALL_SPEED,
+                              DEFAULT_STALL_WINDOW)
+from downloader.segmented import DEFAULT_CONNECTIONS
+
+
+class JsonEventWriter:
+    """Thread-safe JSON-lines writer with per-job progress throttling"""
+    def __init__(self, stream=None, progress_interval=0.5):
+        self.stream = stream or sys.stdout
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._last_progress = {}
+
+    def emit(self, event, job=None, **fields):
+        record = {'event': event, 'time': round(time.time(), 3)}
+        if job is not None:
+            record['job'] = job.id
+            record['url'] = job.url
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def on_progress(self, job, progress):
+        if progress['status'] in ('downloading', 'converting'):
+            now = time.monotonic()
+            if now - self._last_progress.get(job.id, 0) < self.progress_interval:
+                return
+            self._last_progress[job.id] = now
+        self.emit('progress', job,
+                  status=progress['status'],
+                  percent=round(progress['percent'], 2),
+                  downloaded_bytes=progress.get('downloaded_bytes'),
+                  total_bytes=progress.get('total_bytes'),
+                  speed=progress.get('speed'),
+                  eta=progress.get('eta'))
+
+    def on_job_update(self, job):
+        if job.state == QUEUED and job.error:
+            self.emit('retrying', job, attempt=job.attempts, format_fallback=job.format_fallback,
+                      status=job.status_text, error=job.error)
+        elif job.state == RUNNING:
+            self.emit('started', job)
+        elif job.state == PROCESSING:
+            self.emit('converting', job)
+        elif job.state == DONE:
+            self.emit('done', job, title=job.title, filepath=job.filepath, skipped=job.skip_reason,
+                      duplicates=job.duplicates, transfer=job.transfer)
+        elif job.state == FAILED:
+            self.emit('failed', job, error=job.error)
+        elif job.state == CANCELLED:
+            self.emit('cancelled', job)
+        elif job.state == PAUSED:
+            self.emit('paused', job)
+
+
+def summary_metrics(metrics):
+    """The aggregate part of a metrics snapshot; per-job details are in the job events"""
+    snapshot = metrics.snapshot()
+    del snapshot['job_details']
+    return snapshot
+
+
+def read_urls(sources):
+    """Yield URLs from files (``-`` is stdin), skipping blanks and # comments"""
+    for source in sources:
+        stream = sys.stdin if source == "-" else open(source, 'r', encoding='utf-8')
+        try:
+            for line in stream:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m downloader",
+                                     description="Download YouTube videos without the GUI")
+    parser.add_argument("urls", nargs="*", help="video URLs to download")
+    parser.add_argument("-i", "--input", action="append", default=[], metavar="FILE",
+                        help="file with one URL per line, '-' for stdin (repeatable)")
+    parser.add_argument("-o", "--output", default=default_download_dir(), help="download directory")
+    parser.add_argument("--volume", action="append", default=[], metavar="DIR",
+                        help="another download directory, e.g. on a second disk; each job goes to the "
+                             "one with room and the best write speed (repeatable)")
+    parser.add_argument("--min-free", type=parse_size, default=DEFAULT_HEADROOM, metavar="SIZE",
+                        help="space to leave free on every volume, e.g. 5G or 500M (default 256M)")
+    parser.add_argument("--no-preallocate", action="store_true",
+                        help="only account for reserved space instead of claiming it on disk up front")
+    parser.add_argument("-f", "--format", default="mp4", choices=FORMATS, help="download format")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="parallel downloads")
+    parser.add_argument("-c", "--connections", type=int, default=1,
+                        help=f"parallel range requests per file, e.g. {DEFAULT_CONNECTIONS} (1 disables)")
+    parser.add_argument("--convert-jobs", type=int, default=default_workers(),
+                        help="parallel ffmpeg conversions (default: one per CPU core)")
+    parser.add_argument("--limit", type=parse_rate, metavar="RATE",
+                        help="total bandwidth shared by all downloads, e.g. 5M or 800k (MB/s if no unit)")
+    parser.add_argument("--schedule", type=parse_schedule, metavar="RULES",
+                        help="time-of-day limits overriding --limit, e.g. '08:00-18:00=5M,18:00-08:00=0'")
+    parser.add_argument("--retries", type=int, default=DEFAULT_ATTEMPTS - 1,
+                        help="extra attempts for network errors, stalls and throttling (0 disables)")
+    parser.add_argument("--stall-speed", type=float, default=DEFAULT_STALL_SPEED / 1024, metavar="KB_S",
+                        help="a download slower than this for --stall-timeout seconds is restarted")
+    parser.add_argument("--stall-timeout", type=float, default=DEFAULT_STALL_WINDOW, metavar="SECONDS")
+    parser.add_argument("--import", dest="imports", action="append", default=[], metavar="FILE",
+                        help="queue the new URLs of a .txt/.csv list, skipping ones downloaded or queued "
+                             "before and lines read by an earlier run (repeatable)")
+    parser.add_argument("--watch", metavar="DIR",
+                        help="keep importing list files added to or growing in DIR until interrupted")
+    parser.add_argument("--playlist", action="store_true",
+                        help="download every video of playlist and channel URLs")
+    parser.add_argument("--resolvers", type=int, default=DEFAULT_RESOLVERS,
+                        help="playlist entries whose metadata is resolved in parallel")
+    parser.add_argument("--journal", metavar="FILE",
+                        help="record jobs in this journal so interrupted ones can be resumed")
+    parser.add_argument("--resume", action="store_true",
+                        help="first resume the unfinished jobs recorded in --journal")
+    parser.add_argument("--progress-interval", type=float, default=0.5,
+                        help="minimum seconds between progress lines per job")
+    parser.add_argument("--no-history", action="store_true", help="do not record downloads in history")
+    parser.add_argument("--redownload", action="store_true",
+                        help="download even if the video is already in the output directory")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the metadata cache")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_TTL,
+                        help="seconds an extracted info dict stays reusable")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-log", metavar="FILE",
+                        help="append a JSON line per finished job and periodic snapshots to FILE")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between snapshots in --metrics-log")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.resume and not args.journal:
+        parser.error("--resume requires --journal")
+
+    journal = JobJournal(args.journal) if args.journal else None
+    resumed = journal.load_jobs() if args.resume else []
+    if journal is not None:
+        journal.compact()
+
+    sources = list(args.input)
+    if not args.urls and not sources and not resumed and not args.imports and not args.watch:
+        sources = ["-"]
+
+    events = JsonEventWriter(progress_interval=args.progress_interval)
+
+    history = None
+    if not args.no_history:
+        history = HistoryStore()
+        history.load()
+
+    cache = None
+    if not args.no_cache:
+        cache = MetadataCache(ttl=args.cache_ttl)
+
+    bandwidth = None
+    if args.limit or args.schedule:
+        bandwidth = BandwidthScheduler(args.limit, args.schedule)
+
+    postprocessing = PostProcessingStage(args.convert_jobs, on_progress=events.on_progress)
+
+    retry = None
+    if args.retries > 0:
+        stall = StallDetector(args.stall_speed * 1024, args.stall_timeout)
+        retry = RetryPolicy(args.retries + 1, stall=stall)
+
+    output = OutputManager(args.volume, headroom=args.min_free, preallocate=not args.no_preallocate)
+
+    engine = DownloadEngine(history, on_progress=events.on_progress, quiet=True, cache=cache,
+                            journal=journal, connections=args.connections,
+                            library=None if args.redownload else LibraryIndex(),
+                            bandwidth=bandwidth, postprocessor=postprocessing, retry=retry, output=output)
+    queue = DownloadQueue(engine.download, max_workers=args.jobs, on_update=events.on_job_update)
+
+    metrics = exporter = metrics_log = None
+    if args.metrics_port is not None or args.metrics_log:
+        metrics = Metrics()
+        engine.set_metrics(metrics)
+        if args.metrics_port is not None:
+            exporter = PrometheusExporter(metrics, args.metrics_port)
+        if args.metrics_log:
+            metrics_log = JsonlMetricsLog(metrics, args.metrics_log, args.metrics_interval)
+
+    jobs = []
+
+    def submit(job):
+        events.emit('queued', job)
+        jobs.append(queue.submit(job))
+
+    def on_playlist_event(name, **fields):
+        events.emit('playlist_finished' if name == 'finished' else name, **fields)
+
+    def on_import_event(name, **fields):
+        if name == 'imported':
+            events.emit(name, **fields)
+
+    ingestor = Ingestor(submit, skip=history.contains if history is not None else None,
+                        queue=queue, on_event=on_import_event)
+    watcher = None
+
+    try:
+        for job in resumed:
+            events.emit('resumed', job, resume_bytes=job.resume_bytes)
+            submit(job)
+
+        for url in itertools.chain(args.urls, read_urls(sources)):
+            if args.playlist and is_playlist_url(url):
+                expander = PlaylistExpander(engine, submit, max_resolvers=args.resolvers,
+                                            skip=history.contains if history is not None else None,
+                                            queue=queue, on_event=on_playlist_event)
+                expander.expand(url, args.output, args.format)
+            else:
+                submit(DownloadJob(url, args.output, args.format))
+
+        for path in args.imports:
+            ingestor.ingest(path, args.output, args.format)
+
+        if args.watch:
+            watcher = FolderWatcher(args.watch, ingestor, args.output, args.format)
+            while True:
+                time.sleep(1)
+        queue.join()
+    except KeyboardInterrupt:
+        if watcher is not None:
+            watcher.stop(wait=True)
+        ingestor.cancel()
+        # Like closing the app: unfinished jobs are paused, not cancelled, so
+        # they stay open in the journal for --resume
+        queue.shutdown()
+        queue.join(timeout=10)
+    finally:
+        # The last commit in ingest() ran while its final jobs were still queued
+        ingestor.commit()
+    postprocessing.shutdown()
+    engine.sessions.close()
+    if metrics_log is not None:
+        metrics_log.close()
+    if exporter is not None:
+        exporter.close()
+
+    done = sum(1 for job in jobs if job.state == DONE)
+    failed = sum(1 for job in jobs if job.state == FAILED)
+    paused = sum(1 for job in jobs if job.state == PAUSED)
+    events.emit('summary', total=len(jobs), done=done, failed=failed, paused=paused,
+                cancelled=len(jobs) - done - failed - paused,
+                cache=cache.stats() if cache is not None else None,
+                volumes=output.stats(),
+                metrics=summary_metrics(metrics) if metrics is not None else None)
+    return 0 if done == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import heapq
+import itertools
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+QUEUED = "queued"
+RUNNING = "running"
+PROCESSING = "processing"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class JobInterrupted(Exception):
+    """Raised from a progress hook to stop a running job (pause or cancel)"""
+
+
+class RetryLater(Exception):
+    """Raised by a runner to have the job queued again after ``delay`` seconds"""
+    def __init__(self, delay, reason, message=None):
+        super().__init__(message or reason)
+        self.delay = delay
+        self.reason = reason
+
+
+class DownloadJob:
+    def __init__(self, url, download_dir, format_selection="mp4", priority="normal", job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.url = url
+        self.download_dir = download_dir
+        self.format_selection = format_selection
+        self.priority = PRIORITIES.get(priority, priority)
+        self.state = QUEUED
+        self.title = None
+        self.percent = 0.0
+        self.progress = None
+        self.transfer = None
+        self.skip_reason = None
+        self.filepath = None
+        self.duplicates = []
+        self.status_text = "Queued"
+        self.error = None
+        self.created = time.time()
+        self.resume_bytes = 0
+        self.attempts = 0
+        self.format_fallback = 0
+        # Set once the engine has recorded the job's start in the journal
+        self.started = False
+        self._stop_request = None
+        self._heap_seq = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'download_dir': self.download_dir,
+            'format_selection': self.format_selection,
+            'priority': self.priority,
+            'title': self.title,
+            'created': self.created,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data['url'], data['download_dir'], data.get('format_selection', "mp4"),
+                  data.get('priority', "normal"), job_id=data.get('id'))
+        job.title = data.get('title')
+        job.created = data.get('created', job.created)
+        return job
+
+    def check_interrupt(self):
+        """Called from progress hooks; aborts the transfer if pause/cancel was requested"""
+        if self._stop_request:
+            raise JobInterrupted(self._stop_request)
+
+    @property
+    def stop_request(self):
+        """PAUSED or CANCELLED while a stop of the running job is pending, else None"""
+        return self._stop_request
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED, CANCELLED)
+
+
+class DownloadQueue:
+    """Priority queue of download jobs served by a bounded pool of worker threads.
+
+    ``runner(job)`` performs the actual download and is called on a worker
+    thread. If it returns a :class:`~concurrent.futures.Future`, the worker
+    moves on and the job stays PROCESSING until the future resolves (see
+    :class:`~downloader.postprocess.PostProcessingStage`). If it raises
+    :class:`RetryLater`, the job is QUEUED again once the delay has passed,
+    without holding a worker meanwhile. ``on_update(job)`` is called (also
+    from worker threads) whenever a job changes state.
+    """
+
+    def __init__(self, runner, max_workers=2, on_update=None):
+        self._runner = runner
+        self._on_update = on_update
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._jobs = {}
+        self._deferred = {}
+        self._max_workers = 0
+        self._worker_count = 0
+        self._closed = False
+        self.set_max_workers(max_workers)
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    def set_max_workers(self, count):
+        count = max(1, int(count))
+        with self._cond:
+            self._max_workers = count
+            while self._worker_count < count:
+                self._worker_count += 1
+                threading.Thread(target=self._worker, daemon=True).start()
+            # Surplus idle workers notice the new limit and exit
+            self._cond.notify_all()
+
+    def submit(self, job):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Queue has been shut down")
+            self._jobs[job.id] = job
+            self._deferred.pop(job.id, None)
+            job.state = QUEUED
+            job.status_text = "Queued"
+            job.error = None
+            self._push(job)
+            self._cond.notify_all()
+        self._notify(job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs.values())
+
+    def pause(self, job_id):
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        with self._cond:
+            if job.state == QUEUED:
+                job.state = PAUSED
+                job.status_text = "Paused"
+            elif job.state == RUNNING:
+                job._stop_request = PAUSED
+                job.status_text = "Pausing..."
+            else:
+                return
+            self._cond.notify_all()
+        self._notify(job)
+
+    def resume(self, job_id):
+        job = self._jobs.get(job_id)
+        if not job or job.state not in (PAUSED, FAILED):
+            return
+        self.submit(job)
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        with self._cond:
+            if job.state in (QUEUED, PAUSED):
+                job.state = CANCELLED
+                job.status_text = "Cancelled"
+            elif job.state in (RUNNING, PROCESSING):
+                job._stop_request = CANCELLED
+                job.status_text = "Cancelling..."
+            else:
+                return
+            self._cond.notify_all()
+        self._notify(job)
+
+    def set_priority(self, job_id, priority):
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        with self._cond:
+            job.priority = PRIORITIES.get(priority, priority)
+            if job.state == QUEUED and job.id not in self._deferred:
+                self._push(job)
+                self._cond.notify_all()
+        self._notify(job)
+
+    def remove_finished(self):
+        with self._cond:
+            for job_id in [j.id for j in self._jobs.values() if j.finished]:
+                del self._jobs[job_id]
+
+    def pending_count(self):
+        with self._cond:
+            return sum(1 for j in self._jobs.values() if j.state in (QUEUED, RUNNING, PROCESSING))
+
+    def queued_count(self):
+        """Jobs waiting for a worker"""
+        with self._cond:
+            return sum(1 for j in self._jobs.values() if j.state == QUEUED)
+
+    def wait_below(self, count, limit, timeout=None):
+        """Block until ``count()`` (e.g. :meth:`queued_count`) is below ``limit``; False on timeout.
+
+        Waiters are woken whenever a job starts, finishes or is paused, so
+        nothing polls the counts.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while count() >= limit:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def join(self, timeout=None):
+        """Block until no job is queued, running or processing"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while any(j.state in (QUEUED, RUNNING, PROCESSING) for j in self._jobs.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self):
+        """Stop taking jobs and pause every unfinished one; running jobs stop at their next callback"""
+        paused = []
+        with self._cond:
+            self._closed = True
+            for job in self._jobs.values():
+                if job.state in (RUNNING, PROCESSING):
+                    job._stop_request = PAUSED
+                elif job.state == QUEUED:
+                    job.state = PAUSED
+                    job.status_text = "Paused"
+                    paused.append(job)
+            self._cond.notify_all()
+        for job in paused:
+            self._notify(job)
+
+    def _push(self, job):
+        # Re-pushing a job (priority change, resume) leaves a stale heap entry
+        # behind; it is recognised by its sequence number and skipped on pop.
+        seq = next(self._seq)
+        job._heap_seq = seq
+        heapq.heappush(self._heap, (job.priority, seq, job))
+
+    def _pop(self):
+        while self._heap:
+            _, seq, job = heapq.heappop(self._heap)
+            if job.state == QUEUED and job._heap_seq == seq:
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed or self._worker_count > self._max_workers:
+                        self._worker_count -= 1
+                        return
+                    job = self._pop()
+                    if job:
+                        break
+                    self._cond.wait()
+                job.state = RUNNING
+                job.status_text = "Starting..."
+                job.progress = None
+                job.skip_reason = None
+                job.error = None
+                self._cond.notify_all()
+            self._notify(job)
+            self._run(job)
+
+    def _run(self, job):
+        try:
+            result = self._runner(job)
+        except Exception as e:
+            self._finish(job, e)
+            return
+        if not isinstance(result, Future):
+            self._finish(job)
+            return
+
+        with self._cond:
+            job.state = PROCESSING
+            job.status_text = "Converting..."
+            job.progress = None
+        self._notify(job)
+        result.add_done_callback(lambda future: self._finish(job, future.exception()))
+
+    def _finish(self, job, error=None):
+        if isinstance(error, RetryLater) and not job._stop_request:
+            if not self._closed:
+                self._retry_later(job, error)
+                return
+            # Left open in the journal like the other jobs stopped by shutdown
+            job._stop_request = PAUSED
+        if error is None:
+            state = DONE
+        elif job._stop_request:
+            # yt-dlp may wrap the exception raised from our progress hook, so
+            # rely on the stop request rather than the exception type.
+            state = job._stop_request
+        else:
+            state = FAILED
+            job.error = str(error)
+        with self._cond:
+            job.state = state
+            job._stop_request = None
+            if state == DONE:
+                job.percent = 100.0
+                job.status_text = f"Done ({job.skip_reason})" if job.skip_reason else "Done"
+            elif state == FAILED:
+                job.status_text = f"Failed: {job.error}"
+            else:
+                job.status_text = state.capitalize()
+            self._cond.notify_all()
+        self._notify(job)
+
+    def _retry_later(self, job, retry):
+        with self._cond:
+            job.state = QUEUED
+            job.progress = None
+            job.error = str(retry)
+            if retry.delay >= 1:
+                job.status_text = f"Retrying in {retry.delay:.0f}s ({retry.reason})"
+            else:
+                job.status_text = f"Retrying ({retry.reason})"
+            token = object()
+            self._deferred[job.id] = token
+            self._cond.notify_all()
+        self._notify(job)
+        timer = threading.Timer(max(retry.delay, 0), self._requeue, (job, token))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, job, token):
+        with self._cond:
+            if self._deferred.get(job.id) is not token:
+                return
+            del self._deferred[job.id]
+            # Paused, cancelled or removed while waiting
+            if job.state != QUEUED or self._closed:
+                return
+            self._push(job)
+            self._cond.notify_all()
+
+    def _notify(self, job):
+        if self._on_update:
+            try:
+                self._on_update(job)
+            except Exception as e:
+                print(f"Error in queue update callback: {e}", file=sys.stderr)
@@ -0,0 +1,570 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+from datetime import datetime
+
+from downloader.bandwidth import PRIORITY_WEIGHTS
+from downloader.download_queue import DONE, FAILED, CANCELLED, RetryLater
+from downloader.metadata_cache import extract_video_id
+from downloader.output import OutOfSpaceError
+from downloader.postprocess import mp3_output
+from downloader.progress import progress_fields
+from downloader.segmented import SegmentedDownload, RangeNotSupported
+from downloader.sessions import SessionPool
+
+FORMATS = ("mp4", "mp3", "original")
+
+OUTPUT_TEMPLATE = '%(title)s.%(ext)s'
+
+# Top-level fields yt-dlp sets for a selection of merged streams
+SELECTED_FORMAT_KEYS = frozenset((
+    'requested_formats', 'format', 'format_id', 'ext', 'protocol', 'language', 'format_note',
+    'filesize_approx', 'tbr', 'width', 'height', 'resolution', 'fps', 'dynamic_range', 'vcodec',
+    'vbr', 'stretched_ratio', 'aspect_ratio', 'acodec', 'abr', 'asr', 'audio_channels',
+))
+
+# Format selectors tried in order when a format is unavailable or keeps
+# failing: plain HTTP instead of fragmented (HLS/DASH) streams, then
+# separate streams merged by ffmpeg
+FORMAT_FALLBACKS = {
+    "mp4": ('best[ext=mp4]', 'best[ext=mp4][protocol^=http]/best[ext=mp4]',
+            'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]'),
+    "mp3": ('bestaudio/best', 'bestaudio[protocol^=http]/bestaudio/best', 'best'),
+    "original": ('best', 'best[protocol^=http]/best', 'bestvideo+bestaudio/best'),
+}
+
+
+def preload(sessions=None):
+    """Import yt-dlp ahead of its first use, e.g. on a background thread after startup.
+
+    yt-dlp is imported where it is used because loading its extractors takes
+    a large share of a cold start. With ``sessions``, one warm instance is
+    also built.
+    """
+    import yt_dlp  # noqa: F401
+
+    if sessions is not None:
+        sessions.warm(1)
+
+
+def default_download_dir():
+    return os.path.join(os.path.expanduser("~"), "Downloads")
+
+
+def build_ydl_opts(download_dir, format_selection, progress_hooks=None, quiet=False, postprocess=True,
+                   fallback=0, paths=None):
+    """yt-dlp options for downloading one video in the requested format.
+
+    With ``postprocess`` false, MP3 jobs only download the audio stream and
+    leave the conversion to the caller. ``fallback`` picks a later selector
+    from :data:`FORMAT_FALLBACKS`. ``paths`` are yt-dlp's home and temp
+    directories (see :meth:`~downloader.output.OutputManager.ydl_paths`).
+    """
+    ydl_opts = {
+        'outtmpl': OUTPUT_TEMPLATE if paths else os.path.join(download_dir, OUTPUT_TEMPLATE),
+        'progress_hooks': list(progress_hooks or []),
+        'noplaylist': True,
+        # Interrupted jobs are resumed from their .part files
+        'continuedl': True,
+        'nopart': False,
+    }
+    if paths:
+        ydl_opts['paths'] = dict(paths)
+
+    if quiet:
+        ydl_opts['quiet'] = True
+        ydl_opts['no_warnings'] = True
+        ydl_opts['noprogress'] = True
+
+    chain = FORMAT_FALLBACKS.get(format_selection, FORMAT_FALLBACKS["original"])
+    ydl_opts['format'] = chain[min(fallback, len(chain) - 1)]
+    if format_selection == "mp3":
+        if postprocess:
+            ydl_opts['postprocessors'] = [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }]
+
+    return ydl_opts
+
+
+class DownloadEngine:
+    """Runs downloads without any knowledge of the user interface.
+
+    ``on_progress(job, progress)`` receives the dicts built by
+    :func:`~downloader.progress.progress_fields` and is called on the
+    download thread for every yt-dlp callback, so it must be cheap. With a
+    ``cache`` (see :class:`~downloader.metadata_cache.MetadataCache`) the
+    preview and the download share one extraction per video. A ``journal``
+    (see :class:`~downloader.journal.JobJournal`) records every job so it
+    can be resumed after a crash. With ``connections`` above one, single-file
+    HTTP formats are fetched by :class:`~downloader.segmented.SegmentedDownload`
+    over that many parallel range requests. A ``library``
+    (see :class:`~downloader.library_index.LibraryIndex`) is consulted before
+    any network work so videos already on disk are skipped, and the same
+    video is never downloaded by two workers at once. A ``bandwidth``
+    scheduler (see :class:`~downloader.bandwidth.BandwidthScheduler`) is
+    shared by all jobs, weighted by their priority. With a ``postprocessor``
+    (see :class:`~downloader.postprocess.PostProcessingStage`) MP3 jobs
+    return a Future after the download and are converted there, reusing an
+    MP4 or original download of the same video when the library has one or
+    another worker is downloading it.
+    Extractions and downloads lease warm YoutubeDL instances from
+    ``sessions`` (see :class:`~downloader.sessions.SessionPool`). Counters
+    and phase timings go to ``metrics`` once one is attached with
+    :meth:`set_metrics`; until then the hooks cost one ``None`` check. With a
+    ``retry`` policy (see :class:`~downloader.retry.RetryPolicy`) failed
+    downloads raise :class:`~downloader.download_queue.RetryLater` when they
+    are worth another attempt, stalled transfers are aborted, and metadata
+    lookups retry transient errors in place. An ``output`` manager (see
+    :class:`~downloader.output.OutputManager`) picks each job's volume,
+    reserves the size of the selected format before the transfer starts, and
+    has files written to a temporary directory until they are complete.
+    """
+    def __init__(self, history=None, on_progress=None, quiet=False, cache=None, journal=None,
+                 connections=1, library=None, bandwidth=None, postprocessor=None, sessions=None,
+                 retry=None, output=None):
+        self.history = history
+        self.on_progress = on_progress
+        self.quiet = quiet
+        self.cache = cache
+        self.journal = journal
+        self.connections = connections
+        self.library = library
+        self.bandwidth = bandwidth
+        self.postprocessor = postprocessor
+        self.sessions = sessions if sessions is not None else SessionPool()
+        self.retry = retry
+        self.output = output
+        self.metrics = None
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def set_metrics(self, metrics):
+        """Start (or with None, stop) collecting :class:`~downloader.metrics.Metrics`"""
+        self.metrics = metrics
+        if self.postprocessor is not None:
+            self.postprocessor.metrics = metrics
+
+    def fetch_info(self, url):
+        started = time.perf_counter()
+        video_id = extract_video_id(url)
+        if self.cache is not None:
+            info = self.cache.get(video_id)
+            if info:
+                if self.metrics is not None:
+                    self.metrics.metadata_fetch(time.perf_counter() - started, cached=True)
+                return info
+
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'noplaylist': True,
+        }
+
+        def extract():
+            with self.sessions.lease(ydl_opts) as ydl:
+                return ydl.extract_info(url, download=False)
+
+        info = extract() if self.retry is None else self.retry.call(url, extract)
+        info = self._store_info(video_id, info)
+        if self.metrics is not None:
+            self.metrics.metadata_fetch(time.perf_counter() - started, cached=False)
+        return info
+
+    def _store_info(self, video_id, info):
+        from yt_dlp import YoutubeDL
+
+        info = YoutubeDL.sanitize_info(unselected_info(info), remove_private_keys=True)
+        if self.cache is not None and info:
+            self.cache.put(video_id or info.get('id'), info)
+        return info
+
+    def progress_hook(self, job, d):
+        job.check_interrupt()
+
+        if self.metrics is not None:
+            self.metrics.progress(job, d)
+
+        if self.output is not None:
+            self.output.progress(job, d)
+
+        if self.retry is not None and self.retry.stall.stalled(job.id, d):
+            share = self.bandwidth.share(job.id) if self.bandwidth is not None else None
+            # Slower than the stall threshold is expected under a tight speed limit
+            if share is None or share >= self.retry.stall.min_speed:
+                raise self.retry.stall.error()
+
+        if self.journal is not None and d['status'] == 'downloading':
+            self.journal.progress(job, d)
+
+        progress = progress_fields(d)
+        if not progress:
+            return
+
+        job.percent = progress['percent']
+        job.progress = progress
+
+        if self.on_progress:
+            self.on_progress(job, progress)
+
+    def throttle_hook(self, job, d, received):
+        """Charge the bytes yt-dlp received since its last callback to the job's bandwidth share"""
+        if d['status'] != 'downloading':
+            return
+        downloaded = d.get('downloaded_bytes') or 0
+        filename = d.get('filename')
+        last_filename, last = received.get('last', (None, 0))
+        # Merged formats download several files, each counting from zero
+        delta = downloaded - last if filename == last_filename and downloaded >= last else downloaded
+        received['last'] = (filename, downloaded)
+        self.bandwidth.throttle(job.id, delta, job.check_interrupt)
+
+    def download(self, job):
+        metrics = self.metrics
+        if metrics is None:
+            return self._download_once(job)
+
+        metrics.job_started(job)
+        try:
+            result = self._download_once(job)
+        except RetryLater as e:
+            metrics.job_retrying(job, e.reason)
+            raise
+        except Exception as e:
+            metrics.job_finished(job, e)
+            raise
+        if isinstance(result, Future):
+            result.add_done_callback(lambda future: metrics.job_finished(job, future.exception()))
+        else:
+            metrics.job_finished(job)
+        return result
+
+    def _download_once(self, job):
+        """Skip videos already on disk and never download one video twice at the same time"""
+        key = (extract_video_id(job.url), job.format_selection)
+        if self.library is None or not key[0]:
+            return self._download_placed(job)
+
+        if job.format_selection == "mp3" and self.postprocessor is not None:
+            self._wait_for_source(job, key[0])
+        existing = self._claim(job, key)
+        if existing:
+            job.filepath = existing
+            job.skip_reason = "already downloaded"
+            return None
+        try:
+            result = self._download_placed(job)
+        except BaseException:
+            self._release(key)
+            raise
+        if isinstance(result, Future):
+            # The file only exists once the conversion is done
+            result.add_done_callback(lambda future: self._release(key))
+        else:
+            self._release(key)
+        return result
+
+    def _release(self, key):
+        with self._inflight_lock:
+            self._inflight.pop(key).set()
+
+    def _wait_for_source(self, job, video_id):
+        """Let a running MP4 or original download of the video finish, so the MP3 is converted from it"""
+        for format_selection in ("original", "mp4"):
+            with self._inflight_lock:
+                other = self._inflight.get((video_id, format_selection))
+            if other is not None:
+                while not other.wait(0.5):
+                    job.check_interrupt()
+
+    def _claim(self, job, key):
+        """Return an existing file for ``key``, or reserve it for this job"""
+        while True:
+            existing = self.library.lookup(key[0], key[1], [job.download_dir])
+            if existing:
+                return existing
+            with self._inflight_lock:
+                other = self._inflight.get(key)
+                if other is None:
+                    self._inflight[key] = threading.Event()
+                    return None
+            # The same video is being downloaded by another worker; wait for it
+            while not other.wait(0.5):
+                job.check_interrupt()
+
+    def _download_placed(self, job):
+        """Pick the job's volume, and hand its reserved space back once the file is final"""
+        if self.output is None:
+            return self._download_throttled(job)
+
+        self.output.place(job)
+        try:
+            result = self._download_throttled(job)
+        except BaseException:
+            self.output.release(job)
+            raise
+        if isinstance(result, Future):
+            result.add_done_callback(lambda future: self.output.release(job))
+        else:
+            self.output.release(job)
+        return result
+
+    def _download_throttled(self, job):
+        hooks = [lambda d: self.progress_hook(job, d)]
+        if self.bandwidth is None:
+            return self._download_admitted(job, hooks)
+
+        received = {}
+        hooks.append(lambda d: self.throttle_hook(job, d, received))
+        self.bandwidth.register(job.id, PRIORITY_WEIGHTS.get(job.priority, 1))
+        try:
+            return self._download_admitted(job, hooks)
+        finally:
+            self.bandwidth.unregister(job.id)
+
+    def _download_admitted(self, job, hooks):
+        """Run one attempt if the retry policy's circuit breakers let the job through"""
+        if self.retry is None:
+            return self._download_journaled(job, hooks)
+
+        self.retry.admit(job)
+        try:
+            return self._download_journaled(job, hooks)
+        finally:
+            # Also ends a half-open trial that stopped without a verdict (paused, permanent error ...)
+            self.retry.settle(job)
+
+    def _download_journaled(self, job, hooks):
+        paths = self.output.ydl_paths(job.download_dir) if self.output is not None else None
+        ydl_opts = build_ydl_opts(job.download_dir, job.format_selection, hooks, quiet=self.quiet,
+                                  postprocess=self.postprocessor is None, fallback=job.format_fallback,
+                                  paths=paths)
+
+        if self.journal is not None:
+            self.journal.start(job, {k: v for k, v in ydl_opts.items() if k != 'progress_hooks'},
+                               target=os.path.join(job.download_dir, OUTPUT_TEMPLATE))
+        job.started = True
+        try:
+            if self.postprocessor is not None and job.format_selection == "mp3":
+                future = self._download_and_convert(job, ydl_opts)
+                self._retry_succeeded(job)
+                future.add_done_callback(lambda f: self._journal_end(job, f.exception()))
+                return future
+            info = self._download(job, ydl_opts)
+            self._retry_succeeded(job)
+            self._record(job, info)
+        except RetryLater:
+            # Moved to another volume; stays open in the journal
+            raise
+        except Exception as e:
+            retry = self._retry_failed(job, e)
+            if retry is not None:
+                # Stays open in the journal, like a paused job, until its last attempt
+                raise retry from e
+            self._journal_end(job, e)
+            raise
+        self._journal_end(job)
+        return info
+
+    def _retry_succeeded(self, job):
+        if self.retry is not None:
+            self.retry.succeeded(job)
+
+    def _retry_failed(self, job, error):
+        if self.retry is None or job.stop_request or isinstance(error, RetryLater):
+            return None
+        chain = FORMAT_FALLBACKS.get(job.format_selection, FORMAT_FALLBACKS["original"])
+        return self.retry.failed(job, error, len(chain))
+
+    def _journal_end(self, job, error=None):
+        if self.journal is None:
+            return
+        if error is None:
+            self.journal.end(job, DONE)
+        elif not job.stop_request:
+            self.journal.end(job, FAILED)
+        elif job.stop_request == CANCELLED:
+            self.journal.end(job, CANCELLED)
+        # Paused jobs stay open in the journal so they survive a restart
+
+    def _download_and_convert(self, job, ydl_opts):
+        """Download the audio (unless a video of it is on disk) and queue the MP3 conversion"""
+        source = self._reusable_source(job)
+        reused = source is not None
+        if reused:
+            info = self._source_info(job, source)
+        else:
+            info = self._download(job, ydl_opts)
+            source = downloaded_filepath(info)
+
+        path, args = mp3_output(source, job.download_dir)
+        info = dict(info, filepath=path)
+        return self.postprocessor.submit(job, source, [(path, args)], duration=info.get('duration'),
+                                         keep_source=reused, then=lambda: self._record(job, info))
+
+    def _reusable_source(self, job):
+        """An MP4 or original download of the job's video to convert instead of downloading"""
+        video_id = extract_video_id(job.url)
+        if self.library is None or not video_id:
+            return None
+        for format_selection in ("original", "mp4"):
+            path = self.library.lookup(video_id, format_selection, [job.download_dir])
+            if path:
+                return path
+        return None
+
+    def _source_info(self, job, source):
+        video_id = extract_video_id(job.url)
+        info = self.cache.get(video_id) if self.cache is not None else None
+        return info or {'id': video_id, 'title': os.path.splitext(os.path.basename(source))[0]}
+
+    def _download(self, job, ydl_opts):
+        video_id = extract_video_id(job.url)
+        cached = self.cache.get(video_id) if self.cache is not None else None
+
+        with self.sessions.lease(ydl_opts) as ydl:
+            if cached:
+                try:
+                    info = self._process(ydl, job, cached)
+                except Exception as e:
+                    if job.stop_request or isinstance(e, (RetryLater, OutOfSpaceError)):
+                        raise
+                    # Stream URLs may have expired; fall back to a fresh extraction
+                    self.cache.invalidate(video_id)
+                    cached = None
+            if not cached:
+                with self._phase(job, 'extract'):
+                    info = ydl.extract_info(job.url, download=False)
+                if self.cache is not None:
+                    info = self._store_info(video_id, info)
+                info = self._process(ydl, job, info)
+        return info
+
+    def _phase(self, job, name):
+        return self.metrics.phase(job, name) if self.metrics is not None else nullcontext()
+
+    def _record(self, job, info):
+        """Index the finished file and add it to the history"""
+        if not info:
+            return
+        job.title = info.get('title', 'Unknown')
+        job.filepath = downloaded_filepath(info)
+        if self.library is not None and job.filepath:
+            try:
+                job.duplicates = self.library.record(job.filepath, info.get('id'), job.format_selection)
+            except OSError as e:
+                print(f"Error indexing {job.filepath}: {e}", file=sys.stderr)
+        if self.history is not None:
+            self.history.add({
+                'title': job.title,
+                'url': job.url,
+                'video_id': info.get('id'),
+                'format': job.format_selection,
+                'filepath': job.filepath,
+                'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+
+    def _process(self, ydl, job, info):
+        """Select the format of an extracted info dict and download it"""
+        with self._phase(job, 'transfer'):
+            return self._process_formats(ydl, job, info)
+
+    def _process_formats(self, ydl, job, info):
+        # Inline MP3 conversion only happens on yt-dlp's own download path
+        segmented = self.connections > 1 and (job.format_selection != "mp3" or self.postprocessor is not None)
+        if segmented or self.output is not None or self.retry is not None:
+            info = ydl.process_ie_result(info, download=False)
+        if self.retry is not None:
+            self.retry.admit(job, format_urls(info))
+        if self.output is not None and self.output.reserve(job, info):
+            raise RetryLater(0, 'disk', f"Not enough space here, moved to {job.download_dir}")
+        if segmented and is_segmentable(info):
+            try:
+                return self._download_segmented(ydl, job, info)
+            except RangeNotSupported:
+                pass
+        # Same as yt-dlp's --load-info-json: no second extraction
+        return ydl.process_ie_result(info, download=True)
+
+    def _download_segmented(self, ydl, job, info):
+        filename = ydl.prepare_filename(info)
+        if os.path.exists(filename):
+            return info
+        # The same as filename unless yt-dlp has a temp path
+        temp_filename = ydl.prepare_filename(info, 'temp')
+        os.makedirs(os.path.dirname(temp_filename) or ".", exist_ok=True)
+
+        def report(downloaded, total, speed):
+            self.progress_hook(job, {
+                'status': 'downloading',
+                'downloaded_bytes': downloaded,
+                'total_bytes': total,
+                'speed': speed,
+                'eta': int((total - downloaded) / speed) if speed else None,
+                'filename': filename,
+                'tmpfilename': filename + ".part",
+            })
+
+        throttle = None
+        if self.bandwidth is not None:
+            throttle = lambda nbytes, check: self.bandwidth.throttle(job.id, nbytes, check)
+
+        download = SegmentedDownload(info['url'], temp_filename, self.connections,
+                                     headers=info.get('http_headers'), progress=report,
+                                     throttle=throttle)
+        download.probe()
+        if self.output is not None:
+            self.output.allocated(job)
+        job.transfer = download.run()
+        if temp_filename != filename:
+            os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+            os.replace(temp_filename, filename)
+        if self.metrics is not None and job.transfer['retries']:
+            self.metrics.retried(job, job.transfer['retries'], cause='segment')
+        self.progress_hook(job, {'status': 'finished', 'downloaded_bytes': download.total_bytes,
+                                 'total_bytes': download.total_bytes, 'filename': filename})
+        info['filepath'] = filename
+        return info
+
+
+def unselected_info(info):
+    """An extracted info dict without the format yt-dlp selected for it.
+
+    ``extract_info`` copies the selected format's fields (``url``,
+    ``format_id``, ``filesize`` ...) to the top level and lists merged streams
+    in ``requested_formats``. Left in a cached dict, they would survive the
+    format selection of a later download in another format.
+    """
+    if not info or not info.get('formats'):
+        return info
+    selected = info.get('requested_formats') or [
+        f for f in info['formats'] if f.get('format_id') == info.get('format_id')]
+    keys = {key for f in selected for key in f} | SELECTED_FORMAT_KEYS
+    return {key: value for key, value in info.items() if key not in keys}
+
+
+def downloaded_filepath(info):
+    """Final path of the file yt-dlp (or the segmented downloader) wrote"""
+    if info.get('filepath'):
+        return info['filepath']
+    downloads = info.get('requested_downloads') or []
+    if downloads:
+        return downloads[-1].get('filepath') or downloads[-1].get('_filename')
+    return None
+
+
+def format_urls(info):
+    """URLs of the streams selected in a processed info dict"""
+    return [f['url'] for f in info.get('requested_formats') or [info] if f.get('url')]
+
+
+def is_segmentable(info):
+    """Whether the selected format is one plain HTTP file"""
+    return (not info.get('requested_formats') and info.get('url')
+            and info.get('protocol') in ('http', 'https'))
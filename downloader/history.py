@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+from downloader.metadata_cache import extract_video_id
+
+
+def default_history_file():
+    return os.path.join(os.path.expanduser("~"), ".youtube_downloader_history.sqlite3")
+
+
+def legacy_history_file():
+    """The JSON file used before the SQLite store"""
+    return os.path.join(os.path.expanduser("~"), ".youtube_downloader_history.json")
+
+
+class HistoryStore:
+    """Every completed download, in SQLite.
+
+    Appends are single-row inserts in WAL mode, lookups by video ID, URL and
+    date go through indexes, and titles are searched with FTS5 when the
+    SQLite build has it. Nothing is read at startup beyond what the caller
+    asks for, so opening the store costs the same at 20 or 50,000 entries.
+    :meth:`load` may run on a background thread; any other call made before
+    it finishes waits for it (or opens the database itself).
+    """
+    def __init__(self, path=None, legacy_path=None):
+        self.path = path or default_history_file()
+        self.legacy_path = legacy_path if legacy_path is not None else legacy_history_file()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.has_fts = False
+
+    def load(self):
+        """Open the database, creating it and importing the old JSON history if needed"""
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.row_factory = sqlite3.Row
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._create_schema()
+                self._migrate_json()
+        return self
+
+    def add(self, entry):
+        url = entry.get('url')
+        video_id = entry.get('video_id') or extract_video_id(url)
+        self._ensure_loaded()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO history (video_id, url, title, format, date, filepath) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, url, entry.get('title'), entry.get('format'), entry.get('date'),
+                 entry.get('filepath')))
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def count(self):
+        self._ensure_loaded()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def recent(self, limit=20, offset=0):
+        """Entries newest first"""
+        return self._query("SELECT * FROM history ORDER BY id DESC LIMIT ? OFFSET ?", (limit, offset))
+
+    @property
+    def entries(self):
+        return self.recent()
+
+    def find_by_video_id(self, video_id):
+        return self._query("SELECT * FROM history WHERE video_id = ? ORDER BY id DESC", (video_id,))
+
+    def find_by_url(self, url):
+        return self._query("SELECT * FROM history WHERE url = ? ORDER BY id DESC", (url,))
+
+    def contains(self, url):
+        """Whether the video behind ``url`` has been downloaded before"""
+        video_id = extract_video_id(url)
+        self._ensure_loaded()
+        with self._lock:
+            if video_id:
+                row = self._conn.execute(
+                    "SELECT 1 FROM history WHERE video_id = ? LIMIT 1", (video_id,)).fetchone()
+            else:
+                row = self._conn.execute("SELECT 1 FROM history WHERE url = ? LIMIT 1", (url,)).fetchone()
+        return row is not None
+
+    def search(self, text, limit=100):
+        """Entries whose title matches ``text``, newest first"""
+        # has_fts is only known once the database is open
+        self._ensure_loaded()
+        if self.has_fts:
+            # Quote every word so user input is never parsed as FTS syntax
+            query = " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+            if not query:
+                return []
+            return self._query(
+                "SELECT history.* FROM history_fts JOIN history ON history.id = history_fts.rowid "
+                "WHERE history_fts MATCH ? ORDER BY history.id DESC LIMIT ?", (query, limit))
+        return self._query("SELECT * FROM history WHERE title LIKE ? ORDER BY id DESC LIMIT ?",
+                           (f"%{text}%", limit))
+
+    def between(self, start, end, limit=None):
+        """Entries dated ``start`` <= date < ``end`` ("YYYY-MM-DD[ HH:MM:SS]" strings)"""
+        return self._query("SELECT * FROM history WHERE date >= ? AND date < ? ORDER BY date DESC LIMIT ?",
+                           (start, end, -1 if limit is None else limit))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _ensure_loaded(self):
+        if self._conn is None:
+            self.load()
+
+    def _query(self, sql, params):
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _create_schema(self):
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                video_id TEXT,
+                url TEXT NOT NULL,
+                title TEXT,
+                format TEXT,
+                date TEXT,
+                filepath TEXT
+            );
+            CREATE INDEX IF NOT EXISTS history_video_id ON history (video_id);
+            CREATE INDEX IF NOT EXISTS history_url ON history (url);
+            CREATE INDEX IF NOT EXISTS history_date ON history (date);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        try:
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts
+                    USING fts5(title, content='history', content_rowid='id');
+                CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+                    INSERT INTO history_fts (rowid, title) VALUES (new.id, new.title);
+                END;
+                CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+                    INSERT INTO history_fts (history_fts, rowid, title) VALUES ('delete', old.id, old.title);
+                END;
+            """)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; search falls back to LIKE
+            self.has_fts = False
+        self._conn.commit()
+
+    def _migrate_json(self):
+        done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+        if done or not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+
+        try:
+            with open(self.legacy_path, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Error loading history: {e}", file=sys.stderr)
+            entries = []
+
+        # The JSON list is newest first; insert oldest first so ids follow time
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO history (video_id, url, title, format, date) VALUES (?, ?, ?, ?, ?)",
+                [(extract_video_id(e.get('url')), e.get('url', ''), e.get('title'), e.get('format'),
+                  e.get('date')) for e in reversed(entries) if isinstance(e, dict)])
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)",
+                               (self.legacy_path,))
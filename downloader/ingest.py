@@ -0,0 +1,315 @@
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from downloader.download_queue import DownloadJob
+from downloader.metadata_cache import extract_video_id
+
+INGEST_EXTENSIONS = ('.txt', '.csv', '.list')
+
+# Jobs allowed to wait in the queue before reading pauses
+DEFAULT_BACKLOG = 100
+
+# Offsets are saved after this many lines, so a crash re-reads at most this many
+SAVE_EVERY = 500
+
+_BARE_URL_RE = re.compile(r'^(?:[\w-]+\.)+[a-z]{2,}/', re.I)
+
+
+def default_offsets_file():
+    return os.path.join(os.path.expanduser("~"), ".youtube_downloader_ingest.json")
+
+
+def normalize_url(text):
+    """Canonical form of a URL from a list file, or None if ``text`` is not one.
+
+    Surrounding quotes and brackets are dropped, ``https://`` is added to
+    bare ``youtube.com/...`` style URLs, and anything with a YouTube video ID
+    becomes a plain watch URL, so ``youtu.be`` links, shorts and URLs with
+    tracking parameters all name the same video.
+    """
+    text = text.strip().strip('"\'<>').strip()
+    if not text or any(c.isspace() for c in text):
+        return None
+    if "://" not in text:
+        if not _BARE_URL_RE.match(text):
+            return None
+        text = "https://" + text
+    elif not text.lower().startswith(("http://", "https://")):
+        return None
+    video_id = extract_video_id(text)
+    return f"https://www.youtube.com/watch?v={video_id}" if video_id else text
+
+
+def line_url(line, is_csv=False):
+    """The first field of a line that is a URL, or None (blank lines, # comments, CSV headers)"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    fields = next(csv.reader([line]), []) if is_csv else line.split()
+    for field in fields:
+        url = normalize_url(field)
+        if url:
+            return url
+    return None
+
+
+def read_lines(path, offset=0, final=True):
+    """Yield ``(start, end, text)`` for each line of ``path`` after byte ``offset``.
+
+    Only one line is in memory at a time. Unless ``final``, a last line
+    without a newline is left for later, as its writer may not be done.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        start = offset
+        for raw in f:
+            if not raw.endswith(b"\n") and not final:
+                return
+            end = start + len(raw)
+            yield start, end, raw.decode('utf-8-sig' if start == 0 else 'utf-8', 'replace')
+            start = end
+
+
+class OffsetStore:
+    """How far each list file has been queued, kept across runs in a JSON file.
+
+    A file that was replaced (new inode) or truncated below its offset is
+    read again from the start.
+    """
+    def __init__(self, path=None):
+        self.path = path or default_offsets_file()
+        self._lock = threading.Lock()
+        self._offsets = None
+
+    def get(self, path):
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._load().get(path)
+        if not entry or entry.get('inode') != stat.st_ino or entry['offset'] > stat.st_size:
+            return 0
+        return entry['offset']
+
+    def set(self, path, offset):
+        try:
+            inode = os.stat(path).st_ino
+        except OSError:
+            inode = None
+        with self._lock:
+            offsets = self._load()
+            if offsets.get(path, {}).get('offset') == offset:
+                return
+            offsets[path] = {'offset': offset, 'inode': inode, 'time': time.time()}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(offsets, f)
+            os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if self._offsets is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._offsets = json.load(f)
+            except (OSError, ValueError):
+                self._offsets = {}
+        return self._offsets
+
+
+class Ingestor:
+    """Queues the URLs listed in text and CSV files, one line at a time.
+
+    Files are streamed from the offset where the last run stopped, so a file
+    that grew only has its new lines read. URLs are normalised
+    (:func:`normalize_url`) and dropped if this ingestor queued them before
+    or ``skip(url)`` rejects them, e.g. ones already in the download history.
+    While ``queue`` holds ``max_backlog`` or more pending jobs, reading
+    waits, so a 100k-line file enters the queue as downloads make room.
+
+    The saved offset only moves past a line once its job has started (and is
+    in the job journal), so jobs still waiting in the queue are read again
+    after a restart. ``on_event(name, **fields)`` reports ``progress`` every
+    :data:`SAVE_EVERY` lines and ``imported`` at the end of each file.
+    """
+    def __init__(self, submit, skip=None, offsets=None, queue=None, max_backlog=DEFAULT_BACKLOG,
+                 on_event=None):
+        self.submit = submit
+        self.skip = skip
+        self.offsets = offsets or OffsetStore()
+        self.queue = queue
+        self.max_backlog = max_backlog
+        self.on_event = on_event
+        self.stats = Counter()
+        self._seen = set()
+        self._read = {}
+        self._inodes = {}
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def ingest(self, path, download_dir, format_selection="mp4", priority="normal", final=True, stop=None):
+        """Queue the new lines of ``path``; returns the counts for this call.
+
+        ``final=False`` leaves an unterminated last line for a later call.
+        ``stop`` is an optional event ending the call early.
+        """
+        path = os.path.abspath(path)
+        is_csv = path.lower().endswith(".csv")
+        counts = Counter()
+        with self._lock:
+            offset = self._start_offset(path)
+            for start, end, text in read_lines(path, offset, final):
+                if self._stopped(stop) or not self._wait_for_room(stop):
+                    break
+                counts['lines'] += 1
+                self._queue_line(path, start, text, is_csv, counts, download_dir, format_selection, priority)
+                with self._state_lock:
+                    self._read[path] = end
+                if counts['lines'] % SAVE_EVERY == 0:
+                    self.commit(path)
+                    self._emit('progress', file=path, **counts)
+            self.commit(path)
+        self.stats.update(counts)
+        self._emit('imported', file=path, **counts)
+        return counts
+
+    def commit(self, path=None):
+        """Save offsets up to the first line whose job has not started yet.
+
+        Jobs paused or deferred before they started have no journal record
+        either, so they hold the offset back like queued ones.
+        """
+        with self._state_lock:
+            paths = [path] if path else list(self._read)
+            for path in paths:
+                if path not in self._read:
+                    continue
+                waiting = self._waiting[path]
+                while waiting and (waiting[0][1].started or waiting[0][1].finished):
+                    waiting.popleft()
+                offset = waiting[0][0] if waiting else self._read[path]
+                try:
+                    self.offsets.set(path, offset)
+                except OSError as e:
+                    print(f"Error saving import offsets: {e}", file=sys.stderr)
+
+    def _start_offset(self, path):
+        stat = os.stat(path)
+        with self._state_lock:
+            offset = self._read.get(path)
+            if offset is not None and self._inodes.get(path) == stat.st_ino and offset <= stat.st_size:
+                return offset
+        # First read in this run, or the file was replaced or truncated
+        offset = self.offsets.get(path)
+        with self._state_lock:
+            self._read[path] = offset
+            self._inodes[path] = stat.st_ino
+            self._waiting[path] = deque()
+        return offset
+
+    def _queue_line(self, path, start, text, is_csv, counts, download_dir, format_selection, priority):
+        url = line_url(text, is_csv)
+        if url is None:
+            counts['invalid' if text.strip() and not text.lstrip().startswith("#") else 'blank'] += 1
+            return
+        key = extract_video_id(url) or url
+        if key in self._seen:
+            counts['duplicates'] += 1
+            return
+        self._seen.add(key)
+        if self.skip and self.skip(url):
+            counts['skipped'] += 1
+            return
+        job = DownloadJob(url, download_dir, format_selection, priority)
+        with self._state_lock:
+            self._waiting[path].append((start, job))
+        self.submit(job)
+        counts['queued'] += 1
+
+    def _wait_for_room(self, stop):
+        if self.queue is None:
+            return True
+        # Woken when a job finishes; the timeout only bounds how long a stop goes unnoticed
+        while not self.queue.wait_below(self.queue.pending_count, self.max_backlog, timeout=0.5):
+            if self._stopped(stop):
+                return False
+        return True
+
+    def _stopped(self, stop):
+        return self._cancelled.is_set() or (stop is not None and stop.is_set())
+
+    def _emit(self, name, **fields):
+        if self.on_event:
+            try:
+                self.on_event(name, **fields)
+            except Exception as e:
+                print(f"Error in import event callback: {e}", file=sys.stderr)
+
+
+class FolderWatcher:
+    """Polls a directory and ingests new list files and lines appended to known ones.
+
+    A scan only stats the directory entries, so polling costs next to
+    nothing between changes and needs no platform notification API. A last
+    line without a newline is taken once the file has not changed for
+    ``settle`` seconds.
+    """
+    def __init__(self, directory, ingestor, download_dir, format_selection="mp4", priority="normal",
+                 interval=2.0, settle=5.0):
+        self.directory = os.path.abspath(directory)
+        self.ingestor = ingestor
+        self.download_dir = download_dir
+        self.format_selection = format_selection
+        self.priority = priority
+        self.interval = interval
+        self.settle = settle
+        self._scanned = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=False):
+        self._stop.set()
+        if wait:
+            self._thread.join()
+
+    def scan(self):
+        now = time.time()
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.name.lower().endswith(INGEST_EXTENSIONS) and entry.is_file()]
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+        except OSError as e:
+            print(f"Error scanning watch folder: {e}", file=sys.stderr)
+            return
+        for entry in entries:
+            if self._stop.is_set():
+                return
+            stat = entry.stat()
+            settled = now - stat.st_mtime >= self.settle
+            state = (stat.st_ino, stat.st_size, stat.st_mtime_ns, settled)
+            path = os.path.abspath(entry.path)
+            if self._scanned.get(path) == state:
+                continue
+            try:
+                self.ingestor.ingest(path, self.download_dir, self.format_selection, self.priority,
+                                     final=settled, stop=self._stop)
+            except Exception as e:
+                print(f"Error importing {path}: {e}", file=sys.stderr)
+            if not self._stop.is_set():
+                self._scanned[path] = state
+        # Jobs started since the last scan let the saved offsets move on
+        self.ingestor.commit()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.scan()
+            self._stop.wait(self.interval)
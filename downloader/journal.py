@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+
+from downloader.download_queue import DownloadJob
+
+DEFAULT_PROGRESS_INTERVAL = 2.0
+
+
+def default_journal_file():
+    return os.path.join(os.path.expanduser("~"), ".youtube_downloader_journal.jsonl")
+
+
+class JobJournal:
+    """Write-ahead log of download jobs.
+
+    Every job writes a ``start`` record (job fields, yt-dlp options and
+    target path) before any network work, ``progress`` records at most every
+    ``progress_interval`` seconds, and an ``end`` record once it is done,
+    failed or cancelled. Jobs without an ``end`` record were interrupted and
+    can be resumed; yt-dlp continues them from their ``.part`` files.
+
+    Records are appended and fsynced one line at a time, so a crash loses at
+    most the last progress update.
+    """
+    def __init__(self, path=None, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+        self.path = path or default_journal_file()
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._last_progress = {}
+        self._file = None
+
+    def start(self, job, options=None, target=None):
+        self._append({'op': 'start', 'job': job.to_dict(), 'options': options or {},
+                      'target': target, 'time': time.time()})
+
+    def progress(self, job, d):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_progress.get(job.id, 0) < self.progress_interval:
+                return
+            self._last_progress[job.id] = now
+        self._append({'op': 'progress', 'id': job.id,
+                      'filename': d.get('filename'),
+                      'tmpfilename': d.get('tmpfilename'),
+                      'downloaded_bytes': d.get('downloaded_bytes'),
+                      'total_bytes': d.get('total_bytes') or d.get('total_bytes_estimate')})
+
+    def end(self, job, state):
+        with self._lock:
+            self._last_progress.pop(job.id, None)
+        self._append({'op': 'end', 'id': job.id, 'state': state, 'time': time.time()})
+
+    def unfinished(self):
+        """Replay the journal and return ``{job_id: record}`` for interrupted jobs.
+
+        Each record has the ``job`` dict, ``options``, ``target`` and the last
+        known ``progress``. A torn last line from a crash is ignored.
+        """
+        with self._lock:
+            return self._replay()
+
+    def _replay(self):
+        jobs = {}
+        if not os.path.exists(self.path):
+            return jobs
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                op = record.get('op')
+                if op == 'start':
+                    job_id = record['job']['id']
+                    jobs[job_id] = {'job': record['job'], 'options': record.get('options', {}),
+                                    'target': record.get('target'),
+                                    'progress': jobs.get(job_id, {}).get('progress')}
+                elif op == 'progress' and record.get('id') in jobs:
+                    jobs[record['id']]['progress'] = record
+                elif op == 'end':
+                    jobs.pop(record.get('id'), None)
+        return jobs
+
+    def load_jobs(self):
+        """Interrupted jobs as :class:`DownloadJob` objects keeping their ids"""
+        jobs = []
+        for record in self.unfinished().values():
+            job = DownloadJob.from_dict(record['job'])
+            progress = record.get('progress') or {}
+            job.resume_bytes = progress.get('downloaded_bytes') or 0
+            jobs.append(job)
+        return jobs
+
+    def compact(self):
+        """Rewrite the journal keeping only the records of unfinished jobs"""
+        with self._lock:
+            records = self._replay()
+            self._close()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in records.values():
+                    f.write(json.dumps({'op': 'start', 'job': record['job'],
+                                        'options': record['options'], 'target': record['target']}) + "\n")
+                    if record.get('progress'):
+                        f.write(json.dumps(record['progress']) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _append(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a+', encoding='utf-8')
+                if self._file.tell() > 0:
+                    # Terminate a line torn by a crash so the next record parses
+                    self._file.seek(self._file.tell() - 1)
+                    if self._file.read(1) != "\n":
+                        line = "\n" + line
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
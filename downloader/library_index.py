@@ -0,0 +1,173 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+# Hashing the first MiB (plus the size) tells files apart without reading them whole
+HEAD_BYTES = 1024 * 1024
+
+
+def default_index_file():
+    return os.path.join(os.path.expanduser("~"), ".youtube_downloader_library.sqlite3")
+
+
+def head_hash(path, size=None):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        digest.update(f.read(HEAD_BYTES))
+    if size is None:
+        size = os.path.getsize(path)
+    digest.update(str(size).encode('ascii'))
+    return digest.hexdigest()
+
+
+class LibraryIndex:
+    """Maps (video ID, format) to files in the download directories.
+
+    Files are identified by a hash of their first MiB and their size, so a
+    downloaded video that was renamed or moved within an indexed directory is
+    found again and relinked. Directories are rescanned only when their mtime
+    changes, and only new or modified files are hashed.
+    """
+    def __init__(self, path=None):
+        self.path = path or default_index_file()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                directory TEXT NOT NULL,
+                video_id TEXT,
+                format TEXT,
+                size INTEGER,
+                mtime REAL,
+                head_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS files_video ON files (video_id, format);
+            CREATE INDEX IF NOT EXISTS files_hash ON files (head_hash);
+            CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+            CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime REAL);
+        """)
+        self._conn.commit()
+
+    def lookup(self, video_id, format_selection, directories=()):
+        """Path of an existing download of this video and format, or None.
+
+        If the recorded file is gone, ``directories`` (and the file's old
+        directory) are rescanned and a file with the same head hash is
+        relinked.
+        """
+        if not video_id:
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM files WHERE video_id = ? AND format = ?",
+                (video_id, format_selection)).fetchall()
+            for row in rows:
+                if self._unchanged(row):
+                    return row['path']
+
+            search = {os.path.abspath(d) for d in directories if d}
+            search.update(row['directory'] for row in rows)
+            for directory in search:
+                self.scan(directory)
+
+            for row in rows:
+                if os.path.exists(row['path']):
+                    return row['path']
+                moved = self._conn.execute(
+                    "SELECT path FROM files WHERE head_hash = ? AND path != ? "
+                    "AND (video_id IS NULL OR video_id = ?)",
+                    (row['head_hash'], row['path'], video_id)).fetchone()
+                if moved:
+                    self._relink(row['path'], moved['path'])
+                    return moved['path']
+
+            row = self._conn.execute(
+                "SELECT path FROM files WHERE video_id = ? AND format = ?",
+                (video_id, format_selection)).fetchone()
+            return row['path'] if row and os.path.exists(row['path']) else None
+
+    def record(self, path, video_id, format_selection):
+        """Index a finished download; returns other files with the same content"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        digest = head_hash(path, stat.st_size)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, directory, video_id, format, size, mtime, head_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, os.path.dirname(path), video_id, format_selection, stat.st_size, stat.st_mtime, digest))
+            self._conn.commit()
+            duplicates = self._conn.execute(
+                "SELECT path FROM files WHERE head_hash = ? AND path != ?", (digest, path)).fetchall()
+        return [row['path'] for row in duplicates if os.path.exists(row['path'])]
+
+    def scan(self, directory, force=False):
+        """Bring the entries for ``directory`` up to date; cheap when nothing changed"""
+        directory = os.path.abspath(directory)
+        try:
+            dir_mtime = os.stat(directory).st_mtime
+        except OSError:
+            return
+        with self._lock:
+            known = self._conn.execute(
+                "SELECT mtime FROM directories WHERE path = ?", (directory,)).fetchone()
+            if known and known['mtime'] == dir_mtime and not force:
+                return
+
+            indexed = {row['path']: row for row in self._conn.execute(
+                "SELECT * FROM files WHERE directory = ?", (directory,))}
+            seen = set()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.is_file() or entry.name.endswith((".part", ".ytdl", ".tmp")):
+                        continue
+                    path = entry.path
+                    seen.add(path)
+                    stat = entry.stat()
+                    row = indexed.get(path)
+                    if row and row['size'] == stat.st_size and row['mtime'] == stat.st_mtime:
+                        continue
+                    try:
+                        digest = head_hash(path, stat.st_size)
+                    except OSError:
+                        continue
+                    if row:
+                        self._conn.execute("UPDATE files SET size = ?, mtime = ?, head_hash = ? WHERE path = ?",
+                                           (stat.st_size, stat.st_mtime, digest, path))
+                        continue
+                    # New files stay unidentified until lookup() relinks one by its hash
+                    self._conn.execute(
+                        "INSERT INTO files (path, directory, size, mtime, head_hash) VALUES (?, ?, ?, ?, ?)",
+                        (path, directory, stat.st_size, stat.st_mtime, digest))
+
+            # Forget unidentified files that disappeared; identified ones are
+            # kept so they can be relinked by hash if they turn up elsewhere.
+            for path, row in indexed.items():
+                if path not in seen and not row['video_id']:
+                    self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+            self._conn.execute("INSERT OR REPLACE INTO directories (path, mtime) VALUES (?, ?)",
+                               (directory, dir_mtime))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _unchanged(self, row):
+        try:
+            stat = os.stat(row['path'])
+        except OSError:
+            return False
+        return stat.st_size == row['size']
+
+    def _relink(self, old_path, new_path):
+        row = self._conn.execute("SELECT video_id, format FROM files WHERE path = ?", (old_path,)).fetchone()
+        self._conn.execute("UPDATE files SET video_id = ?, format = ? WHERE path = ?",
+                           (row['video_id'], row['format'], new_path))
+        self._conn.execute("DELETE FROM files WHERE path = ?", (old_path,))
+        self._conn.commit()
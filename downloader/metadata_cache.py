@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Stream URLs inside an info dict expire after a few hours, so cached entries
+# must not outlive them if the download path is going to reuse them.
+DEFAULT_TTL = 30 * 60
+DEFAULT_MAX_ENTRIES = 500
+
+VIDEO_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([0-9A-Za-z_-]{11})')
+
+
+def extract_video_id(url):
+    """The 11-character YouTube video ID in ``url``, or None"""
+    match = VIDEO_ID_RE.search(url or "")
+    return match.group(1) if match else None
+
+
+def default_cache_file():
+    return os.path.join(os.path.expanduser("~"), ".youtube_downloader_cache.sqlite3")
+
+
+class MetadataCache:
+    """On-disk cache of extracted info dicts keyed by video ID.
+
+    Entries expire ``ttl`` seconds after extraction; once more than
+    ``max_entries`` are stored the least recently used ones are evicted.
+    """
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or default_cache_file()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS info ("
+            "video_id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+            "fetched REAL NOT NULL, accessed REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS info_accessed ON info (accessed)")
+        self._conn.commit()
+
+    def get(self, video_id):
+        if not video_id:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, fetched FROM info WHERE video_id = ?", (video_id,)).fetchone()
+            if row and now - row[1] < self.ttl:
+                self._conn.execute("UPDATE info SET accessed = ? WHERE video_id = ?", (now, video_id))
+                self._conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            if row:
+                self._conn.execute("DELETE FROM info WHERE video_id = ?", (video_id,))
+                self._conn.commit()
+            self.misses += 1
+        return None
+
+    def put(self, video_id, info):
+        if not video_id or not info:
+            return
+        data = json.dumps(info, default=str)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO info (video_id, data, fetched, accessed) VALUES (?, ?, ?, ?)",
+                (video_id, data, now, now))
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, video_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM info WHERE video_id = ?", (video_id,))
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM info WHERE fetched < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM info").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM info").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM info WHERE video_id IN "
+                "(SELECT video_id FROM info ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,))
@@ -0,0 +1,281 @@
+import json
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PHASES = ("extract", "transfer", "postprocess")
+
+# Finished jobs kept for the diagnostics panel and snapshots
+FINISHED_JOBS_KEPT = 200
+
+FAILURE_CAUSES = (
+    ('format', re.compile(r'Requested format is not available')),
+    ('stalled', re.compile(r'Download stalled')),
+    ('circuit_open', re.compile(r'Too many recent failures from')),
+    ('http_403', re.compile(r'HTTP (?:Error )?403\b|403: Forbidden|403 Forbidden')),
+    ('http_429', re.compile(r'HTTP (?:Error )?429\b|Too Many Requests')),
+    ('unavailable', re.compile(r'Video unavailable|Private video|not available|has been removed', re.I)),
+    ('sign_in', re.compile(r'Sign in to confirm|age-restricted|members-only', re.I)),
+    ('ffmpeg', re.compile(r'ffmpeg', re.I)),
+    ('disk', re.compile(r'Not enough space|No space left|Errno 28|Permission denied|Errno 13|Disk quota')),
+    ('timeout', re.compile(r'timed out|timeout', re.I)),
+    ('network', re.compile(r'Connection|Network|getaddrinfo|Temporary failure|reset by peer|'
+                           r'IncompleteRead|SSL|HTTP (?:Error )?5\d\d|fragment|data blocks', re.I)),
+)
+
+
+def failure_cause(error):
+    """Short label for why a job failed, for counting failures by cause"""
+    text = str(error)
+    for cause, pattern in FAILURE_CAUSES:
+        if pattern.search(text):
+            return cause
+    return 'other'
+
+
+class Metrics:
+    """Counters and timings of downloads, for the diagnostics panel and exporters.
+
+    The engine and the post-processing stage only call into this when a
+    Metrics object is attached (``engine.set_metrics``), so running without
+    one costs a single ``is None`` check per hook. Every job gets a record
+    with its bytes, current speed, time spent in each phase (extraction,
+    transfer, post-processing), retries and failure cause; aggregates are
+    kept alongside. ``listeners`` are called with each finished job's record.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.listeners = []
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._phase_seconds = Counter()
+        self._phase_count = Counter()
+        self._jobs = OrderedDict()
+
+    def job_started(self, job):
+        with self._lock:
+            record = self._record(job)
+            record['state'] = 'running'
+            record['started'] = time.time()
+
+    def job_finished(self, job, error=None):
+        if error is None:
+            state = 'skipped' if job.skip_reason else 'done'
+        elif job.stop_request:
+            state = job.stop_request
+        else:
+            state = 'failed'
+        with self._lock:
+            record = self._record(job)
+            record.update(state=state, phase=None, speed=0, ended=time.time(), title=job.title)
+            self._counters['jobs', state] += 1
+            if state == 'failed':
+                record['error'] = str(error)
+                record['cause'] = failure_cause(error)
+                self._counters['failures', record['cause']] += 1
+            self._trim()
+            finished = self._public(record)
+        for listener in list(self.listeners):
+            listener(finished)
+
+    def job_retrying(self, job, cause):
+        """The job failed and waits for another attempt"""
+        with self._lock:
+            record = self._record(job)
+            record.update(state='retrying', phase=None, speed=0)
+            record['retries'] += 1
+            self._counters['retries', cause] += 1
+
+    @contextmanager
+    def phase(self, job, name):
+        self.enter_phase(job, name)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_phase(job, name, time.monotonic() - started)
+
+    def enter_phase(self, job, name):
+        with self._lock:
+            self._record(job)['phase'] = name
+
+    def add_phase(self, job, name, seconds):
+        with self._lock:
+            record = self._record(job)
+            record['phases'][name] = record['phases'].get(name, 0.0) + seconds
+            if record['phase'] == name:
+                record['phase'] = None
+            self._phase_seconds[name] += seconds
+            self._phase_count[name] += 1
+
+    def progress(self, job, d):
+        """Account a yt-dlp style progress dict (downloaded bytes are cumulative per file)"""
+        downloaded = d.get('downloaded_bytes') or 0
+        filename = d.get('filename')
+        with self._lock:
+            record = self._record(job)
+            last_filename, last = record['_last']
+            delta = downloaded - last if filename == last_filename and downloaded >= last else downloaded
+            record['_last'] = (filename, downloaded)
+            record['bytes'] += delta
+            record['speed'] = d.get('speed') or 0 if d['status'] == 'downloading' else 0
+            self._counters['bytes'] += delta
+
+    def retried(self, job=None, count=1, cause=None):
+        with self._lock:
+            if job is not None:
+                self._record(job)['retries'] += count
+            self._counters['retries', cause or 'other'] += count
+
+    def metadata_fetch(self, seconds, cached):
+        with self._lock:
+            self._counters['metadata_fetches'] += 1
+            self._counters['metadata_cache_hits'] += bool(cached)
+            self._phase_seconds['metadata'] += seconds
+            self._phase_count['metadata'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            jobs = [self._public(record) for record in self._jobs.values()]
+            counters = dict(self._counters)
+            phases = {name: {'seconds': round(self._phase_seconds[name], 3), 'count': self._phase_count[name]}
+                      for name in self._phase_seconds}
+        return {
+            'uptime': round(time.time() - self.started, 1),
+            'bytes': counters.get('bytes', 0),
+            'speed': sum(job['speed'] for job in jobs if job['state'] == 'running'),
+            'active': sum(1 for job in jobs if job['state'] == 'running'),
+            'jobs': {key[1]: value for key, value in counters.items() if key[0] == 'jobs'},
+            'failures': {key[1]: value for key, value in counters.items() if key[0] == 'failures'},
+            'retries': {key[1]: value for key, value in counters.items() if key[0] == 'retries'},
+            'phases': phases,
+            'metadata': {'fetches': counters.get('metadata_fetches', 0),
+                         'cache_hits': counters.get('metadata_cache_hits', 0)},
+            'job_details': jobs,
+        }
+
+    def prometheus(self):
+        """The snapshot in Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP ytdl_{name} {help_text}")
+            lines.append(f"# TYPE ytdl_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels.items())
+                lines.append(f"ytdl_{name}{{{label_text}}} {value}" if label_text else f"ytdl_{name} {value}")
+
+        metric("downloaded_bytes_total", "counter", "Bytes received by all jobs", [({}, snapshot['bytes'])])
+        metric("download_speed_bytes", "gauge", "Current combined download speed",
+               [({}, round(snapshot['speed'], 1))])
+        metric("active_jobs", "gauge", "Jobs currently running", [({}, snapshot['active'])])
+        metric("jobs_total", "counter", "Finished jobs by final state",
+               [({'state': state}, count) for state, count in sorted(snapshot['jobs'].items())])
+        metric("failures_total", "counter", "Failed jobs by cause",
+               [({'cause': cause}, count) for cause, count in sorted(snapshot['failures'].items())])
+        metric("retries_total", "counter", "Retried requests and segments by cause",
+               [({'cause': cause}, count) for cause, count in sorted(snapshot['retries'].items())])
+        metric("phase_seconds_total", "counter", "Time spent per phase",
+               [({'phase': name}, phase['seconds']) for name, phase in sorted(snapshot['phases'].items())])
+        metric("phase_count_total", "counter", "Completed phases",
+               [({'phase': name}, phase['count']) for name, phase in sorted(snapshot['phases'].items())])
+        metric("metadata_fetches_total", "counter", "Metadata lookups for previews and playlists",
+               [({}, snapshot['metadata']['fetches'])])
+        metric("metadata_cache_hits_total", "counter", "Metadata lookups answered from the cache",
+               [({}, snapshot['metadata']['cache_hits'])])
+        return "\n".join(lines) + "\n"
+
+    def _record(self, job):
+        record = self._jobs.get(job.id)
+        if record is None:
+            record = self._jobs[job.id] = {
+                'id': job.id, 'url': job.url, 'title': job.title, 'format': job.format_selection,
+                'state': 'running', 'phase': None, 'bytes': 0, 'speed': 0, 'retries': 0,
+                'phases': {}, 'cause': None, 'error': None, 'started': time.time(), 'ended': None,
+                '_last': (None, 0),
+            }
+        return record
+
+    def _public(self, record):
+        public = {key: value for key, value in record.items() if not key.startswith('_')}
+        public['phases'] = {name: round(seconds, 3) for name, seconds in record['phases'].items()}
+        return public
+
+    def _trim(self):
+        finished = [job_id for job_id, record in self._jobs.items() if record['ended']]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self._jobs[job_id]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.metrics.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PrometheusExporter:
+    """Serves ``/metrics`` on a local port for Prometheus to scrape"""
+    def __init__(self, metrics, port=9464, host="127.0.0.1"):
+        self.server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.metrics = metrics
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JsonlMetricsLog:
+    """Appends a ``job`` line per finished job and a ``snapshot`` line every ``interval`` seconds"""
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        metrics.listeners.append(self._job_finished)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.metrics.listeners.remove(self._job_finished)
+        self._snapshot()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._snapshot()
+
+    def _snapshot(self):
+        snapshot = self.metrics.snapshot()
+        snapshot['job_details'] = [job for job in snapshot['job_details'] if job['state'] == 'running']
+        self._write('snapshot', snapshot)
+
+    def _job_finished(self, record):
+        self._write('job', record)
+
+    def _write(self, kind, record):
+        line = json.dumps(dict(record, type=kind, time=round(time.time(), 3)), ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
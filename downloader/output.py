@@ -0,0 +1,304 @@
+import glob
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import weakref
+
+MB = 1024 * 1024
+
+# Hidden directory on every volume where downloads stay until they are complete
+INCOMPLETE_DIR = ".incomplete"
+
+# Free space left alone on every volume, for the system and other programs
+DEFAULT_HEADROOM = 256 * MB
+
+# filesize_approx is bitrate × duration and often a little low
+APPROX_MARGIN = 1.1
+
+# Same bitrate as downloader.postprocess.MP3_ARGS
+MP3_BYTES_PER_SECOND = 192 * 1000 // 8
+
+# The placeholder file stays this far below what the download still needs,
+# and is shrunk each time the download has used up half of that gap
+SHRINK_STEP = 8 * MB
+
+# Weight of the newest job in a volume's average write throughput
+THROUGHPUT_SMOOTHING = 0.3
+
+SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kKmMgGtT]?)i?[bB]?\s*$')
+
+
+class OutOfSpaceError(Exception):
+    pass
+
+
+def incomplete_dir(directory):
+    return os.path.join(directory, INCOMPLETE_DIR)
+
+
+def parse_size(text):
+    """Bytes from ``"2G"``, ``"500M"``, ``"1.5"`` (GB if no unit)"""
+    match = SIZE_RE.match(str(text))
+    if not match:
+        raise ValueError(f"Invalid size: {text!r}")
+    value, unit = float(match.group(1)), match.group(2).lower()
+    return int(value * {'': 1024 * MB, 'k': 1024, 'm': MB, 'g': 1024 * MB, 't': 1024 * 1024 * MB}[unit])
+
+
+def size_text(size):
+    return f"{size / 1024 / MB:.2f} GB" if size >= 1024 * MB else f"{size / MB:.0f} MB"
+
+
+def estimate_size(info, format_selection=None):
+    """Bytes a download of an info dict with its formats selected needs on disk, or None.
+
+    Streams merged by ffmpeg are counted twice, as the merged file is
+    written before the streams are deleted, and MP3 jobs add the converted
+    file.
+    """
+    formats = info.get('requested_formats') or [info]
+    total = 0
+    for f in formats:
+        size = f.get('filesize') or int((f.get('filesize_approx') or 0) * APPROX_MARGIN)
+        if not size:
+            return None
+        total += size
+    if len(formats) > 1:
+        total *= 2
+    if format_selection == "mp3" and info.get('duration'):
+        total += int(info['duration'] * MP3_BYTES_PER_SECOND)
+    return total
+
+
+class Volume:
+    def __init__(self, directory):
+        self.directory = directory
+        self.active = 0
+        self.throughput = None
+        self.cleaned = False
+
+    def free(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return shutil.disk_usage(self.directory).free
+
+
+class _Reservation:
+    def __init__(self, volume, size, path):
+        self.volume = volume
+        self.size = size
+        self.path = path
+        self.held = 0
+        self.written = 0
+        self.last = (None, 0)
+        self.started = None
+
+    def outstanding(self):
+        """Reserved bytes not yet on disk, either downloaded or held by the placeholder"""
+        return max(0, self.size - self.written - self.held)
+
+
+class OutputManager:
+    """Decides where downloads are written and keeps them from filling a disk.
+
+    :meth:`place` picks a job's directory before anything is downloaded:
+    its own ``download_dir`` or one of ``volumes`` (directories, usually on
+    other disks), whichever has room and the best measured write throughput
+    per running job. Once the format is selected, :meth:`reserve` checks the
+    ``filesize``/``filesize_approx`` of the info dict against the free space
+    above ``headroom``, less what running jobs still need. With
+    ``preallocate``, the space is also taken on disk by a placeholder file
+    that shrinks as the download grows, so other programs cannot fill it.
+
+    Downloads are written to :data:`INCOMPLETE_DIR` on the same volume and
+    renamed into place when complete (see :meth:`ydl_paths`), so a file
+    under its final name is always whole.
+    """
+    def __init__(self, volumes=(), headroom=DEFAULT_HEADROOM, preallocate=True):
+        self.headroom = headroom
+        self.preallocate = preallocate
+        self._lock = threading.Lock()
+        self._volumes = {}
+        self._reservations = {}
+        self._sizes = {}
+        # The directory each job asked for, as place() changes job.download_dir
+        self._homes = weakref.WeakKeyDictionary()
+        self.extra = [self._volume(directory) for directory in volumes]
+
+    @staticmethod
+    def ydl_paths(directory):
+        """yt-dlp ``paths`` writing into the volume's incomplete directory first"""
+        return {'home': directory, 'temp': INCOMPLETE_DIR}
+
+    def place(self, job, size=None):
+        """Move ``job.download_dir`` to the volume that should take the job.
+
+        ``size`` defaults to the size a failed :meth:`reserve` found. Raises
+        OutOfSpaceError if no volume has room.
+        """
+        own = self._volume(job.download_dir)
+        home = self._volume(self._homes.setdefault(job, job.download_dir))
+        candidates = list(dict.fromkeys([own, home] + self.extra))
+        with self._lock:
+            size = size if size is not None else self._sizes.get(job.id, 0)
+            rooms = {volume: self._room(volume) for volume in candidates}
+            # A resumed job goes back to its .part file
+            if job.resume_bytes and rooms[own] >= size:
+                return own.directory
+            fitting = [volume for volume in candidates if rooms[volume] >= size]
+            if not fitting:
+                best = max(candidates, key=lambda volume: rooms[volume])
+                raise OutOfSpaceError(self._shortage(best, size, rooms[best]))
+            volume = max(fitting, key=lambda volume: (self._score(volume), rooms[volume]))
+        self._clean(volume)
+        job.download_dir = volume.directory
+        return volume.directory
+
+    def reserve(self, job, info):
+        """Hold the space the job's selected format needs until :meth:`release`.
+
+        Raises OutOfSpaceError if the job's volume cannot take it; if another
+        volume can, the job is placed there and ``True`` is returned instead
+        so the caller can start over.
+        """
+        size = estimate_size(info, job.format_selection)
+        volume = self._volume(job.download_dir)
+        with self._lock:
+            self._release_locked(job.id)
+            room = self._room(volume)
+            if size is not None and size > room:
+                self._sizes[job.id] = size
+                shortage = self._shortage(volume, size, room)
+            else:
+                self._sizes.pop(job.id, None)
+                path = os.path.join(incomplete_dir(volume.directory), f"{job.id}.reserve")
+                reservation = self._reservations[job.id] = _Reservation(volume, size or 0, path)
+                volume.active += 1
+                shortage = None
+        if shortage:
+            try:
+                self.place(job, size)
+            except OutOfSpaceError:
+                self._sizes.pop(job.id, None)
+                raise OutOfSpaceError(shortage)
+            return True
+        if self.preallocate and reservation.size > SHRINK_STEP:
+            self._allocate(reservation, reservation.size - SHRINK_STEP)
+        return False
+
+    def progress(self, job, d):
+        """Account a yt-dlp style progress dict against the job's reservation"""
+        reservation = self._reservations.get(job.id)
+        if reservation is None or d['status'] != 'downloading':
+            return
+        downloaded = d.get('downloaded_bytes') or 0
+        filename = d.get('filename')
+        with self._lock:
+            last_filename, last = reservation.last
+            delta = downloaded - last if filename == last_filename and downloaded >= last else downloaded
+            reservation.last = (filename, downloaded)
+            reservation.written += delta
+            if reservation.started is None:
+                reservation.started = time.monotonic()
+            target = max(0, reservation.size - reservation.written - SHRINK_STEP)
+            shrink = reservation.held - target >= SHRINK_STEP // 2
+        if shrink:
+            self._allocate(reservation, target)
+
+    def allocated(self, job):
+        """The job preallocated its whole file itself, which takes over from the placeholder"""
+        with self._lock:
+            reservation = self._reservations.get(job.id)
+            if reservation is None:
+                return
+            reservation.size = 0
+        if reservation.held:
+            self._allocate(reservation, 0)
+
+    def release(self, job):
+        with self._lock:
+            reservation = self._release_locked(job.id)
+        if reservation is not None and reservation.held:
+            self._remove(reservation.path)
+
+    def stats(self):
+        with self._lock:
+            return [{'directory': volume.directory, 'active': volume.active,
+                     'throughput': round(volume.throughput) if volume.throughput else None,
+                     'room': self._room(volume)} for volume in self._volumes.values()]
+
+    def _volume(self, directory):
+        directory = os.path.abspath(directory)
+        volume = self._volumes.get(directory)
+        if volume is None:
+            volume = self._volumes[directory] = Volume(directory)
+        return volume
+
+    def _room(self, volume):
+        """Free bytes above the headroom that no running job has claimed"""
+        claimed = sum(r.outstanding() for r in self._reservations.values() if r.volume is volume)
+        return volume.free() - self.headroom - claimed
+
+    def _score(self, volume):
+        # Untried volumes come first so each gets a measurement
+        if volume.throughput is None:
+            return float('inf')
+        return volume.throughput / (volume.active + 1)
+
+    def _shortage(self, volume, size, room):
+        return (f"Not enough space in {volume.directory}: needs {size_text(size)}, "
+                f"{size_text(max(room, 0))} free above the {size_text(self.headroom)} kept free")
+
+    def _release_locked(self, job_id):
+        reservation = self._reservations.pop(job_id, None)
+        if reservation is None:
+            return None
+        volume = reservation.volume
+        volume.active -= 1
+        elapsed = time.monotonic() - reservation.started if reservation.started else 0
+        if elapsed > 0.1 and reservation.written:
+            rate = reservation.written / elapsed
+            volume.throughput = rate if volume.throughput is None else (
+                THROUGHPUT_SMOOTHING * rate + (1 - THROUGHPUT_SMOOTHING) * volume.throughput)
+        return reservation
+
+    def _allocate(self, reservation, size):
+        """Grow or shrink the placeholder file to ``size`` bytes"""
+        try:
+            if size and not reservation.held:
+                os.makedirs(os.path.dirname(reservation.path), exist_ok=True)
+                with open(reservation.path, 'wb') as f:
+                    if hasattr(os, 'posix_fallocate'):
+                        os.posix_fallocate(f.fileno(), 0, size)
+                    else:
+                        f.truncate(size)
+            elif size:
+                os.truncate(reservation.path, size)
+            else:
+                self._remove(reservation.path)
+        except OSError as e:
+            # The space is still accounted for in this process
+            print(f"Error preallocating {reservation.path}: {e}", file=sys.stderr)
+            self._remove(reservation.path)
+            size = 0
+        with self._lock:
+            reservation.held = size
+
+    def _clean(self, volume):
+        """Remove placeholders left behind by a crash, once per volume"""
+        if volume.cleaned:
+            return
+        volume.cleaned = True
+        with self._lock:
+            active = {r.path for r in self._reservations.values()}
+        for path in glob.glob(os.path.join(incomplete_dir(volume.directory), "*.reserve")):
+            if path not in active:
+                self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,151 @@
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from downloader.download_queue import DownloadJob
+
+PLAYLIST_URL_RE = re.compile(
+    r'youtube\.com/(?:playlist\?|.*[?&]list=|@[^/?#]+|channel/|c/|user/)')
+
+DEFAULT_RESOLVERS = 4
+
+# Resolved jobs allowed to wait for a worker before resolving pauses; their
+# metadata has to still be in the engine's cache (500 entries, 30 minutes)
+# when a worker takes them, or the video is extracted a second time
+DEFAULT_BACKLOG = 8
+
+
+def is_playlist_url(url):
+    return bool(PLAYLIST_URL_RE.search(url or ""))
+
+
+def entry_url(entry):
+    """Watch URL for a flat playlist entry"""
+    url = entry.get('url') or ""
+    if url.startswith("http"):
+        return url
+    video_id = entry.get('id') or url
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class PlaylistExpander:
+    """Streams the videos of a playlist or channel into a download queue.
+
+    Entries are enumerated lazily with yt-dlp's flat extraction, so pages are
+    only requested as the iteration reaches them. Each entry's full metadata
+    is resolved (and left in the engine's metadata cache for the download) by
+    at most ``max_resolvers`` threads; enumeration blocks while they are all
+    busy, which keeps memory flat however long the playlist is. While
+    ``queue`` holds ``max_backlog`` or more jobs waiting for a worker,
+    resolving waits too, so resolved entries stay a short window ahead of
+    the downloads.
+
+    ``submit(job)`` receives every resolved job. ``skip(url)`` can reject
+    entries, e.g. ones already in the download history. ``on_event(name, **fields)``
+    reports ``playlist``, ``skipped``, ``unavailable`` and ``finished`` events.
+    """
+    def __init__(self, engine, submit, max_resolvers=DEFAULT_RESOLVERS, skip=None, on_event=None,
+                 queue=None, max_backlog=DEFAULT_BACKLOG):
+        self.engine = engine
+        self.submit = submit
+        self.max_resolvers = max_resolvers
+        self.queue = queue
+        self.max_backlog = max_backlog
+        self.skip = skip
+        self.on_event = on_event
+        self.queued = 0
+        self.skipped = 0
+        self.unavailable = 0
+        self._cancelled = threading.Event()
+        self._slots = threading.BoundedSemaphore(max_resolvers)
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def iter_entries(self, url):
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'extract_flat': 'in_playlist',
+        }
+
+        with self.engine.sessions.lease(ydl_opts) as ydl:
+            # process=False keeps 'entries' as the extractor's lazy generator
+            result = ydl.extract_info(url, download=False, process=False)
+            if not result:
+                return
+            if result.get('_type') not in ('playlist', 'multi_video'):
+                yield {'id': result.get('id'), 'url': result.get('webpage_url') or url,
+                       'title': result.get('title')}
+                return
+
+            self._emit('playlist', title=result.get('title'), id=result.get('id'))
+            for entry in result.get('entries') or []:
+                if entry:
+                    yield entry
+
+    def expand(self, url, download_dir, format_selection="mp4", priority="normal"):
+        """Enumerate ``url`` and queue its entries; blocks until all are resolved"""
+        with ThreadPoolExecutor(max_workers=self.max_resolvers,
+                                thread_name_prefix="playlist-resolver") as executor:
+            for entry in self.iter_entries(url):
+                if self._cancelled.is_set():
+                    break
+
+                video_url = entry_url(entry)
+                if self.skip and self.skip(video_url):
+                    with self._lock:
+                        self.skipped += 1
+                    self._emit('skipped', url=video_url, title=entry.get('title'))
+                    continue
+
+                if not self._wait_for_room():
+                    break
+                self._slots.acquire()
+                if self._cancelled.is_set():
+                    self._slots.release()
+                    break
+                job = DownloadJob(video_url, download_dir, format_selection, priority)
+                job.title = entry.get('title')
+                executor.submit(self._resolve, job)
+
+        self._emit('finished', queued=self.queued, skipped=self.skipped, unavailable=self.unavailable)
+
+    def _resolve(self, job):
+        try:
+            info = self.engine.fetch_info(job.url)
+            if info and info.get('title'):
+                job.title = info['title']
+        except Exception as e:
+            with self._lock:
+                self.unavailable += 1
+            self._emit('unavailable', url=job.url, title=job.title, error=str(e))
+            return
+        finally:
+            self._slots.release()
+
+        if self._cancelled.is_set():
+            return
+        self.submit(job)
+        with self._lock:
+            self.queued += 1
+
+    def _wait_for_room(self):
+        if self.queue is None:
+            return True
+        # The queue wakes us when a worker takes a job; the timeout only
+        # bounds how long a cancel goes unnoticed
+        while not self.queue.wait_below(self.queue.queued_count, self.max_backlog, timeout=0.5):
+            if self._cancelled.is_set():
+                return False
+        return True
+
+    def _emit(self, name, **fields):
+        if self.on_event:
+            try:
+                self.on_event(name, **fields)
+            except Exception as e:
+                print(f"Error in playlist event callback: {e}", file=sys.stderr)
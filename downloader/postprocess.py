@@ -0,0 +1,217 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from downloader.download_queue import JobInterrupted
+from downloader.output import incomplete_dir
+
+# Same encoding as yt-dlp's FFmpegExtractAudio with preferredquality 192
+MP3_ARGS = ("-vn", "-c:a", "libmp3lame", "-b:a", "192k")
+
+
+class PostProcessingError(Exception):
+    pass
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def mp3_output(source, directory=None):
+    """``(path, ffmpeg arguments)`` of the MP3 converted from ``source``"""
+    name = os.path.splitext(os.path.basename(source))[0] + ".mp3"
+    return os.path.join(directory or os.path.dirname(source), name), MP3_ARGS
+
+
+def temp_path(path):
+    """Where ffmpeg writes ``path`` until it is complete; keeps the extension for the muxer"""
+    directory, name = os.path.split(path)
+    base, ext = os.path.splitext(name)
+    return os.path.join(incomplete_dir(directory), f"{base}.temp{ext}")
+
+
+class _Request:
+    def __init__(self, job, source, outputs, duration, keep_source, then):
+        self.job = job
+        self.source = source
+        self.outputs = list(outputs)
+        self.duration = duration
+        self.keep_source = keep_source
+        self.then = then
+        self.future = Future()
+
+
+class PostProcessingStage:
+    """Runs ffmpeg conversions apart from the download workers.
+
+    Download workers hand a finished file to :meth:`submit` and move on to
+    the next network job; ``workers`` threads (one per core by default)
+    each supervise one ffmpeg process, which is where the CPU work happens.
+    A job whose pause or cancel was requested is dropped, and its ffmpeg is
+    killed.
+
+    ``on_progress(job, progress)`` gets ``{'status': 'converting', ...}``
+    dicts while ffmpeg runs, on the stage's threads. With ``metrics`` (see
+    :class:`~downloader.metrics.Metrics`) each job is charged the time its
+    ffmpeg run took.
+    """
+    def __init__(self, workers=None, ffmpeg=None, on_progress=None):
+        self.workers = workers or default_workers()
+        self.ffmpeg = ffmpeg
+        self.on_progress = on_progress
+        self.metrics = None
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="postprocess")
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._closed = False
+
+    def submit(self, job, source, outputs, duration=None, keep_source=False, then=None):
+        """Convert ``source`` into ``outputs`` (``[(path, ffmpeg args), ...]``) in one ffmpeg run.
+
+        ``then()`` runs on the stage's thread once the outputs are in place.
+        Returns a Future resolving to the output paths; it fails with
+        :class:`~downloader.download_queue.JobInterrupted` if the job was
+        paused or cancelled. ``source`` is deleted after a successful
+        conversion unless ``keep_source``.
+        """
+        request = _Request(job, source, outputs, duration, keep_source, then)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Post-processing stage has been shut down")
+            self._pool.submit(self._run, request)
+        return request.future
+
+    def shutdown(self):
+        """Stop converting; unfinished requests fail with their job's stop request"""
+        with self._lock:
+            self._closed = True
+            processes = list(self._processes)
+        for process in processes:
+            process.kill()
+        self._pool.shutdown(wait=False)
+
+    def _run(self, request):
+        if request.job.stop_request or self._closed:
+            self._fail(request, None)
+            return
+
+        ffmpeg = self.ffmpeg or shutil.which("ffmpeg")
+        if not ffmpeg:
+            self._fail(request, PostProcessingError("ffmpeg not found; it is needed to convert to MP3"))
+            return
+
+        command = [ffmpeg, "-y", "-nostdin", "-loglevel", "error", "-nostats",
+                   "-progress", "pipe:1", "-i", request.source]
+        for path, args in request.outputs:
+            command += list(args) + [temp_path(path)]
+
+        try:
+            for path, _ in request.outputs:
+                os.makedirs(os.path.dirname(temp_path(path)), exist_ok=True)
+            with tempfile.TemporaryFile() as errors:
+                returncode = self._supervise(request, command, errors)
+                errors.seek(0)
+                message = errors.read().decode('utf-8', 'replace').strip()
+        except Exception as e:
+            self._remove_temp(request.outputs)
+            self._fail(request, e)
+            return
+
+        if returncode != 0 or request.job.stop_request:
+            self._remove_temp(request.outputs)
+            if request.job.stop_request or self._closed:
+                self._fail(request, None)
+            else:
+                last_line = message.splitlines()[-1] if message else f"exit code {returncode}"
+                self._fail(request, PostProcessingError(f"ffmpeg failed: {last_line}"))
+            return
+
+        try:
+            for path, _ in request.outputs:
+                os.replace(temp_path(path), path)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+
+        produced = {os.path.abspath(path) for path, _ in request.outputs}
+        if not request.keep_source and os.path.abspath(request.source) not in produced:
+            try:
+                os.remove(request.source)
+            except OSError as e:
+                print(f"Error removing {request.source}: {e}", file=sys.stderr)
+
+        try:
+            if request.then:
+                request.then()
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        request.future.set_result([path for path, _ in request.outputs])
+
+    def _supervise(self, request, command, errors):
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.enter_phase(request.job, 'postprocess')
+        started = time.monotonic()
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors,
+                                   stdin=subprocess.DEVNULL, text=True)
+        with self._lock:
+            self._processes.add(process)
+        try:
+            progress = {}
+            for line in process.stdout:
+                key, _, value = line.strip().partition("=")
+                progress[key] = value
+                if key == 'progress':
+                    self._report(request, progress)
+                    progress = {}
+                # ffmpeg writes a progress block about twice a second
+                if request.job.stop_request:
+                    process.kill()
+                    break
+            return process.wait()
+        finally:
+            process.stdout.close()
+            with self._lock:
+                self._processes.discard(process)
+            if metrics is not None:
+                metrics.add_phase(request.job, 'postprocess', time.monotonic() - started)
+
+    def _report(self, request, block):
+        duration = request.duration
+        out_time = block.get('out_time_us') or block.get('out_time_ms') or ""
+        position = int(out_time) / 1e6 if out_time.isdigit() else 0.0
+        if block.get('progress') == 'end':
+            percent = 100.0
+        elif duration:
+            percent = min(position * 100 / duration, 99.9)
+        else:
+            percent = 0.0
+        speed = block.get('speed', "").rstrip("x").strip()
+        try:
+            speed = float(speed)
+        except ValueError:
+            speed = 0.0
+        eta = int((duration - position) / speed) if duration and speed else 0
+
+        progress = {'status': 'converting', 'percent': percent, 'position': position,
+                    'speed': speed, 'eta': max(eta, 0)}
+        request.job.percent = percent
+        request.job.progress = progress
+        if self.on_progress:
+            self.on_progress(request.job, progress)
+
+    def _fail(self, request, error):
+        request.future.set_exception(error or JobInterrupted(request.job.stop_request or "cancelled"))
+
+    def _remove_temp(self, outputs):
+        for path, _ in outputs:
+            try:
+                os.remove(temp_path(path))
+            except OSError:
+                pass
@@ -0,0 +1,176 @@
+import statistics
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from downloader.metadata_cache import extract_video_id
+
+# Served for every video, so the preview needs no extraction to show it
+THUMBNAIL_URL = "https://i.ytimg.com/vi/{}/hqdefault.jpg"
+
+
+def thumbnail_url(url):
+    """The thumbnail of the video in ``url``, derived from its ID, or None"""
+    video_id = extract_video_id(url)
+    return THUMBNAIL_URL.format(video_id) if video_id else None
+
+
+class AdaptiveDebounce:
+    """How long to wait after an edit of the URL field before resolving it.
+
+    A URL that already holds a complete video ID is resolved at once (a
+    paste, or the last keystroke of a typed ID). Anything else waits for a
+    pause in typing, sized from the user's own recent keystroke gaps.
+    """
+    def __init__(self, minimum=0.15, maximum=1.0, factor=2.0, samples=8):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self._gaps = deque(maxlen=samples)
+        self._last = None
+
+    def delay(self, url, now=None):
+        now = time.monotonic() if now is None else now
+        if self._last is not None and now - self._last < self.maximum:
+            self._gaps.append(now - self._last)
+        self._last = now
+
+        if extract_video_id(url):
+            return 0.0
+        if not self._gaps:
+            return self.maximum / 2
+        return min(max(statistics.median(self._gaps) * self.factor, self.minimum), self.maximum)
+
+
+class Prefetcher:
+    """Resolves video metadata before it is needed.
+
+    :meth:`request` is the preview the user is waiting for: it runs on the
+    foreground workers and only its latest call is delivered, so an older
+    lookup that finishes late never overwrites a newer one, and a superseded
+    lookup that has not started yet is dropped. :meth:`warm` resolves queued
+    and copied URLs on a single background worker. Lookups of the same
+    video share one extraction and recent results are kept in memory.
+    """
+    def __init__(self, fetch_info, workers=2, memory_entries=64):
+        self.fetch_info = fetch_info
+        self.memory_entries = memory_entries
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._current = None
+        self._inflight = {}
+        self._results = OrderedDict()
+        self._foreground = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch-warm")
+
+    def request(self, url, on_info, on_error=None):
+        """Resolve ``url`` and call ``on_info(info, token)`` (or ``on_error(error, token)``).
+
+        Callbacks run on a worker thread, or at once on the calling thread
+        for a result still in memory, and only while the request is current.
+        Returns the request token; see :meth:`is_current`.
+        """
+        key = extract_video_id(url) or url
+        with self._lock:
+            self._generation += 1
+            token = self._generation
+            self.stats['requests'] += 1
+            info = self._remembered(key)
+            future = None
+            if info is None:
+                future = self._inflight.get(key)
+                if future is None:
+                    future = self._start(key)
+                    self._foreground.submit(self._run, key, url, future)
+                else:
+                    self.stats['shared'] += 1
+            self._supersede(future)
+
+        if info is not None:
+            self.stats['memory_hits'] += 1
+            on_info(info, token)
+        else:
+            future.add_done_callback(lambda f: self._deliver(f, token, on_info, on_error))
+        return token
+
+    def warm(self, url, wanted=None):
+        """Resolve ``url`` in the background so a later request or download finds it ready.
+
+        ``wanted()`` is asked again right before the lookup starts, e.g. to
+        skip a queued job that a download worker picked up in the meantime.
+        """
+        self._background.submit(self._warm, extract_video_id(url) or url, url, wanted)
+
+    def cancel(self):
+        """Drop the result of the current request"""
+        with self._lock:
+            self._generation += 1
+            self._supersede(None)
+
+    def is_current(self, token):
+        return token == self._generation
+
+    def close(self):
+        self.cancel()
+        self._foreground.shutdown(wait=False)
+        self._background.shutdown(wait=False)
+
+    def _start(self, key):
+        future = Future()
+        self._inflight[key] = future
+        return future
+
+    def _supersede(self, future):
+        """Cancel the previous request's lookup unless it has started or is the new one"""
+        previous, self._current = self._current, future
+        if previous is not None and previous is not future and previous.cancel():
+            self.stats['cancelled'] += 1
+            for key, inflight in list(self._inflight.items()):
+                if inflight is previous:
+                    del self._inflight[key]
+
+    def _warm(self, key, url, wanted):
+        if wanted is not None and not wanted():
+            return
+        with self._lock:
+            if key in self._results or key in self._inflight:
+                return
+            future = self._start(key)
+        self.stats['warmed'] += 1
+        self._run(key, url, future)
+
+    def _run(self, key, url, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            info = self.fetch_info(url)
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._inflight.pop(key, None)
+            if info:
+                self._results[key] = info
+                self._results.move_to_end(key)
+                while len(self._results) > self.memory_entries:
+                    self._results.popitem(last=False)
+        future.set_result(info)
+
+    def _remembered(self, key):
+        info = self._results.get(key)
+        if info is not None:
+            self._results.move_to_end(key)
+        return info
+
+    def _deliver(self, future, token, on_info, on_error):
+        if future.cancelled() or not self.is_current(token):
+            return
+        error = future.exception()
+        if error is None:
+            on_info(future.result(), token)
+        elif on_error is not None:
+            on_error(error, token)
@@ -0,0 +1,92 @@
+import threading
+
+# How often the UI samples the progress board
+UI_REFRESH_HZ = 10
+
+
+def progress_fields(d):
+    """Numbers from a yt-dlp progress dict, without any string formatting.
+
+    This runs for every yt-dlp callback, so it is kept as cheap as possible;
+    text is produced later by :func:`progress_text` at display rate.
+    Returns None for updates that carry nothing worth reporting.
+    """
+    status = d['status']
+    if status == 'downloading':
+        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+        if total_bytes <= 0:
+            return None
+        downloaded_bytes = d.get('downloaded_bytes') or 0
+        return {
+            'status': status,
+            'percent': downloaded_bytes * 100 / total_bytes,
+            'downloaded_bytes': downloaded_bytes,
+            'total_bytes': total_bytes,
+            'speed': d.get('speed') or 0,
+            'eta': d.get('eta') or 0,
+        }
+
+    if status == 'finished':
+        return {
+            'status': status,
+            'percent': 100.0,
+            'downloaded_bytes': d.get('downloaded_bytes') or d.get('total_bytes') or 0,
+            'filename': d.get('filename'),
+        }
+
+    return None
+
+
+def speed_text(speed):
+    if speed:
+        return f"{speed / 1024 / 1024:.2f} MB/s"
+    return "-- MB/s"
+
+
+def progress_text(progress):
+    """Status line for the progress label"""
+    if progress['status'] == 'finished':
+        return "Download finished, processing file..."
+
+    if progress['status'] == 'converting':
+        return f"Converting: {progress['percent']:.1f}% ({progress['speed']:.1f}x)"
+
+    if progress['eta']:
+        eta_str = f"{progress['eta']} seconds remaining"
+    else:
+        eta_str = "calculating..."
+    return f"Downloading: {progress['percent']:.1f}% ({speed_text(progress['speed'])}, {eta_str})"
+
+
+def short_progress_text(progress):
+    """Compact form for a queue row"""
+    if progress['status'] == 'finished':
+        return "Processing..."
+    if progress['status'] == 'converting':
+        return f"Converting {progress['percent']:.1f}%"
+    return f"{progress['percent']:.1f}% ({speed_text(progress['speed'])})"
+
+
+class ProgressBoard:
+    """Latest progress of each job, written by download threads and read by the UI.
+
+    Writers only replace one dict entry under a lock held for a few
+    instructions, so hundreds of callbacks per second cost next to nothing.
+    The UI calls :meth:`drain` on a fixed timer and redraws every job that
+    changed since the previous frame in one batch.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._changed = {}
+
+    def update(self, job, progress):
+        with self._lock:
+            self._changed[job.id] = (job, progress)
+
+    def drain(self):
+        """``[(job, progress), ...]`` for jobs updated since the last call"""
+        with self._lock:
+            if not self._changed:
+                return []
+            changed, self._changed = self._changed, {}
+        return list(changed.values())
@@ -0,0 +1,291 @@
+import random
+import re
+import threading
+import time
+
+from downloader.download_queue import JobInterrupted, RetryLater
+from downloader.metrics import failure_cause
+
+TRANSIENT = "transient"
+THROTTLED = "throttled"
+PERMANENT = "permanent"
+
+# Failure causes (see downloader.metrics.failure_cause) worth another attempt;
+# anything else, including unknown errors, fails the job right away
+CAUSE_KINDS = {
+    'network': TRANSIENT,
+    'timeout': TRANSIENT,
+    'stalled': TRANSIENT,
+    # Signed stream URLs expire; the next attempt extracts fresh ones
+    'http_403': TRANSIENT,
+    'http_429': THROTTLED,
+    'circuit_open': THROTTLED,
+}
+
+DEFAULT_ATTEMPTS = 5
+DEFAULT_STALL_SPEED = 16 * 1024
+DEFAULT_STALL_WINDOW = 30.0
+
+_HOST_RE = re.compile(r'^(?:[\w+.-]+:)*(?://)?([^/:?#]+)')
+
+
+class StallError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def classify(error):
+    """``(cause, kind)`` of an error, kind being TRANSIENT, THROTTLED or PERMANENT"""
+    if isinstance(error, JobInterrupted):
+        return 'interrupted', PERMANENT
+    cause = failure_cause(error)
+    return cause, CAUSE_KINDS.get(cause, PERMANENT)
+
+
+def host_of(url):
+    """The site a URL points at, with youtu.be, www. and m. folded into youtube.com"""
+    match = _HOST_RE.match(url or "")
+    host = match.group(1).lower() if match else ""
+    for prefix in ("www.", "m.", "music."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return "youtube.com" if host == "youtu.be" else host
+
+
+class Backoff:
+    """Exponential backoff with jitter: attempt n waits between half and all of ``base * factor**n``"""
+    def __init__(self, base=1.0, factor=2.0, maximum=60.0, throttled_base=10.0, rng=None):
+        self.base = base
+        self.factor = factor
+        self.maximum = maximum
+        self.throttled_base = throttled_base
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt, throttled=False):
+        base = self.throttled_base if throttled else self.base
+        ceiling = min(self.maximum, base * self.factor ** attempt)
+        return ceiling / 2 + self.rng.uniform(0, ceiling / 2)
+
+
+class CircuitBreaker:
+    """Stops sending work to a host after ``threshold`` failures in a row.
+
+    While open, :meth:`allow` returns the seconds until the host may be
+    tried again. After ``cooldown`` seconds a single trial is let through
+    (half-open); its success closes the breaker, its failure reopens it.
+    A trial that ends without telling either way (a permanent error, a
+    pause or cancel) must be :meth:`release`-d so the next one can start.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0.0
+        self.trial = None
+        self._lock = threading.Lock()
+
+    def allow(self, now=None, owner=True):
+        """0 if ``owner`` may use the host now, else the seconds to wait"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0
+            remaining = self.opened + self.cooldown - now
+            if (self.state == self.OPEN and remaining <= 0) or (self.state == self.HALF_OPEN and self.trial is None):
+                self.state = self.HALF_OPEN
+                self.trial = owner
+                return 0
+            # Open, or half-open with the trial still running
+            return max(remaining, 1.0)
+
+    def release(self, owner=True):
+        """End ``owner``'s trial without a verdict; the next caller gets one instead"""
+        with self._lock:
+            if self.trial is owner:
+                self.trial = None
+
+    def success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial = None
+
+    def failure(self, now=None):
+        with self._lock:
+            self.failures += 1
+            self.trial = None
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened = time.monotonic() if now is None else now
+
+
+class StallDetector:
+    """Notices downloads that stay below ``min_speed`` bytes/s for ``window`` seconds.
+
+    The speed is measured here from ``downloaded_bytes`` over the window:
+    yt-dlp's own ``speed`` is averaged since the start of the file, so it
+    takes minutes to reflect a stall after a fast start.
+    """
+    def __init__(self, min_speed=DEFAULT_STALL_SPEED, window=DEFAULT_STALL_WINDOW):
+        self.min_speed = min_speed
+        self.window = window
+        self._windows = {}
+
+    def stalled(self, key, d, now=None):
+        """Feed a yt-dlp progress dict; True once the download counts as stalled"""
+        if d['status'] != 'downloading':
+            self._windows.pop(key, None)
+            return False
+        now = time.monotonic() if now is None else now
+        downloaded = d.get('downloaded_bytes') or 0
+        started, start_bytes = self._windows.get(key, (None, 0))
+        if started is None or downloaded < start_bytes:
+            # First callback, or the next file of a merged format
+            self._windows[key] = (now, downloaded)
+            return False
+        elapsed = now - started
+        if elapsed < self.window:
+            return False
+        if (downloaded - start_bytes) / elapsed >= self.min_speed:
+            self._windows[key] = (now, downloaded)
+            return False
+        return True
+
+    def error(self):
+        return StallError(f"Download stalled below {self.min_speed / 1024:.0f} KB/s "
+                          f"for {self.window:.0f} seconds")
+
+    def forget(self, key):
+        self._windows.pop(key, None)
+
+
+class RetryPolicy:
+    """Decides whether, when and how a failed download runs again.
+
+    Transient failures (network errors, timeouts, stalls, expired stream
+    URLs) and throttling are retried up to ``attempts`` times with
+    :class:`Backoff`; everything else fails at once. After two failures with
+    the same format, and right away when the format is not available, the
+    job moves on to the next format of its fallback chain. Failures are also
+    counted per host (:func:`host_of`): the page's while the video is
+    extracted, then the hosts of the selected format's URLs (the CDN nodes
+    the transfer uses). While a host's :class:`CircuitBreaker` is open, jobs
+    needing it are deferred without taking a worker. Retries are handed back
+    as :class:`RetryLater` for the queue to schedule.
+    """
+    def __init__(self, attempts=DEFAULT_ATTEMPTS, backoff=None, stall=None,
+                 breaker_threshold=5, breaker_cooldown=30.0):
+        self.attempts = attempts
+        self.backoff = backoff or Backoff()
+        self.stall = stall or StallDetector()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._breakers = {}
+        # Breakers each running job was admitted to, by stage (page, then media)
+        self._admitted = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url):
+        host = host_of(url)
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+            return breaker
+
+    def admit(self, job, urls=None):
+        """Raise RetryLater if a host the job is about to use is failing.
+
+        Called with the job's page URL before extraction and again with the
+        selected formats' ``urls`` before the transfer; failures count
+        against the hosts of the latest call. Every attempt that was
+        admitted must end with :meth:`settle`.
+        """
+        stage = []
+        with self._lock:
+            self._admitted.setdefault(job.id, []).append(stage)
+        for url in dict.fromkeys(urls or [job.url]):
+            breaker = self.breaker(url)
+            wait = breaker.allow(owner=job)
+            if wait:
+                raise RetryLater(wait, 'circuit_open', f"Too many recent failures from {host_of(url)}")
+            stage.append(breaker)
+
+    def settle(self, job):
+        """End the job's attempt, freeing any half-open trial it did not report on"""
+        with self._lock:
+            stages = self._admitted.pop(job.id, [])
+        for stage in stages:
+            for breaker in stage:
+                breaker.release(job)
+
+    def succeeded(self, job):
+        with self._lock:
+            stages = list(self._admitted.get(job.id, []))
+        for stage in stages:
+            for breaker in stage:
+                breaker.success()
+        self.stall.forget(job.id)
+        job.attempts = 0
+
+    def failed(self, job, error, formats=1):
+        """RetryLater for the next attempt of ``job``, or None if it should fail"""
+        self.stall.forget(job.id)
+        cause, kind = classify(error)
+        if cause == 'format' and job.format_fallback + 1 < formats:
+            job.format_fallback += 1
+            return RetryLater(0, cause, str(error))
+        if kind == PERMANENT:
+            job.attempts = 0
+            return None
+
+        with self._lock:
+            stages = self._admitted.get(job.id)
+            breakers = list(stages[-1]) if stages and stages[-1] else None
+        for breaker in breakers or [self.breaker(job.url)]:
+            breaker.failure()
+        job.attempts += 1
+        if job.attempts >= self.attempts:
+            job.attempts = 0
+            return None
+        if job.attempts % 2 == 0 and job.format_fallback + 1 < formats:
+            job.format_fallback += 1
+        return RetryLater(self.backoff.delay(job.attempts - 1, kind == THROTTLED), cause, str(error))
+
+    def call(self, url, function, attempts=3, max_delay=5.0):
+        """Run ``function()`` for ``url`` in place, retrying transient errors with short waits.
+
+        For metadata lookups someone is waiting on; downloads go through
+        :meth:`failed` and the queue instead.
+        """
+        breaker = self.breaker(url)
+        trial = object()
+        attempt = 0
+        try:
+            while True:
+                if breaker.allow(owner=trial):
+                    raise CircuitOpenError(f"Too many recent failures from {host_of(url)}")
+                try:
+                    result = function()
+                except Exception as e:
+                    cause, kind = classify(e)
+                    if kind == PERMANENT:
+                        raise
+                    breaker.failure()
+                    attempt += 1
+                    if attempt >= attempts:
+                        raise
+                    time.sleep(min(max_delay, self.backoff.delay(attempt - 1, kind == THROTTLED)))
+                    continue
+                breaker.success()
+                return result
+        finally:
+            breaker.release(trial)
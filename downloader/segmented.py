@@ -0,0 +1,310 @@
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_CONNECTIONS = 4
+MIN_SEGMENT_SIZE = 1024 * 1024
+# googlevideo.com tends to reject single range requests much larger than this
+MAX_SEGMENT_SIZE = 10 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSupported(Exception):
+    """The server cannot serve byte ranges; use a normal download instead"""
+
+
+class SegmentError(Exception):
+    pass
+
+
+def _path_of(parts):
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return path
+
+
+def _connect(parts, timeout):
+    if parts.scheme == "https":
+        return http.client.HTTPSConnection(parts.netloc, timeout=timeout)
+    return http.client.HTTPConnection(parts.netloc, timeout=timeout)
+
+
+class SegmentedDownload:
+    """Downloads one file over several parallel HTTP range requests.
+
+    The file is split into segments that ``connections`` worker threads pull
+    from a shared list; each writes straight into its offset of a
+    preallocated ``<path>.part`` file and is retried on its own, resuming from
+    the last byte it wrote. Finished segments and how far the others got are
+    recorded next to the part file, so an interrupted download only fetches
+    what is missing. The part file is renamed to ``path`` once every segment
+    is complete.
+
+    ``progress(downloaded_bytes, total_bytes, speed)`` is called from the
+    thread running :meth:`run` a few times per second; an exception raised
+    from it stops the download and propagates. ``throttle(nbytes, check)`` is
+    called by the worker threads after every chunk they receive and may sleep
+    to limit bandwidth, calling ``check()`` meanwhile so it can be stopped.
+    """
+    def __init__(self, url, path, connections=DEFAULT_CONNECTIONS, headers=None, progress=None,
+                 retries=3, timeout=20, min_segment_size=MIN_SEGMENT_SIZE,
+                 max_segment_size=MAX_SEGMENT_SIZE, throttle=None):
+        self.url = url
+        self.path = path
+        self.part_path = path + ".part"
+        self.state_path = path + ".part.segments"
+        self.connections = max(1, connections)
+        self.headers = dict(headers or {})
+        self.progress = progress
+        self.throttle = throttle
+        self.retries = retries
+        self.timeout = timeout
+        self.min_segment_size = min_segment_size
+        self.max_segment_size = max_segment_size
+        self.total_bytes = None
+        self.retry_count = 0
+        self._downloaded = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._segments = []
+        self._done = set()
+        # Next offset to write for segments that were started but not finished
+        self._positions = {}
+        self._errors = []
+
+    def probe(self):
+        """Resolve redirects and check that ranges are served; returns the size"""
+        url = self.url
+        for _ in range(5):
+            parts = urlsplit(url)
+            conn = _connect(parts, self.timeout)
+            try:
+                conn.request("GET", _path_of(parts), headers=dict(self.headers, Range="bytes=0-0"))
+                response = conn.getresponse()
+                response.read()
+            finally:
+                conn.close()
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                url = urljoin(url, response.getheader('Location'))
+                continue
+            break
+
+        content_range = response.getheader('Content-Range') or ""
+        if response.status != 206 or "/" not in content_range:
+            raise RangeNotSupported(f"HTTP {response.status} for a range request")
+        total = content_range.rsplit("/", 1)[1]
+        if not total.isdigit() or int(total) == 0:
+            raise RangeNotSupported("Unknown content length")
+
+        self.url = url
+        self.total_bytes = int(total)
+        return self.total_bytes
+
+    def cancel(self):
+        self._stop.set()
+
+    def run(self):
+        """Download the file; returns transfer statistics"""
+        if self.total_bytes is None:
+            self.probe()
+
+        self._plan_segments()
+        self._prepare_part_file()
+        self._downloaded = sum(end - start + 1 for index, (start, end) in enumerate(self._segments)
+                               if index in self._done)
+        self._downloaded += sum(position - self._segments[index][0]
+                                for index, position in self._positions.items())
+        resumed_bytes = self._downloaded
+
+        pending = [i for i in range(len(self._segments)) if i not in self._done]
+        workers = []
+        started = time.monotonic()
+        for _ in range(min(self.connections, len(pending))):
+            worker = threading.Thread(target=self._worker, args=(pending,), daemon=True)
+            worker.start()
+            workers.append(worker)
+
+        last_bytes, last_time, speed = self._downloaded, started, 0
+        last_save = started
+        try:
+            while any(worker.is_alive() for worker in workers):
+                time.sleep(0.25)
+                now = time.monotonic()
+                if now - last_time >= 0.5:
+                    speed = (self._downloaded - last_bytes) / (now - last_time)
+                    last_bytes, last_time = self._downloaded, now
+                if now - last_save >= 2:
+                    # Checkpoint finished segments in case the process dies
+                    self._save_state()
+                    last_save = now
+                if self.progress:
+                    self.progress(self._downloaded, self.total_bytes, speed)
+        except BaseException:
+            self._stop.set()
+            for worker in workers:
+                worker.join()
+            self._save_state()
+            raise
+
+        self._save_state()
+        if self._errors and len(self._done) < len(self._segments):
+            raise SegmentError(self._errors[0])
+        if self._stop.is_set() and len(self._done) < len(self._segments):
+            raise SegmentError("Download cancelled")
+
+        os.replace(self.part_path, self.path)
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        fetched = self.total_bytes - resumed_bytes
+        if self.progress:
+            self.progress(self.total_bytes, self.total_bytes, fetched / elapsed)
+        return {
+            'bytes': self.total_bytes,
+            'fetched_bytes': fetched,
+            'seconds': elapsed,
+            'throughput': fetched / elapsed,
+            'connections': len(workers),
+            'segments': len(self._segments),
+            'retries': self.retry_count,
+        }
+
+    def _plan_segments(self):
+        size = self.total_bytes // (self.connections * 4) or self.total_bytes
+        size = max(self.min_segment_size, min(self.max_segment_size, size))
+        self._segments = [(start, min(start + size, self.total_bytes) - 1)
+                          for start in range(0, self.total_bytes, size)]
+
+    def _prepare_part_file(self):
+        state = None
+        if os.path.exists(self.part_path) and os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = None
+
+        if (state and state.get('total_bytes') == self.total_bytes
+                and [tuple(s) for s in state.get('segments', [])] == self._segments
+                and os.path.getsize(self.part_path) == self.total_bytes):
+            self._done = set(state.get('done', []))
+            self._positions = {}
+            for index, position in state.get('positions', {}).items():
+                index = int(index)
+                if index not in self._done and self._segments[index][0] <= position <= self._segments[index][1]:
+                    self._positions[index] = position
+            return
+
+        self._done = set()
+        self._positions = {}
+        with open(self.part_path, 'wb') as f:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, self.total_bytes)
+            else:
+                f.truncate(self.total_bytes)
+        self._save_state()
+
+    def _save_state(self):
+        with self._lock:
+            state = {'url': self.url, 'total_bytes': self.total_bytes,
+                     'segments': self._segments, 'done': sorted(self._done),
+                     'positions': {str(index): position for index, position in self._positions.items()}}
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _worker(self, pending):
+        parts = urlsplit(self.url)
+        conn = None
+        fd = os.open(self.part_path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            while not self._stop.is_set():
+                with self._lock:
+                    if not pending:
+                        return
+                    index = pending.pop(0)
+                    start, end = self._segments[index]
+                    self._positions.setdefault(index, start)
+                attempt = 0
+                while True:
+                    try:
+                        if conn is None:
+                            conn = _connect(parts, self.timeout)
+                        self._fetch_range(conn, parts, fd, index)
+                        break
+                    except Exception as e:
+                        if conn is not None:
+                            conn.close()
+                            conn = None
+                        if self._stop.is_set():
+                            return
+                        attempt += 1
+                        with self._lock:
+                            self.retry_count += 1
+                        if attempt > self.retries:
+                            with self._lock:
+                                self._errors.append(f"bytes {start}-{end}: {e}")
+                            self._stop.set()
+                            return
+                        time.sleep(min(2 ** attempt * 0.25, 4))
+                with self._lock:
+                    if self._positions[index] > end:
+                        del self._positions[index]
+                        self._done.add(index)
+        finally:
+            os.close(fd)
+            if conn is not None:
+                conn.close()
+
+    def _fetch_range(self, conn, parts, fd, index):
+        """Fetch the rest of segment ``index`` into ``fd``.
+
+        Its position moves on with every chunk written, so a retry after a
+        failure resumes there and no byte is counted twice.
+        """
+        end = self._segments[index][1]
+        with self._lock:
+            position = self._positions[index]
+        conn.request("GET", _path_of(parts), headers=dict(self.headers, Range=f"bytes={position}-{end}"))
+        response = conn.getresponse()
+        if response.status != 206:
+            response.read()
+            raise SegmentError(f"HTTP {response.status}")
+
+        while position <= end:
+            if self._stop.is_set():
+                # Leave the connection in an unknown state; the caller drops it
+                raise SegmentError("stopped")
+            chunk = response.read(min(CHUNK_SIZE, end - position + 1))
+            if not chunk:
+                raise SegmentError(f"connection closed at byte {position}")
+            self._write(fd, chunk, position)
+            position += len(chunk)
+            with self._lock:
+                self._positions[index] = position
+                self._downloaded += len(chunk)
+            if self.throttle:
+                self.throttle(len(chunk), self._check_stopped)
+
+    def _check_stopped(self):
+        if self._stop.is_set():
+            raise SegmentError("stopped")
+
+    def _write(self, fd, data, offset):
+        if hasattr(os, 'pwrite'):
+            while data:
+                written = os.pwrite(fd, data, offset)
+                data = data[written:]
+                offset += written
+        else:
+            with self._lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                os.write(fd, data)
@@ -0,0 +1,162 @@
+import sys
+import threading
+from contextlib import contextmanager
+
+# Options YoutubeDL only reads while it is being constructed; a lease that
+# sets any of them gets a fresh, unpooled instance.
+CONSTRUCTOR_OPTIONS = frozenset((
+    'postprocessors', 'cookiefile', 'cookiesfrombrowser', 'proxy', 'source_address',
+    'logger', 'nocheckcertificate', 'client_certificate', 'legacyserverconnect',
+))
+
+DEFAULT_MAX_IDLE = 4
+# Rebuild a session after this many jobs so per-instance state cannot grow forever
+DEFAULT_MAX_USES = 200
+
+_MISSING = object()
+
+
+class _Session:
+    def __init__(self, ydl):
+        self.ydl = ydl
+        self.hooks = []
+        self.uses = 0
+        self.format_selectors = {}
+
+    def dispatch(self, d):
+        """The only progress hook the instance ever has; forwards to the current lease's hooks"""
+        for hook in self.hooks:
+            hook(d)
+
+
+class SessionPool:
+    """Long-lived YoutubeDL instances, leased to one job at a time.
+
+    Building a YoutubeDL sets up the extractor list, cookie jar and HTTP
+    handlers; a pooled instance keeps all of that between jobs, along with
+    its open connections and the YouTube extractor's player/signature
+    caches. :meth:`lease` applies the job's options on top of ``base_opts``
+    and restores them afterwards; progress hooks go through a dispatcher
+    registered once per instance. At most ``max_idle`` instances are kept
+    between leases, and each is replaced after ``max_uses`` jobs.
+
+    ``setup(ydl)`` is called for every new instance, e.g. to register
+    extractors. yt-dlp is only imported when the first instance is built.
+    """
+    def __init__(self, base_opts=None, max_idle=DEFAULT_MAX_IDLE, max_uses=DEFAULT_MAX_USES, setup=None):
+        self.base_opts = dict(base_opts or {})
+        self.max_idle = max_idle
+        self.max_uses = max_uses
+        self.setup = setup
+        self.created = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._idle = []
+        self._closed = False
+
+    def warm(self, count=1):
+        """Build up to ``count`` idle instances ahead of the first lease"""
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= min(count, self.max_idle):
+                    return
+            session = self._create()
+            # Instantiating the YouTube extractor now saves it on the first job
+            session.ydl.get_info_extractor('Youtube')
+            self._release(session)
+
+    @contextmanager
+    def lease(self, opts=None):
+        """``with pool.lease(opts) as ydl:`` — a YoutubeDL configured with ``opts``"""
+        opts = dict(opts or {})
+        hooks = list(opts.pop('progress_hooks', None) or [])
+        if any(opts.get(key) for key in CONSTRUCTOR_OPTIONS):
+            from yt_dlp import YoutubeDL
+
+            with YoutubeDL(dict(self.base_opts, **opts, progress_hooks=hooks)) as ydl:
+                if self.setup:
+                    self.setup(ydl)
+                yield ydl
+            return
+
+        session = self._acquire()
+        ydl = session.ydl
+        params = ydl.params
+        if 'outtmpl' in opts and not isinstance(opts['outtmpl'], dict):
+            # YoutubeDL keeps templates per type once constructed
+            opts['outtmpl'] = dict(params.get('outtmpl') or {}, default=opts['outtmpl'])
+        saved = {key: params.get(key, _MISSING) for key in opts}
+        saved_selector = ydl.format_selector
+        params.update(opts)
+        if 'format' in opts:
+            ydl.format_selector = self._format_selector(session, opts['format'])
+        session.hooks = hooks
+        healthy = True
+        try:
+            yield ydl
+        except BaseException as e:
+            # Download and extraction errors leave the instance usable;
+            # KeyboardInterrupt and the like may not
+            healthy = isinstance(e, Exception)
+            raise
+        finally:
+            session.hooks = []
+            ydl.format_selector = saved_selector
+            for key, value in saved.items():
+                if value is _MISSING:
+                    params.pop(key, None)
+                else:
+                    params[key] = value
+            self._release(session, healthy)
+
+    def stats(self):
+        with self._lock:
+            return {'created': self.created, 'reused': self.reused, 'idle': len(self._idle)}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._close_session(session)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+        return self._create()
+
+    def _release(self, session, healthy=True):
+        session.uses += 1
+        with self._lock:
+            if healthy and not self._closed and session.uses < self.max_uses \
+                    and len(self._idle) < self.max_idle:
+                self._idle.append(session)
+                return
+        self._close_session(session)
+
+    def _create(self):
+        from yt_dlp import YoutubeDL
+
+        session = _Session(None)
+        session.ydl = YoutubeDL(dict(self.base_opts, progress_hooks=[session.dispatch]))
+        if self.setup:
+            self.setup(session.ydl)
+        with self._lock:
+            self.created += 1
+        return session
+
+    def _format_selector(self, session, format_spec):
+        if format_spec in (None, '-') or callable(format_spec):
+            return format_spec
+        selector = session.format_selectors.get(format_spec)
+        if selector is None:
+            selector = session.format_selectors[format_spec] = session.ydl.build_format_selector(format_spec)
+        return selector
+
+    def _close_session(self, session):
+        try:
+            session.ydl.close()
+        except Exception as e:
+            print(f"Error closing YoutubeDL session: {e}", file=sys.stderr)
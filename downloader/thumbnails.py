@@ -0,0 +1,236 @@
+import hashlib
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urljoin, urlsplit
+
+THUMBNAIL_SIZE = (280, 158)
+
+# Cached thumbnails younger than this are used without asking the server
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".youtube_downloader_thumbnails")
+
+
+class ThumbnailService:
+    """Fetches, resizes and caches video thumbnails.
+
+    Resized images are kept in an in-memory LRU and on disk. Stale disk
+    entries are revalidated with ETag / Last-Modified so an unchanged
+    thumbnail is never downloaded twice. Only the most recent request is
+    delivered: starting a new one (or calling :meth:`cancel`) drops any
+    result still in flight.
+
+    PIL is imported on first use so that importing this module stays cheap.
+    """
+    def __init__(self, cache_dir=None, size=THUMBNAIL_SIZE, max_workers=2, memory_entries=64,
+                 max_age=DEFAULT_MAX_AGE, timeout=10):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.size = size
+        self.memory_entries = memory_entries
+        self.max_age = max_age
+        self.timeout = timeout
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'revalidated': 0, 'downloads': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._local = threading.local()
+        self._connections = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnail")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def request(self, url, callback):
+        """Load ``url`` and call ``callback(image, token)`` with a resized PIL image.
+
+        The callback runs on a pool thread, or immediately on the calling
+        thread when the image is already in memory. Returns the request token;
+        see :meth:`is_current`.
+        """
+        with self._lock:
+            self._generation += 1
+            token = self._generation
+            image = self._memory.get(url)
+            if image is not None:
+                self._memory.move_to_end(url)
+                self.stats['memory_hits'] += 1
+
+        if image is not None:
+            callback(image, token)
+        else:
+            self._executor.submit(self._load, url, token, callback)
+        return token
+
+    def prefetch(self, url):
+        """Load ``url`` into the caches without delivering it or affecting the current request"""
+        with self._lock:
+            if url in self._memory:
+                return
+        self._executor.submit(self._load, url, None, None)
+
+    def cancel(self):
+        """Drop the result of any request still in flight"""
+        with self._lock:
+            self._generation += 1
+
+    def is_current(self, token):
+        return token == self._generation
+
+    def close(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+    def _load(self, url, token, callback):
+        if token is not None and not self.is_current(token):
+            return
+        try:
+            image = self._load_image(url)
+        except Exception as e:
+            print(f"Error fetching thumbnail: {e}", file=sys.stderr)
+            return
+        if image is None:
+            return
+
+        with self._lock:
+            self._memory[url] = image
+            self._memory.move_to_end(url)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+        if callback is not None and self.is_current(token):
+            callback(image, token)
+
+    def _load_image(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        image_path = os.path.join(self.cache_dir, key + ".jpg")
+        meta_path = os.path.join(self.cache_dir, key + ".json")
+
+        meta = None
+        if os.path.exists(image_path) and os.path.exists(meta_path):
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+
+        if meta and time.time() - meta.get('fetched', 0) < self.max_age:
+            with self._lock:
+                self.stats['disk_hits'] += 1
+            return self._open_cached(image_path)
+
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        status, response_headers, body = self._get(url, headers)
+
+        if status == 304 and meta:
+            with self._lock:
+                self.stats['revalidated'] += 1
+            meta['fetched'] = time.time()
+            self._write_meta(meta_path, meta)
+            return self._open_cached(image_path)
+
+        if status != 200:
+            raise OSError(f"HTTP {status} for {url}")
+
+        with self._lock:
+            self.stats['downloads'] += 1
+        image = self._decode(body)
+
+        tmp_path = image_path + ".tmp"
+        image.save(tmp_path, "JPEG", quality=90)
+        os.replace(tmp_path, image_path)
+        self._write_meta(meta_path, {
+            'url': url,
+            'etag': response_headers.get('etag'),
+            'last_modified': response_headers.get('last-modified'),
+            'fetched': time.time(),
+        })
+        return image
+
+    def _decode(self, data):
+        from PIL import Image
+
+        image = Image.open(BytesIO(data))
+        # Let the JPEG decoder downscale while decoding, before the LANCZOS pass
+        image.draft('RGB', self.size)
+        image = image.convert('RGB')
+        return image.resize(self.size, Image.LANCZOS)
+
+    def _open_cached(self, path):
+        from PIL import Image
+
+        with Image.open(path) as image:
+            image.load()
+            return image.copy()
+
+    def _write_meta(self, path, meta):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def _get(self, url, headers, redirects=3):
+        """GET over a keep-alive connection owned by the calling pool thread"""
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        for attempt in range(2):
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError, OSError):
+                # The server may have closed the idle connection; reconnect once
+                self._drop_connection(parts.scheme, parts.netloc)
+                if attempt:
+                    raise
+
+        response_headers = {k.lower(): v for k, v in response.getheaders()}
+        if response.status in (301, 302, 303, 307, 308) and redirects and 'location' in response_headers:
+            return self._get(urljoin(url, response_headers['location']), headers, redirects - 1)
+        if response_headers.get('connection', '').lower() == 'close':
+            self._drop_connection(parts.scheme, parts.netloc)
+        return response.status, response_headers, body
+
+    def _connection(self, scheme, netloc):
+        pool = getattr(self._local, 'connections', None)
+        if pool is None:
+            pool = self._local.connections = {}
+        conn = pool.get((scheme, netloc))
+        if conn is None:
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+            pool[(scheme, netloc)] = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _drop_connection(self, scheme, netloc):
+        conn = self._local.connections.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+            with self._lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
@@ -1,15 +1,60 @@
+import time
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
 import os
 import sys
-import urllib.request
-from io import BytesIO
-from PIL import Image, ImageTk
 import json
 import re
+from collections import OrderedDict
 from datetime import datetime
-from yt_dlp import YoutubeDL
+from downloader.bandwidth import BandwidthScheduler, parse_rate, parse_schedule
+from downloader.download_queue import (DownloadQueue, DownloadJob, PRIORITIES, QUEUED, RUNNING, PROCESSING,
+                                       PAUSED, DONE, CANCELLED)
+from downloader.engine import DownloadEngine, default_download_dir, preload
+from downloader.history import HistoryStore
+from downloader.ingest import FolderWatcher, Ingestor
+from downloader.journal import JobJournal
+from downloader.library_index import LibraryIndex
+from downloader.metadata_cache import MetadataCache, extract_video_id
+from downloader.metrics import Metrics
+from downloader.output import OutputManager
+from downloader.playlist import PlaylistExpander, is_playlist_url
+from downloader.postprocess import PostProcessingStage
+from downloader.prefetch import AdaptiveDebounce, Prefetcher, thumbnail_url
+from downloader.progress import ProgressBoard, UI_REFRESH_HZ, progress_text, short_progress_text, speed_text
+from downloader.retry import RetryPolicy
+from downloader.thumbnails import ThumbnailService
+
+YOUTUBE_URL_RE = re.compile(r'(https?://)?(www\.)?(youtube\.com|youtu\.be)/.*')
+
+class StartupTimer:
+    """Milliseconds from the start of main.py to each startup milestone.
+
+    Run ``python main.py --startup-timing [FILE]`` (or the built executable
+    with the same flag) to print one JSON line, or append it to FILE, once
+    the app is interactive, and exit.
+    """
+    def __init__(self, started, enabled=False, output=None):
+        self.started = started
+        self.enabled = enabled
+        self.output = output
+        self.marks = {}
+    
+    def mark(self, name):
+        self.marks[name] = round((time.perf_counter() - self.started) * 1000, 1)
+    
+    def report(self):
+        record = dict(self.marks, date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                      frozen=bool(getattr(sys, 'frozen', False)), python=sys.version.split()[0])
+        line = json.dumps(record)
+        if self.output:
+            with open(self.output, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        elif sys.stdout is not None:
+            print(line, flush=True)
 
 class ModernTheme:
     """Custom theme for the application"""
@@ -43,12 +88,229 @@ class ModernTheme:
         self.is_dark = not self.is_dark
         self.update_colors()
 
+class VirtualHistoryList:
+    """Download history view that only creates widgets for the rows on screen.
+    
+    A small pool of row widgets is positioned on a canvas and refilled as the
+    view scrolls; entries are read from the history store one page at a time.
+    """
+    ROW_HEIGHT = 52
+    PAGE_SIZE = 100
+    CACHED_PAGES = 8
+    
+    def __init__(self, parent, history, theme, width=280):
+        self.history = history
+        self.width = width
+        self.total = 0
+        self.offset = 0
+        self.rows = []
+        self.pages = OrderedDict()
+        
+        self.canvas = tk.Canvas(parent, bg=theme.bg_color, highlightthickness=0)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.scrollbar = ttk.Scrollbar(parent, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.empty_label = ttk.Label(self.canvas, text="Loading history...", style="TLabel")
+        self.empty_window = self.canvas.create_window((width // 2, 10), window=self.empty_label,
+                                                      anchor=tk.N, state=tk.HIDDEN)
+        
+        self.canvas.bind('<Configure>', lambda e: self.render())
+        self.bind_wheel(self.canvas)
+    
+    def bind_wheel(self, widget):
+        widget.bind('<MouseWheel>', self.on_mousewheel)
+        widget.bind('<Button-4>', self.on_mousewheel)
+        widget.bind('<Button-5>', self.on_mousewheel)
+    
+    def reload(self):
+        self.empty_label.configure(text="No download history yet")
+        self.total = self.history.count()
+        self.pages.clear()
+        self.render()
+    
+    def entries_added(self):
+        """Show new downloads without rebuilding the list"""
+        total = self.history.count()
+        added = total - self.total
+        self.total = total
+        self.pages.clear()
+        if self.offset > 0:
+            # Keep the rows the user is looking at in place
+            self.offset += added * self.ROW_HEIGHT
+        self.render()
+    
+    def entry(self, index):
+        page, position = divmod(index, self.PAGE_SIZE)
+        entries = self.pages.get(page)
+        if entries is None:
+            entries = self.history.recent(self.PAGE_SIZE, page * self.PAGE_SIZE)
+            self.pages[page] = entries
+            if len(self.pages) > self.CACHED_PAGES:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(page)
+        return entries[position] if position < len(entries) else None
+    
+    def create_row(self):
+        frame = ttk.Frame(self.canvas, style="TFrame")
+        title_label = ttk.Label(frame, style="TLabel", wraplength=self.width - 20)
+        title_label.pack(anchor=tk.W)
+        details_label = ttk.Label(frame, style="TLabel")
+        details_label.pack(anchor=tk.W)
+        for widget in (frame, title_label, details_label):
+            self.bind_wheel(widget)
+        window = self.canvas.create_window((0, 0), window=frame, anchor=tk.NW,
+                                           width=self.width, height=self.ROW_HEIGHT)
+        return window, title_label, details_label
+    
+    def render(self):
+        height = max(self.canvas.winfo_height(), 1)
+        content_height = self.total * self.ROW_HEIGHT
+        self.offset = min(max(self.offset, 0), max(0, content_height - height))
+        
+        visible = height // self.ROW_HEIGHT + 2
+        while len(self.rows) < visible:
+            self.rows.append(self.create_row())
+        
+        first, shift = divmod(self.offset, self.ROW_HEIGHT)
+        for i, (window, title_label, details_label) in enumerate(self.rows):
+            entry = self.entry(first + i) if i < visible and first + i < self.total else None
+            if entry is None:
+                self.canvas.itemconfigure(window, state=tk.HIDDEN)
+                continue
+            
+            title = entry.get('title') or 'Unknown'
+            if len(title) > 30:
+                title = title[:27] + "..."
+            title_label.configure(text=title)
+            details_label.configure(text=f"{entry.get('format') or 'unknown'} • {entry.get('date') or ''}")
+            self.canvas.coords(window, 0, i * self.ROW_HEIGHT - shift)
+            self.canvas.itemconfigure(window, state=tk.NORMAL)
+        
+        self.canvas.itemconfigure(self.empty_window, state=tk.HIDDEN if self.total else tk.NORMAL)
+        
+        if content_height > height:
+            self.scrollbar.set(self.offset / content_height, (self.offset + height) / content_height)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def yview(self, *args):
+        height = max(self.canvas.winfo_height(), 1)
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * self.total * self.ROW_HEIGHT)
+        elif args[0] == 'scroll':
+            step = height if args[2] == 'pages' else self.ROW_HEIGHT
+            self.offset += int(args[1]) * step
+        self.render()
+    
+    def on_mousewheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.offset -= self.ROW_HEIGHT
+        else:
+            self.offset += self.ROW_HEIGHT
+        self.render()
+
+class DiagnosticsPanel:
+    """Window with live download metrics, refreshed once a second while open"""
+    REFRESH_MS = 1000
+    
+    def __init__(self, root, metrics, theme, on_close=None):
+        self.metrics = metrics
+        self.on_close = on_close
+        self.window = tk.Toplevel(root)
+        self.window.title("Diagnostics")
+        self.window.geometry("720x420")
+        self.window.configure(bg=theme.bg_color)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        summary_frame = ttk.Frame(self.window, style="TFrame")
+        summary_frame.pack(fill=tk.X, padx=15, pady=(15, 5))
+        self.summary_labels = {}
+        for row, (key, title) in enumerate((("transfer", "Transfer:"), ("jobs", "Jobs:"),
+                                            ("phases", "Time spent:"), ("problems", "Retries / failures:"),
+                                            ("metadata", "Metadata:"))):
+            ttk.Label(summary_frame, text=title, style="Subtitle.TLabel").grid(row=row, column=0, sticky=tk.W)
+            label = ttk.Label(summary_frame, text="", style="TLabel")
+            label.grid(row=row, column=1, sticky=tk.W, padx=(10, 0))
+            self.summary_labels[key] = label
+        
+        jobs_frame = ttk.Frame(self.window, style="TFrame")
+        jobs_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=(5, 15))
+        columns = ("title", "state", "downloaded", "speed", "extract", "transfer", "postprocess", "retries")
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=columns, show="headings")
+        for column, width in zip(columns, (200, 90, 80, 80, 60, 60, 80, 55)):
+            self.jobs_tree.heading(column, text=column.capitalize())
+            self.jobs_tree.column(column, width=width, anchor=tk.W if column == "title" else tk.CENTER)
+        scrollbar = ttk.Scrollbar(jobs_frame, orient=tk.VERTICAL, command=self.jobs_tree.yview)
+        self.jobs_tree.configure(yscrollcommand=scrollbar.set)
+        self.jobs_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.after_id = None
+        self.refresh()
+    
+    def refresh(self):
+        snapshot = self.metrics.snapshot()
+        self.summary_labels["transfer"].configure(
+            text=f"{snapshot['bytes'] / 1024 / 1024:.1f} MB, now {speed_text(snapshot['speed'])}")
+        finished = ", ".join(f"{count} {state}" for state, count in sorted(snapshot['jobs'].items()))
+        self.summary_labels["jobs"].configure(
+            text=f"{snapshot['active']} running" + (f", {finished}" if finished else ""))
+        self.summary_labels["phases"].configure(text=", ".join(
+            f"{name} {phase['seconds']:.1f}s" for name, phase in sorted(snapshot['phases'].items())) or "-")
+        retries = sum(snapshot['retries'].values())
+        failures = ", ".join(f"{cause} {count}" for cause, count in sorted(snapshot['failures'].items()))
+        self.summary_labels["problems"].configure(text=f"{retries} retries; failures: {failures or 'none'}")
+        metadata = snapshot['metadata']
+        self.summary_labels["metadata"].configure(
+            text=f"{metadata['fetches']} lookups, {metadata['cache_hits']} from cache")
+        
+        # Newest jobs first
+        details = list(reversed(snapshot['job_details']))
+        shown = set()
+        for index, job in enumerate(details):
+            job_id = str(job['id'])
+            shown.add(job_id)
+            state = job['cause'] if job['state'] == 'failed' and job['cause'] else job['state']
+            if job['state'] == 'running' and job['phase']:
+                state = job['phase']
+            phases = [f"{job['phases'][name]:.1f}s" if name in job['phases'] else ""
+                      for name in ("extract", "transfer", "postprocess")]
+            values = (job['title'] or job['url'], state, f"{job['bytes'] / 1024 / 1024:.1f} MB",
+                      speed_text(job['speed']) if job['speed'] else "", *phases, job['retries'] or "")
+            if self.jobs_tree.exists(job_id):
+                self.jobs_tree.item(job_id, values=values)
+                self.jobs_tree.move(job_id, "", index)
+            else:
+                self.jobs_tree.insert("", index, iid=job_id, values=values)
+        for job_id in self.jobs_tree.get_children():
+            if job_id not in shown:
+                self.jobs_tree.delete(job_id)
+        
+        self.after_id = self.window.after(self.REFRESH_MS, self.refresh)
+    
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+    
+    def close(self):
+        if self.after_id:
+            self.window.after_cancel(self.after_id)
+        self.window.destroy()
+        if self.on_close:
+            self.on_close()
+
 class YouTubeDownloaderApp:
-    def __init__(self, root):
+    def __init__(self, root, timer=None):
         self.root = root
+        self.timer = timer or StartupTimer(STARTED)
+        self.history_loaded = False
+        self.engine_loaded = False
         self.root.title("YouTube Video Downloader")
-        self.root.geometry("800x600")
-        self.root.minsize(700, 500)
+        self.root.geometry("900x700")
+        self.root.minsize(760, 600)
         
         if getattr(sys, 'frozen', False):
             base_path = sys._MEIPASS
@@ -63,22 +325,121 @@ class YouTubeDownloaderApp:
         self.download_path = tk.StringVar()
         self.video_url = tk.StringVar()
         self.download_format = tk.StringVar(value="mp4")
-        self.downloading = False
-        self.download_history = []
+        self.download_priority = tk.StringVar(value="normal")
+        self.max_workers = tk.IntVar(value=2)
+        self.connections = tk.IntVar(value=1)
+        self.speed_limit = tk.StringVar(value="0")
+        self.limit_schedule = tk.StringVar()
+        self.playlist_mode = tk.BooleanVar(value=False)
+        self.queue_rows = {}
+        self.progress_board = ProgressBoard()
+        self.live_progress = {}
         self.current_thumbnail = None
         self.video_info = None
+        self.preview_video_id = None
+        self.last_clipboard = None
+        self.diagnostics = None
+        
+        self.download_path.set(default_download_dir())
+        
+        # Opened on a background thread once the window is up
+        self.history = HistoryStore()
         
-        default_path = os.path.join(os.path.expanduser("~"), "Downloads")
-        self.download_path.set(default_path)
+        try:
+            self.metadata_cache = MetadataCache()
+        except Exception as e:
+            print(f"Error opening metadata cache: {e}")
+            self.metadata_cache = None
+        
+        self.thumbnails = ThumbnailService()
         
-        self.history_file = os.path.join(os.path.expanduser("~"), ".youtube_downloader_history.json")
-        self.load_history()
+        self.journal = JobJournal()
+        
+        try:
+            self.library = LibraryIndex()
+        except Exception as e:
+            print(f"Error opening library index: {e}")
+            self.library = None
+        
+        self.bandwidth = BandwidthScheduler()
+        
+        self.postprocessing = PostProcessingStage(on_progress=self.on_job_progress)
+        
+        self.engine = DownloadEngine(self.history, on_progress=self.on_job_progress,
+                                     cache=self.metadata_cache, journal=self.journal,
+                                     library=self.library, bandwidth=self.bandwidth,
+                                     postprocessor=self.postprocessing, retry=RetryPolicy(),
+                                     output=OutputManager())
+        self.prefetcher = Prefetcher(self.engine.fetch_info)
+        self.debounce = AdaptiveDebounce()
+        self.download_queue = DownloadQueue(self.download_video, max_workers=self.max_workers.get(),
+                                            on_update=self.on_job_update)
+        # Reads list files on background threads, a queue backlog at a time
+        self.ingestor = Ingestor(self.download_queue.submit, skip=self.history.contains,
+                                 queue=self.download_queue,
+                                 on_event=lambda name, **fields: self.root.after(
+                                     0, lambda: self.on_import_event(name, fields)))
+        self.folder_watcher = None
         
         self.create_styles()
         
         self.create_widgets()
         
         self.video_url.trace_add("write", self.on_url_change)
+        self.max_workers.trace_add("write", self.on_workers_change)
+        self.connections.trace_add("write", self.on_connections_change)
+        self.speed_limit.trace_add("write", self.on_limit_change)
+        self.limit_schedule.trace_add("write", self.on_limit_change)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind("<FocusIn>", self.on_focus_in)
+        
+        if not self.timer.enabled:
+            self.root.after(500, self.offer_resume)
+        self.root.after(1000 // UI_REFRESH_HZ, self.refresh_progress)
+        
+        self.timer.mark('window_built')
+        # Idle callbacks run in order, so this comes after Tk drew the widgets
+        self.root.after_idle(self.on_first_frame)
+    
+    def on_first_frame(self):
+        self.timer.mark('first_frame')
+        threading.Thread(target=self.load_history, daemon=True).start()
+        threading.Thread(target=self.warm_up, daemon=True).start()
+    
+    def load_history(self):
+        try:
+            self.history.load()
+        except Exception as e:
+            print(f"Error loading history: {e}")
+        self.root.after(0, self.on_history_loaded)
+    
+    def on_history_loaded(self):
+        self.timer.mark('history_loaded')
+        self.history_loaded = True
+        self.history_list.reload()
+        self.check_interactive()
+    
+    def warm_up(self):
+        """Import yt-dlp and PIL before the user needs them"""
+        try:
+            preload(self.engine.sessions)
+            from PIL import Image, ImageTk  # noqa: F401
+        except Exception as e:
+            print(f"Error preloading modules: {e}")
+        self.root.after(0, self.on_engine_loaded)
+    
+    def on_engine_loaded(self):
+        self.timer.mark('engine_loaded')
+        self.engine_loaded = True
+        self.check_interactive()
+    
+    def check_interactive(self):
+        if not (self.history_loaded and self.engine_loaded) or 'interactive' in self.timer.marks:
+            return
+        self.timer.mark('interactive')
+        if self.timer.enabled:
+            self.timer.report()
+            self.root.after(0, self.on_close)
         
     def create_styles(self):
         self.style = ttk.Style()
@@ -104,6 +465,10 @@ class YouTubeDownloaderApp:
                              background=self.theme.bg_color,
                              foreground=self.theme.fg_color)
         
+        self.style.configure("TCheckbutton", 
+                             background=self.theme.bg_color,
+                             foreground=self.theme.fg_color)
+        
         self.style.configure("TProgressbar", 
                              background=self.theme.accent_color,
                              troughcolor=self.theme.secondary_bg,
@@ -129,6 +494,15 @@ class YouTubeDownloaderApp:
         self.style.map("Secondary.TButton",
                       background=[("active", self.theme.hover_color)])
         
+        self.style.configure("Treeview",
+                             background=self.theme.secondary_bg,
+                             fieldbackground=self.theme.secondary_bg,
+                             foreground=self.theme.fg_color,
+                             borderwidth=0)
+        self.style.configure("Treeview.Heading",
+                             background=self.theme.bg_color,
+                             foreground=self.theme.fg_color)
+        
     def create_widgets(self):
         self.main_container = ttk.Frame(self.root, style="TFrame")
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=0, pady=0)
@@ -142,6 +516,9 @@ class YouTubeDownloaderApp:
                                    command=self.toggle_theme)
         self.theme_btn.pack(side=tk.RIGHT)
         
+        ttk.Button(header_frame, text="Diagnostics", style="Secondary.TButton",
+                   command=self.show_diagnostics).pack(side=tk.RIGHT, padx=(0, 10))
+        
         content_frame = ttk.Frame(self.main_container, style="TFrame")
         content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
@@ -163,6 +540,16 @@ class YouTubeDownloaderApp:
                               command=lambda: self.video_url.set(""))
         clear_btn.pack(side=tk.RIGHT, padx=(5, 0))
         
+        import_frame = ttk.Frame(url_frame, style="TFrame")
+        import_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Button(import_frame, text="Import List...", style="Secondary.TButton",
+                   command=self.import_lists).pack(side=tk.LEFT)
+        
+        self.watch_btn = ttk.Button(import_frame, text="Watch Folder...", style="Secondary.TButton",
+                                    command=self.toggle_watch_folder)
+        self.watch_btn.pack(side=tk.LEFT, padx=(5, 0))
+        
         format_frame = ttk.Frame(left_panel, style="TFrame")
         format_frame.pack(fill=tk.X, pady=(0, 15))
         
@@ -175,6 +562,9 @@ class YouTubeDownloaderApp:
         ttk.Radiobutton(formats_container, text="MP3 Audio", variable=self.download_format, value="mp3").pack(side=tk.LEFT, padx=(0, 15))
         ttk.Radiobutton(formats_container, text="Original Format", variable=self.download_format, value="original").pack(side=tk.LEFT)
         
+        ttk.Checkbutton(format_frame, text="Download the whole playlist / channel",
+                        variable=self.playlist_mode).pack(anchor=tk.W, pady=(5, 0))
+        
         location_frame = ttk.Frame(left_panel, style="TFrame")
         location_frame.pack(fill=tk.X, pady=(0, 15))
         
@@ -198,9 +588,58 @@ class YouTubeDownloaderApp:
         self.progress_bar = ttk.Progressbar(progress_frame, orient=tk.HORIZONTAL, mode='determinate', style="TProgressbar")
         self.progress_bar.pack(fill=tk.X)
         
-        self.download_btn = ttk.Button(left_panel, text="Download Video", style="Primary.TButton",
+        options_frame = ttk.Frame(left_panel, style="TFrame")
+        options_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(options_frame, text="Priority:", style="TLabel").pack(side=tk.LEFT)
+        ttk.Combobox(options_frame, textvariable=self.download_priority, values=list(PRIORITIES),
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(options_frame, text="Parallel downloads:", style="TLabel").pack(side=tk.LEFT)
+        ttk.Spinbox(options_frame, from_=1, to=16, textvariable=self.max_workers,
+                    width=4).pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(options_frame, text="Connections:", style="TLabel").pack(side=tk.LEFT)
+        ttk.Spinbox(options_frame, from_=1, to=16, textvariable=self.connections,
+                    width=4).pack(side=tk.LEFT, padx=(5, 0))
+        
+        limit_frame = ttk.Frame(left_panel, style="TFrame")
+        limit_frame.pack(fill=tk.X, pady=(5, 5))
+        
+        ttk.Label(limit_frame, text="Speed limit (MB/s, 0 = none):", style="TLabel").pack(side=tk.LEFT)
+        ttk.Spinbox(limit_frame, from_=0, to=1000, increment=0.5, textvariable=self.speed_limit,
+                    width=6).pack(side=tk.LEFT, padx=(5, 15))
+        
+        ttk.Label(limit_frame, text="Schedule:", style="TLabel").pack(side=tk.LEFT)
+        ttk.Entry(limit_frame, textvariable=self.limit_schedule, style="TEntry").pack(
+            side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        
+        self.download_btn = ttk.Button(left_panel, text="Add to Queue", style="Primary.TButton",
                                       command=self.start_download)
-        self.download_btn.pack(fill=tk.X, pady=(10, 0))
+        self.download_btn.pack(fill=tk.X, pady=(10, 15))
+        
+        queue_frame = ttk.Frame(left_panel, style="TFrame")
+        queue_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(queue_frame, text="Download Queue", style="Subtitle.TLabel").pack(anchor=tk.W, pady=(0, 5))
+        
+        queue_buttons = ttk.Frame(queue_frame, style="TFrame")
+        queue_buttons.pack(fill=tk.X, side=tk.BOTTOM, pady=(5, 0))
+        
+        for text, command in (("Pause", self.pause_selected), ("Resume", self.resume_selected),
+                              ("Cancel", self.cancel_selected), ("Clear Finished", self.clear_finished)):
+            ttk.Button(queue_buttons, text=text, style="Secondary.TButton",
+                       command=command).pack(side=tk.LEFT, padx=(0, 5))
+        
+        self.queue_tree = ttk.Treeview(queue_frame, columns=("title", "format", "status"),
+                                       show="headings", height=6)
+        self.queue_tree.heading("title", text="Title")
+        self.queue_tree.heading("format", text="Format")
+        self.queue_tree.heading("status", text="Status")
+        self.queue_tree.column("title", width=220)
+        self.queue_tree.column("format", width=60, anchor=tk.CENTER)
+        self.queue_tree.column("status", width=180)
+        self.queue_tree.pack(fill=tk.BOTH, expand=True)
         
         right_panel = ttk.Frame(content_frame, style="TFrame", width=300)
         right_panel.pack(side=tk.RIGHT, fill=tk.BOTH, padx=(10, 0))
@@ -228,20 +667,7 @@ class YouTubeDownloaderApp:
         history_container = ttk.Frame(history_frame, style="TFrame")
         history_container.pack(fill=tk.BOTH, expand=True)
         
-        history_canvas = tk.Canvas(history_container, bg=self.theme.bg_color, 
-                                  highlightthickness=0)
-        history_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        scrollbar = ttk.Scrollbar(history_container, orient=tk.VERTICAL, command=history_canvas.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        history_canvas.configure(yscrollcommand=scrollbar.set)
-        history_canvas.bind('<Configure>', lambda e: history_canvas.configure(scrollregion=history_canvas.bbox("all")))
-        
-        self.history_inner_frame = ttk.Frame(history_canvas, style="TFrame")
-        history_canvas.create_window((0, 0), window=self.history_inner_frame, anchor=tk.NW, width=280)
-        
-        self.update_history_display()
+        self.history_list = VirtualHistoryList(history_container, self.history, self.theme)
         
         status_bar = ttk.Frame(self.main_container, style="TFrame")
         status_bar.pack(fill=tk.X, padx=20, pady=10)
@@ -282,6 +708,19 @@ class YouTubeDownloaderApp:
         self.theme.toggle()
         self.apply_theme()
     
+    def show_diagnostics(self):
+        if self.diagnostics is not None:
+            self.diagnostics.lift()
+            return
+        # Metrics are only collected from the first time the panel is opened
+        if self.engine.metrics is None:
+            self.engine.set_metrics(Metrics())
+        self.diagnostics = DiagnosticsPanel(self.root, self.engine.metrics, self.theme,
+                                            on_close=self.on_diagnostics_closed)
+    
+    def on_diagnostics_closed(self):
+        self.diagnostics = None
+    
     def select_directory(self):
         directory = filedialog.askdirectory()
         if directory:
@@ -293,17 +732,40 @@ class YouTubeDownloaderApp:
         if not url:
             self.clear_video_info()
             return
-            
+        
+        if extract_video_id(url) != self.preview_video_id:
+            # Whatever is still loading belongs to a URL that is gone
+            self.thumbnails.cancel()
+            self.prefetcher.cancel()
+            self.preview_video_id = None
+        
         if hasattr(self, '_url_check_after_id'):
             self.root.after_cancel(self._url_check_after_id)
         
-        self._url_check_after_id = self.root.after(1000, self.fetch_video_info)
+        delay = self.debounce.delay(url)
+        self._url_check_after_id = self.root.after(int(delay * 1000), self.fetch_video_info)
+    
+    def on_focus_in(self, event):
+        # A URL copied in another window is likely to be pasted here next
+        try:
+            text = self.root.clipboard_get().strip()
+        except tk.TclError:
+            return
+        if text == self.last_clipboard or len(text) > 2048:
+            return
+        self.last_clipboard = text
+        if YOUTUBE_URL_RE.match(text) and extract_video_id(text):
+            self.prefetcher.warm(text)
+            self.thumbnails.prefetch(thumbnail_url(text))
     
     def clear_video_info(self):
         self.video_title_label.configure(text="")
         self.video_duration_label.configure(text="")
         self.thumbnail_label.configure(image="")
+        self.thumbnails.cancel()
+        self.prefetcher.cancel()
         self.video_info = None
+        self.preview_video_id = None
         self.current_thumbnail = None
     
     def fetch_video_info(self):
@@ -311,29 +773,39 @@ class YouTubeDownloaderApp:
         if not url:
             return
             
-        if not re.match(r'(https?://)?(www\.)?(youtube\.com|youtu\.be)/.*', url):
+        if not YOUTUBE_URL_RE.match(url):
             return
-            
-        self.status_label.configure(text="Fetching video information...")
         
-        def fetch_info_thread():
-            try:
-                ydl_opts = {
-                    'quiet': True,
-                    'no_warnings': True,
-                    'skip_download': True,
-                    'noplaylist': True,
-                }
-                
-                with YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    
-                    self.root.after(0, lambda: self.update_video_info(info))
-            except Exception as e:
-                self.root.after(0, lambda: self.status_label.configure(
-                    text=f"Error fetching video info: {str(e)[:50]}..."))
+        video_id = extract_video_id(url)
+        if is_playlist_url(url) and not video_id:
+            # A full extraction would walk the entire playlist just for a preview
+            self.status_label.configure(text="Playlist link - enable playlist mode to download every video")
+            return
+        
+        if video_id and video_id == self.preview_video_id:
+            # Same video, e.g. after editing a timestamp; its preview is shown or on the way
+            return
+        self.preview_video_id = video_id
+        
+        if video_id:
+            # Loads alongside the metadata instead of waiting for its thumbnail URL
+            self.fetch_thumbnail(thumbnail_url(url))
+        
+        self.status_label.configure(text="Fetching video information...")
         
-        threading.Thread(target=fetch_info_thread, daemon=True).start()
+        self.prefetcher.request(
+            url,
+            lambda info, token: self.root.after(0, lambda: self.on_preview_info(info, token)),
+            lambda error, token: self.root.after(0, lambda: self.on_preview_error(str(error), token)))
+    
+    def on_preview_info(self, info, token):
+        # A newer URL may have been entered while this callback was queued
+        if self.prefetcher.is_current(token):
+            self.update_video_info(info)
+    
+    def on_preview_error(self, error_msg, token):
+        if self.prefetcher.is_current(token):
+            self.status_label.configure(text=f"Error fetching video info: {error_msg[:50]}...")
     
     def update_video_info(self, info):
         if not info:
@@ -356,183 +828,309 @@ class YouTubeDownloaderApp:
                 
             self.video_duration_label.configure(text=f"Duration: {duration_str}")
         
-        self.fetch_thumbnail(info.get('thumbnail'))
+        if not self.preview_video_id:
+            self.fetch_thumbnail(info.get('thumbnail'))
         
         self.status_label.configure(text="Video information loaded")
     
     def fetch_thumbnail(self, thumbnail_url):
         if not thumbnail_url:
             return
-            
-        def download_thumbnail():
-            try:
-                with urllib.request.urlopen(thumbnail_url) as response:
-                    image_data = response.read()
-                    
-                image = Image.open(BytesIO(image_data))
-                image = image.resize((280, 158), Image.LANCZOS)  
-                
-                photo_image = ImageTk.PhotoImage(image)
-                
-                self.root.after(0, lambda: self.set_thumbnail(photo_image))
-            except Exception as e:
-                print(f"Error fetching thumbnail: {e}")
         
-        threading.Thread(target=download_thumbnail, daemon=True).start()
+        self.thumbnails.request(thumbnail_url, lambda image, token: self.root.after(
+            0, lambda: self.set_thumbnail(image, token)))
     
-    def set_thumbnail(self, photo_image):
+    def set_thumbnail(self, image, token):
+        if not self.thumbnails.is_current(token):
+            return
+        
+        from PIL import ImageTk
+        
+        photo_image = ImageTk.PhotoImage(image)
         self.current_thumbnail = photo_image
         self.thumbnail_label.configure(image=photo_image)
     
-    def download_progress_hook(self, d):
-        if d['status'] == 'downloading':
-            total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-            downloaded_bytes = d.get('downloaded_bytes', 0)
-            
-            if total_bytes > 0:
-                percent = (downloaded_bytes / total_bytes) * 100
-                speed = d.get('speed', 0)
-                eta = d.get('eta', 0)
-                
-                if speed:
-                    speed_str = f"{speed / 1024 / 1024:.2f} MB/s"
-                else:
-                    speed_str = "-- MB/s"
-                    
-                if eta:
-                    eta_str = f"{eta} seconds remaining"
-                else:
-                    eta_str = "calculating..."
-                
-                progress_text = f"Downloading: {percent:.1f}% ({speed_str}, {eta_str})"
-                
-                self.root.after(0, lambda: self.update_progress(percent, progress_text))
+    def on_job_progress(self, job, progress):
+        # Called for every yt-dlp callback; refresh_progress picks it up
+        self.progress_board.update(job, progress)
+    
+    def refresh_progress(self):
+        changed = self.progress_board.drain()
+        if changed:
+            for job, progress in changed:
+                if job.state == RUNNING:
+                    self.live_progress[job.id] = progress
+                self.update_job_row(job)
+            self.update_overall_progress()
+        
+        self.root.after(1000 // UI_REFRESH_HZ, self.refresh_progress)
+    
+    def update_overall_progress(self):
+        if not self.live_progress:
+            return
         
-        elif d['status'] == 'finished':
-            self.root.after(0, lambda: self.update_progress(100, "Download finished, processing file..."))
+        if len(self.live_progress) == 1:
+            progress = next(iter(self.live_progress.values()))
+            self.update_progress(progress['percent'], progress_text(progress))
+            return
+        
+        downloaded = sum(p['downloaded_bytes'] for p in self.live_progress.values())
+        total = sum(p.get('total_bytes') or p['downloaded_bytes'] for p in self.live_progress.values())
+        speed = sum(p.get('speed') or 0 for p in self.live_progress.values())
+        percent = downloaded * 100 / total if total else 0
+        self.update_progress(percent, f"Downloading {len(self.live_progress)} files: "
+                                      f"{percent:.1f}% ({speed_text(speed)})")
     
     def update_progress(self, percent, text):
         self.progress_bar['value'] = percent
         self.progress_label.configure(text=text)
         self.status_label.configure(text=text)
     
-    def download_video(self):
-        try:
-            url = self.video_url.get().strip()
-            download_dir = self.download_path.get()
-            format_selection = self.download_format.get()
-            
-            if not url or not download_dir:
-                messagebox.showerror("Error", "Please complete all fields")
-                return
-                
-            self.root.after(0, lambda: self.update_progress(0, "Starting download..."))
-            
-            ydl_opts = {
-                'outtmpl': os.path.join(download_dir, '%(title)s.%(ext)s'),
-                'progress_hooks': [self.download_progress_hook],
-                'noplaylist': True
-            }
-            
-            if format_selection == "mp4":
-                ydl_opts['format'] = 'best[ext=mp4]'
-            elif format_selection == "mp3":
-                ydl_opts['format'] = 'bestaudio/best'
-                ydl_opts['postprocessors'] = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }]
-            else: 
-                ydl_opts['format'] = 'best'
-            
-            with YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                
-                if info:
-                    self.add_to_history({
-                        'title': info.get('title', 'Unknown'),
-                        'url': url,
-                        'format': format_selection,
-                        'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-            
-            self.root.after(0, lambda: messagebox.showinfo("Success", "Download completed successfully"))
-            
-        except Exception as e:
-            error_msg = str(e)
-            self.root.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {error_msg}"))
-        finally:
-            self.downloading = False
-            self.root.after(0, lambda: self.reset_download_state())
+    def download_video(self, job):
+        # MP3 jobs return a Future here and finish in the post-processing stage
+        return self.engine.download(job)
+    
+    def on_job_update(self, job):
+        self.root.after(0, lambda: self.update_job_row(job))
+        if job.finished or job.state == PAUSED:
+            self.root.after(0, lambda: self.on_job_finished(job))
+        elif job.state == QUEUED:
+            # Back in the queue for a retry; its old progress no longer counts
+            self.root.after(0, lambda: self.live_progress.pop(job.id, None))
+    
+    def update_job_row(self, job):
+        if job.state in (RUNNING, PROCESSING) and job.progress:
+            status = short_progress_text(job.progress)
+        else:
+            status = job.status_text
+        values = (job.title or job.url, job.format_selection, status)
+        if job.id in self.queue_rows:
+            if self.queue_tree.exists(job.id):
+                self.queue_tree.item(job.id, values=values)
+        else:
+            self.queue_rows[job.id] = job
+            self.queue_tree.insert("", tk.END, iid=job.id, values=values)
+    
+    def on_job_finished(self, job):
+        self.live_progress.pop(job.id, None)
+        if job.state == DONE:
+            self.history_list.entries_added()
+        if self.download_queue.pending_count() == 0:
+            self.reset_download_state()
     
     def reset_download_state(self):
         self.progress_bar['value'] = 0
         self.progress_label.configure(text="Ready to download")
         self.status_label.configure(text="Ready")
-        self.download_btn['state'] = tk.NORMAL
     
     def start_download(self):
-        if not self.downloading:
-            self.downloading = True
-            self.download_btn['state'] = tk.DISABLED
-            download_thread = threading.Thread(target=self.download_video)
-            download_thread.daemon = True
-            download_thread.start()
+        url = self.video_url.get().strip()
+        download_dir = self.download_path.get()
+        
+        if not url or not download_dir:
+            messagebox.showerror("Error", "Please complete all fields")
+            return
+        
+        if self.playlist_mode.get() and is_playlist_url(url):
+            self.start_playlist(url, download_dir)
+            self.video_url.set("")
+            return
+        
+        job = DownloadJob(url, download_dir, self.download_format.get(), self.download_priority.get())
+        if self.video_info and self.video_info.get('title'):
+            job.title = self.video_info['title']
+        self.download_queue.submit(job)
+        self.warm_queued(job)
+        self.video_url.set("")
+    
+    def warm_queued(self, job):
+        # Downloads read prefetched metadata from the metadata cache, so
+        # warming is only useful with one; started jobs extract it themselves
+        if self.metadata_cache is not None and job.state == QUEUED:
+            self.prefetcher.warm(job.url, wanted=lambda: job.state == QUEUED)
     
-    def add_to_history(self, entry):
-        self.download_history.insert(0, entry)
+    def start_playlist(self, url, download_dir):
+        expander = PlaylistExpander(self.engine, self.download_queue.submit, skip=self.history.contains,
+                                    queue=self.download_queue,
+                                    on_event=lambda name, **fields: self.root.after(
+                                        0, lambda: self.on_playlist_event(expander, name, fields)))
+        format_selection = self.download_format.get()
+        priority = self.download_priority.get()
+        
+        def expand_thread():
+            try:
+                expander.expand(url, download_dir, format_selection, priority)
+            except Exception as e:
+                error_msg = str(e)
+                self.root.after(0, lambda: self.status_label.configure(
+                    text=f"Error reading playlist: {error_msg[:50]}..."))
         
-        if len(self.download_history) > 20:
-            self.download_history = self.download_history[:20]
+        self.status_label.configure(text="Reading playlist...")
+        threading.Thread(target=expand_thread, daemon=True).start()
+    
+    def on_playlist_event(self, expander, name, fields):
+        if name == 'playlist':
+            self.status_label.configure(text=f"Reading playlist: {fields.get('title') or ''}")
+        elif name == 'finished':
+            self.status_label.configure(
+                text=f"Playlist: {fields['queued']} queued, {fields['skipped']} already downloaded, "
+                     f"{fields['unavailable']} unavailable")
+        else:
+            self.status_label.configure(
+                text=f"Playlist: {expander.queued} queued, {expander.skipped} already downloaded")
+    
+    def offer_resume(self):
+        try:
+            jobs = self.journal.load_jobs()
+        except Exception as e:
+            print(f"Error reading job journal: {e}")
+            return
         
-        self.save_history()
+        if not jobs:
+            return
         
-        self.root.after(0, self.update_history_display)
+        resume = messagebox.askyesno("Resume downloads",
+                                     f"{len(jobs)} download(s) did not finish last time. Resume them?")
+        if not resume:
+            for job in jobs:
+                self.journal.end(job, CANCELLED)
+        
+        self.journal.compact()
+        
+        if resume:
+            for job in jobs:
+                self.download_queue.submit(job)
+                self.warm_queued(job)
+                if job.resume_bytes and job.state == QUEUED:
+                    job.status_text = f"Queued (resuming at {job.resume_bytes / 1024 / 1024:.1f} MB)"
+                    self.update_job_row(job)
     
-    def update_history_display(self):
-        for widget in self.history_inner_frame.winfo_children():
-            widget.destroy()
+    def import_lists(self):
+        download_dir = self.download_path.get()
+        if not download_dir:
+            messagebox.showerror("Error", "Please choose a download location")
+            return
         
-        if not self.download_history:
-            ttk.Label(self.history_inner_frame, text="No download history yet", style="TLabel").pack(pady=10)
+        paths = filedialog.askopenfilenames(title="Import URL lists",
+                                            filetypes=[("URL lists", "*.txt *.csv *.list"), ("All files", "*.*")])
+        if not paths:
             return
         
-        for i, entry in enumerate(self.download_history):
-            item_frame = ttk.Frame(self.history_inner_frame, style="TFrame")
-            item_frame.pack(fill=tk.X, pady=(0, 10))
-            
-            title = entry.get('title', 'Unknown')
-            if len(title) > 30:
-                title = title[:27] + "..."
-            
-            ttk.Label(item_frame, text=title, style="TLabel", wraplength=260).pack(anchor=tk.W)
-            
-            details = f"{entry.get('format', 'unknown')} • {entry.get('date', '')}"
-            ttk.Label(item_frame, text=details, style="TLabel").pack(anchor=tk.W)
-            
-            if i < len(self.download_history) - 1:
-                separator = ttk.Frame(self.history_inner_frame, height=1)
-                separator.pack(fill=tk.X, pady=(0, 10))
-                separator.configure(style="TFrame")
+        format_selection = self.download_format.get()
+        priority = self.download_priority.get()
+        
+        def import_thread():
+            for path in paths:
+                try:
+                    self.ingestor.ingest(path, download_dir, format_selection, priority)
+                except Exception as e:
+                    error_msg = f"Error importing {os.path.basename(path)}: {str(e)[:50]}"
+                    self.root.after(0, lambda: self.status_label.configure(text=error_msg))
+        
+        self.status_label.configure(text="Importing...")
+        threading.Thread(target=import_thread, daemon=True).start()
     
-    def load_history(self):
+    def toggle_watch_folder(self):
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+            self.watch_btn.configure(text="Watch Folder...")
+            self.status_label.configure(text="Stopped watching folder")
+            return
+        
+        download_dir = self.download_path.get()
+        if not download_dir:
+            messagebox.showerror("Error", "Please choose a download location")
+            return
+        
+        directory = filedialog.askdirectory(title="Folder to watch for URL lists")
+        if not directory:
+            return
+        
+        self.folder_watcher = FolderWatcher(directory, self.ingestor, download_dir,
+                                            self.download_format.get(), self.download_priority.get())
+        self.watch_btn.configure(text="Stop Watching")
+        self.status_label.configure(text=f"Watching {directory}")
+    
+    def on_import_event(self, name, fields):
+        if not fields.get('lines'):
+            return
+        verb = "Imported" if name == 'imported' else "Importing"
+        self.status_label.configure(
+            text=f"{verb} {os.path.basename(fields['file'])}: {fields.get('queued', 0)} queued, "
+                 f"{fields.get('duplicates', 0)} duplicates, {fields.get('skipped', 0)} already downloaded")
+    
+    def on_close(self):
+        if self.folder_watcher is not None:
+            self.folder_watcher.stop()
+        # Before the shutdown, so imported jobs still queued are read again next start
+        self.ingestor.cancel()
+        self.ingestor.commit()
+        # Running jobs stay open in the journal and are offered again next start
+        self.download_queue.shutdown()
+        self.postprocessing.shutdown()
+        self.prefetcher.close()
+        self.engine.sessions.close()
+        self.journal.close()
+        self.root.destroy()
+    
+    def selected_job_ids(self):
+        return list(self.queue_tree.selection())
+    
+    def pause_selected(self):
+        for job_id in self.selected_job_ids():
+            self.download_queue.pause(job_id)
+    
+    def resume_selected(self):
+        for job_id in self.selected_job_ids():
+            self.download_queue.resume(job_id)
+    
+    def cancel_selected(self):
+        for job_id in self.selected_job_ids():
+            self.download_queue.cancel(job_id)
+    
+    def clear_finished(self):
+        for job_id, job in list(self.queue_rows.items()):
+            if job.finished:
+                self.queue_tree.delete(job_id)
+                del self.queue_rows[job_id]
+        self.download_queue.remove_finished()
+    
+    def on_workers_change(self, *args):
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r') as f:
-                    self.download_history = json.load(f)
-        except Exception as e:
-            print(f"Error loading history: {e}")
-            self.download_history = []
+            self.download_queue.set_max_workers(self.max_workers.get())
+        except (tk.TclError, ValueError):
+            pass
     
-    def save_history(self):
+    def on_connections_change(self, *args):
         try:
-            with open(self.history_file, 'w') as f:
-                json.dump(self.download_history, f)
-        except Exception as e:
-            print(f"Error saving history: {e}")
+            self.engine.connections = max(1, self.connections.get())
+        except (tk.TclError, ValueError):
+            pass
+    
+    def on_limit_change(self, *args):
+        # Running downloads pick up the new limit on their next chunk;
+        # half-typed values are ignored until they parse
+        try:
+            self.bandwidth.set_rate(parse_rate(self.speed_limit.get()))
+            self.bandwidth.set_schedule(parse_schedule(self.limit_schedule.get()))
+        except ValueError:
+            pass
+
+def startup_timer(argv):
+    """StartupTimer configured from ``--startup-timing [FILE]``"""
+    if "--startup-timing" not in argv:
+        return StartupTimer(STARTED)
+    index = argv.index("--startup-timing")
+    output = argv[index + 1] if index + 1 < len(argv) and not argv[index + 1].startswith("-") else None
+    if output is None and sys.stdout is None:
+        # The windowed build has no console to print to
+        output = os.path.join(os.path.expanduser("~"), ".youtube_downloader_startup.jsonl")
+    return StartupTimer(STARTED, enabled=True, output=output)
 
 if __name__ == "__main__":
+    timer = startup_timer(sys.argv[1:])
+    timer.mark('imports')
     root = tk.Tk()
-    app = YouTubeDownloaderApp(root)
+    app = YouTubeDownloaderApp(root, timer)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import os
+import stat
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.server import MediaRequestHandler, MediaServer  # noqa: E402
+
+
+class RecordingHandler(MediaRequestHandler):
+    def _serve(self, send_body):
+        self.server.paths.append(self.path)
+        super()._serve(send_body)
+
+
+@pytest.fixture
+def media_server():
+    """A local media server that records the path of every request"""
+    server = MediaServer(size=256 * 1024)
+    server.RequestHandlerClass = RecordingHandler
+    server.paths = []
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fake_url(server, video_id):
+    """A URL the :func:`fake_extractor` resolves; it carries a YouTube-style ID so the cache keys it"""
+    return f"fake:{server.base_url}/youtube.com/watch?v={video_id}"
+
+
+def fake_extractor(ydl):
+    """SessionPool ``setup`` registering an extractor with separate and combined formats"""
+    from yt_dlp.extractor.common import InfoExtractor
+
+    class FakeIE(InfoExtractor):
+        IE_NAME = 'fake'
+        _VALID_URL = r'fake:(?P<base>https?://[^/]+)/youtube\.com/watch\?v=(?P<id>[\w-]{11})'
+
+        def _real_extract(self, url):
+            base, video_id = self._match_valid_url(url).group('base', 'id')
+            size = 256 * 1024
+            return {
+                'id': video_id,
+                'title': f"Video {video_id}",
+                'duration': 10,
+                'formats': [
+                    {'format_id': 'video', 'url': f"{base}/media/video.webm", 'ext': 'webm',
+                     'vcodec': 'vp9', 'acodec': 'none', 'tbr': 2000, 'filesize': size, 'protocol': 'http'},
+                    {'format_id': 'audio', 'url': f"{base}/media/audio.m4a", 'ext': 'm4a',
+                     'vcodec': 'none', 'acodec': 'mp4a.40.2', 'tbr': 128, 'filesize': size, 'protocol': 'http'},
+                    {'format_id': 'combined', 'url': f"{base}/media/combined.mp4", 'ext': 'mp4',
+                     'vcodec': 'avc1', 'acodec': 'mp4a.40.2', 'tbr': 500, 'filesize': size, 'protocol': 'http'},
+                ],
+            }
+
+    ydl.add_info_extractor(FakeIE())
+    ies = ydl._ies
+    fake = ies.pop(FakeIE.ie_key())
+    ydl._ies = {FakeIE.ie_key(): fake, **ies}
+
+
+FAKE_FFMPEG = """#!{python}
+import sys
+if "{fail}" == "1":
+    sys.stderr.write("Invalid data found when processing input\\n")
+    sys.exit(1)
+source = sys.argv[sys.argv.index("-i") + 1]
+with open(source, "rb") as f, open(sys.argv[-1], "wb") as out:
+    out.write(b"mp3:" + f.read())
+print("out_time_us=5000000\\nspeed=10x\\nprogress=continue")
+print("out_time_us=10000000\\nspeed=10x\\nprogress=end")
+"""
+
+
+def fake_ffmpeg(tmp_path, fail=False):
+    """An executable standing in for ffmpeg: writes ``mp3:`` plus the input to the last argument"""
+    path = tmp_path / ("ffmpeg-fail" if fail else "ffmpeg")
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable, fail="1" if fail else "0"))
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
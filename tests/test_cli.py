@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+
+import pytest
+
+from downloader import cli
+from downloader.download_queue import PAUSED
+from downloader.sessions import SessionPool
+
+
+class FakeEngine:
+    """Stands in for DownloadEngine: marks jobs started and, while ``hold`` is set, waits to be stopped"""
+    hold = threading.Event()
+    started = []
+    seconds = 0
+
+    def __init__(self, *args, **kwargs):
+        self.sessions = SessionPool()
+
+    def set_metrics(self, metrics):
+        pass
+
+    def download(self, job):
+        job.started = True
+        FakeEngine.started.append(job)
+        time.sleep(FakeEngine.seconds)
+        while FakeEngine.hold.is_set():
+            job.check_interrupt()
+            time.sleep(0.01)
+
+
+@pytest.fixture
+def fake_engine(monkeypatch, tmp_path):
+    monkeypatch.setattr(cli, 'DownloadEngine', FakeEngine)
+    monkeypatch.setattr('downloader.ingest.default_offsets_file', lambda: str(tmp_path / "offsets.json"))
+    FakeEngine.hold.clear()
+    FakeEngine.started = []
+    FakeEngine.seconds = 0
+    return FakeEngine
+
+
+def events(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+
+
+def base_args(tmp_path):
+    return ["--no-history", "--no-cache", "--redownload", "-o", str(tmp_path / "out")]
+
+
+def test_ctrl_c_pauses_jobs_instead_of_cancelling(fake_engine, tmp_path, monkeypatch, capsys):
+    fake_engine.hold.set()
+    watched = tmp_path / "watch"
+    watched.mkdir()
+    urls = [f"https://youtu.be/{i:011d}" for i in range(3)]
+
+    real_sleep = time.sleep
+
+    def interrupt(seconds):
+        # Ctrl-C reaches the main thread, waiting in the --watch loop
+        if threading.current_thread() is threading.main_thread() and fake_engine.started:
+            raise KeyboardInterrupt
+        real_sleep(min(seconds, 0.01))
+
+    monkeypatch.setattr(cli.time, 'sleep', interrupt)
+    code = cli.main(base_args(tmp_path) + ["-j", "1", "--watch", str(watched)] + urls)
+
+    summary = events(capsys)[-1]
+    assert code == 1
+    assert summary['event'] == 'summary'
+    assert summary['paused'] == 3 and summary['cancelled'] == 0
+    assert fake_engine.started[0].state == PAUSED
+
+
+def test_import_offsets_cover_the_whole_file_once_done(fake_engine, tmp_path, capsys):
+    path = tmp_path / "urls.txt"
+    path.write_text("".join(f"https://www.youtube.com/watch?v={i:011d}\n" for i in range(300)))
+    # Slow enough that the queue still holds a backlog when the file has been read
+    fake_engine.seconds = 0.005
+    assert cli.main(base_args(tmp_path) + ["-j", "2", "--import", str(path)]) == 0
+    assert events(capsys)[-1]['done'] == 300
+
+    from downloader.ingest import OffsetStore
+    assert OffsetStore(str(tmp_path / "offsets.json")).get(str(path)) == path.stat().st_size
@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from downloader.download_queue import (DownloadJob, DownloadQueue, RetryLater, CANCELLED, DONE, FAILED, PAUSED,
+                                       PROCESSING, QUEUED, RUNNING)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class Runner:
+    """Records the jobs it runs; jobs in ``hold`` spin on check_interrupt() until released"""
+    def __init__(self):
+        self.ran = []
+        self.hold = set()
+        self.release = threading.Event()
+
+    def __call__(self, job):
+        self.ran.append(job.url)
+        while job.url in self.hold and not self.release.is_set():
+            job.check_interrupt()
+            time.sleep(0.01)
+
+
+def job(url, priority="normal"):
+    return DownloadJob(url, "/tmp", priority=priority)
+
+
+def test_priorities_decide_the_order():
+    runner = Runner()
+    runner.hold.add("blocker")
+    queue = DownloadQueue(runner, max_workers=1)
+    try:
+        queue.submit(job("blocker"))
+        wait_until(lambda: runner.ran)
+        jobs = [queue.submit(job("low", "low")), queue.submit(job("normal")), queue.submit(job("high", "high"))]
+        runner.release.set()
+        assert queue.join(5)
+        assert runner.ran == ["blocker", "high", "normal", "low"]
+        assert all(j.state == DONE for j in jobs)
+    finally:
+        queue.shutdown()
+
+
+def test_pause_and_resume_a_queued_job():
+    runner = Runner()
+    runner.hold.add("blocker")
+    queue = DownloadQueue(runner, max_workers=1)
+    try:
+        blocker = queue.submit(job("blocker"))
+        waiting = queue.submit(job("waiting"))
+        wait_until(lambda: blocker.state == RUNNING)
+        queue.pause(waiting.id)
+        runner.release.set()
+        wait_until(lambda: blocker.state == DONE)
+        time.sleep(0.05)
+        assert waiting.state == PAUSED and runner.ran == ["blocker"]
+
+        queue.resume(waiting.id)
+        assert queue.join(5)
+        assert waiting.state == DONE
+    finally:
+        queue.shutdown()
+
+
+def test_pause_and_cancel_running_jobs():
+    runner = Runner()
+    runner.hold.update(("paused", "cancelled"))
+    queue = DownloadQueue(runner, max_workers=2)
+    try:
+        paused, cancelled = queue.submit(job("paused")), queue.submit(job("cancelled"))
+        wait_until(lambda: paused.state == RUNNING and cancelled.state == RUNNING)
+        queue.pause(paused.id)
+        queue.cancel(cancelled.id)
+        wait_until(lambda: paused.state == PAUSED and cancelled.state == CANCELLED)
+        assert paused.stop_request is None and cancelled.stop_request is None
+    finally:
+        queue.shutdown()
+
+
+def test_retry_later_requeues_without_a_worker():
+    attempts = []
+
+    def runner(j):
+        attempts.append(time.monotonic())
+        if j.url == "flaky" and len(attempts) < 3:
+            raise RetryLater(0.05, 'network')
+
+    queue = DownloadQueue(runner, max_workers=1)
+    try:
+        flaky = queue.submit(job("flaky"))
+        assert queue.join(5)
+        assert flaky.state == DONE and len(attempts) == 3
+        assert attempts[2] - attempts[1] >= 0.05
+    finally:
+        queue.shutdown()
+
+
+def test_cancel_while_deferred():
+    runs = []
+
+    def runner(j):
+        runs.append(j.url)
+        raise RetryLater(0.2, 'network')
+
+    updates = []
+    queue = DownloadQueue(runner, max_workers=1, on_update=lambda j: updates.append(j.status_text))
+    try:
+        deferred = queue.submit(job("deferred"))
+        wait_until(lambda: runs and deferred.state == QUEUED and deferred.error)
+        assert updates[-1] == "Retrying (network)"
+        queue.cancel(deferred.id)
+        time.sleep(0.3)
+        assert deferred.state == CANCELLED and runs == ["deferred"]
+    finally:
+        queue.shutdown()
+
+
+def test_failures_and_futures():
+    conversion = Future()
+
+    def runner(j):
+        if j.url == "broken":
+            raise ValueError("Video unavailable")
+        return conversion
+
+    queue = DownloadQueue(runner, max_workers=2)
+    try:
+        broken, converted = queue.submit(job("broken")), queue.submit(job("converted"))
+        wait_until(lambda: broken.state == FAILED and converted.state == PROCESSING)
+        assert broken.error == "Video unavailable"
+        conversion.set_result(["out.mp3"])
+        wait_until(lambda: converted.state == DONE)
+        assert converted.percent == 100.0
+    finally:
+        queue.shutdown()
+
+
+def test_shutdown_pauses_unfinished_jobs():
+    runner = Runner()
+    runner.hold.add("running")
+    queue = DownloadQueue(runner, max_workers=1)
+    running = queue.submit(job("running"))
+    waiting = queue.submit(job("waiting"))
+    wait_until(lambda: running.state == RUNNING)
+
+    queue.shutdown()
+    assert queue.join(5)
+    assert running.state == PAUSED and waiting.state == PAUSED
+    assert runner.ran == ["running"]
+
+
+def test_wait_below_wakes_when_a_worker_takes_a_job():
+    runner = Runner()
+    runner.hold.update({"first", "second"})
+    queue = DownloadQueue(runner, max_workers=1)
+    try:
+        first = queue.submit(job("first"))
+        second = queue.submit(job("second"))
+        queue.submit(job("third"))
+        wait_until(lambda: first.state == RUNNING)
+        assert not queue.wait_below(queue.queued_count, 2, timeout=0.05)
+
+        # No timeout: only the queue's notification can end the wait
+        waiter = threading.Thread(target=queue.wait_below, args=(queue.queued_count, 2), daemon=True)
+        waiter.start()
+        runner.hold.discard("first")
+        waiter.join(2)
+        assert not waiter.is_alive()
+        assert second.state == RUNNING
+    finally:
+        runner.release.set()
+        queue.shutdown()
@@ -0,0 +1,90 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from conftest import fake_extractor, fake_ffmpeg, fake_url  # noqa: E402
+from downloader.download_queue import DONE, DownloadJob, DownloadQueue  # noqa: E402
+from downloader.engine import DownloadEngine, is_segmentable  # noqa: E402
+from downloader.library_index import LibraryIndex  # noqa: E402
+from downloader.metadata_cache import MetadataCache  # noqa: E402
+from downloader.postprocess import PostProcessingStage  # noqa: E402
+from downloader.sessions import SessionPool  # noqa: E402
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def make_engine(tmp_path, **kwargs):
+    # The preview picks separate streams to merge, as it does wherever ffmpeg is installed
+    sessions = SessionPool(base_opts={'format': 'bestvideo+bestaudio'}, setup=fake_extractor)
+    cache = MetadataCache(str(tmp_path / "cache.sqlite3"))
+    return DownloadEngine(quiet=True, cache=cache, sessions=sessions, **kwargs)
+
+
+def test_preview_selection_is_not_cached(tmp_path, media_server):
+    engine = make_engine(tmp_path)
+    url = fake_url(media_server, "aaaaaaaaaaa")
+    preview = engine.fetch_info(url)
+    assert preview['title'] == "Video aaaaaaaaaaa"
+
+    cached = engine.cache.get("aaaaaaaaaaa")
+    assert 'requested_formats' not in cached
+    assert 'format_id' not in cached and 'url' not in cached
+    assert len(cached['formats']) == 3
+
+
+def test_download_after_preview_fetches_its_own_format(tmp_path, media_server):
+    engine = make_engine(tmp_path)
+    url = fake_url(media_server, "bbbbbbbbbbb")
+    engine.fetch_info(url)
+    media_server.paths.clear()
+
+    job = DownloadJob(url, str(tmp_path / "out"), "mp4")
+    info = engine.download(job)
+
+    assert info['format_id'] == 'combined'
+    assert media_server.paths and set(media_server.paths) == {"/media/combined.mp4"}
+    assert job.filepath.endswith(".mp4") and os.path.getsize(job.filepath) == 256 * 1024
+
+
+def test_cached_info_stays_segmentable(tmp_path, media_server):
+    engine = make_engine(tmp_path)
+    url = fake_url(media_server, "ccccccccccc")
+    engine.fetch_info(url)
+
+    with engine.sessions.lease({'format': 'best[ext=mp4]', 'quiet': True}) as ydl:
+        info = ydl.process_ie_result(engine.cache.get("ccccccccccc"), download=False)
+    assert info['format_id'] == 'combined'
+    assert is_segmentable(info)
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="fake ffmpeg is a POSIX script")
+def test_mp3_job_converts_a_running_mp4_download(tmp_path, media_server):
+    # Slow enough for the MP3 job to start while the MP4 is still downloading
+    media_server.per_connection_rate = 512 * 1024
+    postprocessing = PostProcessingStage(1, ffmpeg=fake_ffmpeg(tmp_path))
+    engine = make_engine(tmp_path, library=LibraryIndex(str(tmp_path / "library.sqlite3")),
+                         postprocessor=postprocessing)
+    queue = DownloadQueue(engine.download, max_workers=2)
+    url = fake_url(media_server, "ddddddddddd")
+    try:
+        video = queue.submit(DownloadJob(url, str(tmp_path / "out"), "mp4"))
+        wait_until(lambda: media_server.paths)
+        audio = queue.submit(DownloadJob(url, str(tmp_path / "out"), "mp3"))
+        assert queue.join(10)
+    finally:
+        queue.shutdown()
+        postprocessing.shutdown()
+
+    assert video.state == DONE and audio.state == DONE
+    assert "/media/audio.m4a" not in media_server.paths
+    assert os.path.exists(video.filepath)
+    with open(video.filepath, "rb") as f, open(audio.filepath, "rb") as converted:
+        assert converted.read() == b"mp3:" + f.read()
@@ -0,0 +1,20 @@
+import pytest
+
+from downloader.history import HistoryStore
+
+
+def test_first_search_uses_full_text_search(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    store = HistoryStore(path, legacy_path="")
+    store.add({'url': "https://youtu.be/dQw4w9WgXcQ", 'title': "Never Gonna Give You Up"})
+    has_fts = store.has_fts
+    store.close()
+    if not has_fts:
+        pytest.skip("SQLite built without FTS5")
+
+    # A fresh store searched before anything else opened the database;
+    # FTS matches whole words where the LIKE fallback would match "onna"
+    store = HistoryStore(path, legacy_path="")
+    assert store.search("onna") == []
+    assert [entry['title'] for entry in store.search("gonna give")] == ["Never Gonna Give You Up"]
+    store.close()
@@ -0,0 +1,103 @@
+import threading
+
+from downloader.download_queue import DownloadQueue, PAUSED, RUNNING
+from downloader.ingest import Ingestor, OffsetStore, normalize_url
+
+
+def write_list(path, ids):
+    lines = [f"https://youtu.be/{video_id}\n" for video_id in ids]
+    path.write_text("".join(lines))
+    return [len("".join(lines[:i])) for i in range(len(lines) + 1)]
+
+
+class BlockingRunner:
+    """Stands in for the engine: marks jobs started, then waits to be let go"""
+    def __init__(self):
+        self.gate = threading.Event()
+        self.running = threading.Event()
+
+    def __call__(self, job):
+        job.started = True
+        self.running.set()
+        self.gate.wait(5)
+
+
+def test_offsets_hold_at_jobs_paused_before_starting(tmp_path):
+    path = tmp_path / "urls.txt"
+    offsets = write_list(path, ["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc"])
+    runner = BlockingRunner()
+    queue = DownloadQueue(runner, max_workers=1)
+    store_path = str(tmp_path / "offsets.json")
+    ingestor = Ingestor(queue.submit, offsets=OffsetStore(store_path))
+    try:
+        counts = ingestor.ingest(str(path), str(tmp_path))
+        assert counts['queued'] == 3
+        assert runner.running.wait(5)
+        first, second, third = sorted(queue.jobs(), key=lambda job: job.created)
+        assert first.state == RUNNING
+
+        queue.pause(second.id)
+        assert second.state == PAUSED
+        ingestor.commit()
+        assert OffsetStore(store_path).get(str(path)) == offsets[1]
+
+        # After a restart the paused line and everything after it are read again
+        waiting = []
+        again = Ingestor(waiting.append, offsets=OffsetStore(store_path))
+        assert again.ingest(str(path), str(tmp_path))['queued'] == 2
+        assert [job.url for job in waiting] == [normalize_url("https://youtu.be/bbbbbbbbbbb"),
+                                               normalize_url("https://youtu.be/ccccccccccc")]
+
+        # Cancelled jobs let the offset move on
+        queue.cancel(second.id)
+        queue.cancel(third.id)
+        ingestor.commit()
+        assert OffsetStore(store_path).get(str(path)) == offsets[3]
+    finally:
+        runner.gate.set()
+        queue.shutdown()
+
+
+def test_appended_lines_only(tmp_path):
+    path = tmp_path / "urls.txt"
+    write_list(path, ["aaaaaaaaaaa"])
+    jobs = []
+
+    def started(job):
+        job.started = True
+        jobs.append(job)
+
+    ingestor = Ingestor(started, offsets=OffsetStore(str(tmp_path / "offsets.json")))
+    assert ingestor.ingest(str(path), str(tmp_path))['queued'] == 1
+    with open(path, "a") as f:
+        f.write("https://youtu.be/bbbbbbbbbbb\n# comment\nhttps://youtu.be/aaaaaaaaaaa\n")
+    counts = ingestor.ingest(str(path), str(tmp_path))
+    assert counts['lines'] == 3 and counts['queued'] == 1 and counts['duplicates'] == 1
+    assert len(jobs) == 2
+
+
+def test_reading_waits_for_room_in_the_queue(tmp_path):
+    path = tmp_path / "urls.txt"
+    write_list(path, [f"{i:011d}" for i in range(5)])
+    runner = BlockingRunner()
+    queue = DownloadQueue(runner, max_workers=1)
+    ingestor = Ingestor(queue.submit, offsets=OffsetStore(str(tmp_path / "offsets.json")), queue=queue,
+                        max_backlog=2)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(ingestor.ingest(str(path), str(tmp_path))))
+    try:
+        reader.start()
+        assert runner.running.wait(5)
+        reader.join(0.3)
+        assert reader.is_alive()
+        assert queue.pending_count() == 2
+
+        # Finishing jobs wakes the reader, which queues the rest as room appears
+        runner.gate.set()
+        reader.join(5)
+        assert not reader.is_alive()
+        assert results[0]['queued'] == 5
+        assert queue.join(5)
+    finally:
+        runner.gate.set()
+        queue.shutdown()
@@ -0,0 +1,21 @@
+import os
+
+from downloader.library_index import LibraryIndex
+
+
+def test_renamed_download_is_relinked_by_its_hash(tmp_path):
+    library = LibraryIndex(str(tmp_path / "library.sqlite3"))
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    original = downloads / "Some video.mp4"
+    original.write_bytes(b"video" * 1000)
+    (downloads / "Other video.mp4").write_bytes(b"other" * 1000)
+    library.record(str(original), "dQw4w9WgXcQ", "mp4")
+
+    renamed = downloads / "Renamed.mp4"
+    os.rename(original, renamed)
+
+    assert library.lookup("dQw4w9WgXcQ", "mp4") == str(renamed)
+    assert library.lookup("dQw4w9WgXcQ", "mp3") is None
+    assert library.lookup("aaaaaaaaaaa", "mp4") is None
+    library.close()
@@ -0,0 +1,112 @@
+import os
+from collections import namedtuple
+
+import pytest
+
+from downloader import output
+from downloader.download_queue import DownloadJob
+from downloader.output import (MB, OutOfSpaceError, OutputManager, SHRINK_STEP, estimate_size, incomplete_dir,
+                               parse_size)
+
+Usage = namedtuple('Usage', 'total used free')
+
+
+@pytest.fixture
+def disks(tmp_path, monkeypatch):
+    """Two directories with made-up free space, set through the returned dict"""
+    free = {str(tmp_path / "small"): 40 * MB, str(tmp_path / "big"): 400 * MB}
+    monkeypatch.setattr(output.shutil, 'disk_usage', lambda path: Usage(0, 0, free[os.path.abspath(path)]))
+    return free
+
+
+def info(size, **fields):
+    return dict({'id': "aaaaaaaaaaa", 'filesize': size}, **fields)
+
+
+def test_estimate_size():
+    assert estimate_size(info(10)) == 10
+    assert estimate_size({'filesize_approx': 100}) == 110
+    assert estimate_size({'requested_formats': [{'filesize': 10}, {'filesize_approx': 10}]}) == 42
+    assert estimate_size(info(10, duration=10), "mp3") == 10 + 240000
+    assert estimate_size({'requested_formats': [{'filesize': 10}, {}]}) is None
+
+
+def test_parse_size():
+    assert parse_size("5G") == 5 * 1024 * MB
+    assert parse_size("500M") == 500 * MB
+    assert parse_size("1.5") == int(1.5 * 1024 * MB)
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_reserve_holds_space_until_release(disks):
+    small = next(d for d in disks if d.endswith("small"))
+    manager = OutputManager(headroom=4 * MB)
+    job = DownloadJob("u", small)
+    manager.place(job)
+    assert manager.reserve(job, info(24 * MB)) is False
+
+    placeholder = os.path.join(incomplete_dir(small), f"{job.id}.reserve")
+    assert os.path.getsize(placeholder) == 24 * MB - SHRINK_STEP
+    # The placeholder takes its space from the disk; the rest is claimed in the accounting
+    disks[small] -= os.path.getsize(placeholder)
+    assert manager._room(manager._volume(small)) == 40 * MB - 4 * MB - 24 * MB
+
+    other = DownloadJob("v", small)
+    with pytest.raises(OutOfSpaceError, match="needs 24 MB"):
+        manager.reserve(other, info(24 * MB))
+
+    manager.progress(job, {'status': 'downloading', 'downloaded_bytes': 12 * MB, 'filename': "a.part"})
+    assert os.path.getsize(placeholder) == 24 * MB - 12 * MB - SHRINK_STEP
+
+    manager.release(job)
+    assert not os.path.exists(placeholder)
+    assert manager.stats()[0]['active'] == 0
+
+
+def test_job_moves_to_a_volume_with_room(disks):
+    small, big = sorted(disks, key=lambda d: d.endswith("small"), reverse=True)
+    manager = OutputManager([big], headroom=4 * MB, preallocate=False)
+    # The small disk looks fastest, so it is picked first
+    manager._volume(small).throughput = 100 * MB
+    manager._volume(big).throughput = 1 * MB
+    job = DownloadJob("u", small)
+    assert manager.place(job) == small
+
+    assert manager.reserve(job, info(100 * MB)) is True
+    assert job.download_dir == big
+    # The retried attempt places the job by the size it needs, then fits
+    assert manager.place(job) == big
+    assert manager.reserve(job, info(100 * MB)) is False
+    manager.release(job)
+
+
+def test_moved_job_can_go_back_to_its_own_directory(disks):
+    small, big = sorted(disks, key=lambda d: d.endswith("small"), reverse=True)
+    manager = OutputManager([small], headroom=4 * MB, preallocate=False)
+    manager._volume(small).throughput = 100 * MB
+    manager._volume(big).throughput = 1 * MB
+    job = DownloadJob("u", big)
+    assert manager.place(job) == small
+    assert manager.reserve(job, info(100 * MB)) is True
+    assert job.download_dir == big
+
+
+def test_nowhere_to_go(disks):
+    small = next(d for d in disks if d.endswith("small"))
+    manager = OutputManager(headroom=4 * MB)
+    job = DownloadJob("u", small)
+    manager.place(job)
+    with pytest.raises(OutOfSpaceError, match="Not enough space"):
+        manager.reserve(job, info(100 * MB))
+    with pytest.raises(OutOfSpaceError):
+        manager.place(job, 100 * MB)
+
+
+def test_stale_placeholders_are_cleaned(disks):
+    small = next(d for d in disks if d.endswith("small"))
+    os.makedirs(incomplete_dir(small))
+    stale = os.path.join(incomplete_dir(small), "old.reserve")
+    open(stale, "wb").close()
+    OutputManager(headroom=4 * MB).place(DownloadJob("u", small), 0)
+    assert not os.path.exists(stale)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from downloader.download_queue import DownloadQueue
+from downloader.playlist import PlaylistExpander
+
+
+class FakeEngine:
+    def __init__(self):
+        self.fetched = []
+
+    def fetch_info(self, url):
+        self.fetched.append(url)
+        return {'title': url[-11:]}
+
+
+class ListExpander(PlaylistExpander):
+    def __init__(self, entries, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.entries = entries
+
+    def iter_entries(self, url):
+        return iter(self.entries)
+
+
+def entries(count):
+    return [{'id': f"v{i:010d}", 'title': str(i)} for i in range(count)]
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def started(queue):
+    return len(queue.jobs()) - queue.queued_count()
+
+
+def test_resolving_stays_a_bounded_window_ahead_of_the_queue():
+    engine = FakeEngine()
+    # The single worker takes a job each time the test releases one
+    release = threading.Semaphore(0)
+    queue = DownloadQueue(lambda job: release.acquire(), max_workers=1)
+    expander = ListExpander(entries(200), engine, queue.submit, max_resolvers=2, queue=queue, max_backlog=5)
+    thread = threading.Thread(target=expander.expand, args=("playlist", "/tmp"))
+    thread.start()
+
+    wait_until(lambda: queue.queued_count() >= 5)
+    time.sleep(0.3)
+    assert len(engine.fetched) <= 5 + 2 + 1
+
+    # Entries are resolved as the worker makes room
+    while thread.is_alive():
+        assert len(engine.fetched) - started(queue) <= 5 + 2
+        release.release()
+        time.sleep(0.001)
+    thread.join()
+    while not queue.join(0.01):
+        release.release()
+    assert expander.queued == 200
+    assert len(set(engine.fetched)) == len(engine.fetched) == 200
+    queue.shutdown()
+
+
+def test_cancel_while_waiting_for_room():
+    engine = FakeEngine()
+    release = threading.Event()
+    queue = DownloadQueue(lambda job: release.wait(), max_workers=1)
+    expander = ListExpander(entries(50), engine, queue.submit, queue=queue, max_backlog=3)
+    thread = threading.Thread(target=expander.expand, args=("playlist", "/tmp"))
+    thread.start()
+    wait_until(lambda: queue.queued_count() >= 3)
+    expander.cancel()
+    thread.join(2)
+    assert not thread.is_alive()
+    assert expander.queued < 50
+    queue.shutdown()
+    release.set()
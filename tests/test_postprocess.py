@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from conftest import fake_ffmpeg
+from downloader.postprocess import PostProcessingError, PostProcessingStage, mp3_output
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="fake ffmpeg is a POSIX script")
+
+
+class Job:
+    stop_request = None
+    percent = 0.0
+    progress = None
+
+
+def test_conversion_replaces_output_and_removes_source(tmp_path):
+    source = tmp_path / "video.m4a"
+    source.write_bytes(b"audio")
+    progress = []
+    stage = PostProcessingStage(1, ffmpeg=fake_ffmpeg(tmp_path), on_progress=lambda job, p: progress.append(p))
+    path, args = mp3_output(str(source))
+    done = []
+    try:
+        result = stage.submit(Job(), str(source), [(path, args)], duration=10, then=lambda: done.append(1)).result(5)
+    finally:
+        stage.shutdown()
+
+    assert result == [path]
+    assert open(path, "rb").read() == b"mp3:audio"
+    assert not source.exists() and done == [1]
+    assert [p['percent'] for p in progress] == [50.0, 100.0]
+    assert os.listdir(tmp_path / ".incomplete") == []
+
+
+def test_failed_conversion_keeps_source(tmp_path):
+    source = tmp_path / "video.m4a"
+    source.write_bytes(b"audio")
+    stage = PostProcessingStage(1, ffmpeg=fake_ffmpeg(tmp_path, fail=True))
+    path, args = mp3_output(str(source))
+    try:
+        with pytest.raises(PostProcessingError, match="Invalid data"):
+            stage.submit(Job(), str(source), [(path, args)]).result(5)
+    finally:
+        stage.shutdown()
+    assert source.exists() and not os.path.exists(path)
+
+
+def test_stopped_job_is_not_converted(tmp_path):
+    source = tmp_path / "video.m4a"
+    source.write_bytes(b"audio")
+    job = Job()
+    job.stop_request = "cancelled"
+    stage = PostProcessingStage(1, ffmpeg=fake_ffmpeg(tmp_path))
+    try:
+        future = stage.submit(job, str(source), [mp3_output(str(source))])
+        assert future.exception(5) is not None
+    finally:
+        stage.shutdown()
+    assert source.exists()
@@ -0,0 +1,121 @@
+import pytest
+
+from downloader.download_queue import DownloadJob, RetryLater
+from downloader.retry import CircuitBreaker, RetryPolicy, host_of
+
+PAGE = "https://www.youtube.com/watch?v=aaaaaaaaaaa"
+CDN_A = "https://rr1---sn-aaa.googlevideo.com/videoplayback?id=1"
+CDN_B = "https://rr2---sn-bbb.googlevideo.com/videoplayback?id=2"
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    assert breaker.allow(now=0) == 0
+    breaker.failure(now=0)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.failure(now=1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow(now=11) == pytest.approx(20)
+
+
+def test_half_open_trial_success_closes():
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.failure(now=0)
+    assert breaker.allow(now=30, owner="trial") == 0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one trial at a time
+    assert breaker.allow(now=31, owner="other") >= 1
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow(now=32, owner="other") == 0
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.failure(now=0)
+    breaker.allow(now=30, owner="trial")
+    breaker.failure(now=31)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow(now=40, owner="other") == pytest.approx(21)
+    assert breaker.allow(now=61, owner="other") == 0
+
+
+def test_released_trial_lets_the_next_one_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.failure(now=0)
+    breaker.allow(now=30, owner="trial")
+    # Someone else's release does not end the trial
+    breaker.release("other")
+    assert breaker.allow(now=31, owner="other") >= 1
+    breaker.release("trial")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow(now=32, owner="other") == 0
+
+
+def failing_policy():
+    policy = RetryPolicy(attempts=10, breaker_threshold=2, breaker_cooldown=0)
+    for _ in range(2):
+        job = DownloadJob(PAGE, "/tmp")
+        policy.admit(job)
+        policy.admit(job, [CDN_A])
+        assert policy.failed(job, ConnectionResetError("Connection reset by peer")) is not None
+        policy.settle(job)
+    return policy
+
+
+def test_failures_count_against_the_media_host():
+    policy = failing_policy()
+    assert policy.breaker(CDN_A).state == CircuitBreaker.OPEN
+    assert policy.breaker(PAGE).state == CircuitBreaker.CLOSED
+    assert policy.breaker(CDN_B).state == CircuitBreaker.CLOSED
+
+    # Other videos, served from other CDN nodes, are not held back
+    job = DownloadJob(PAGE, "/tmp")
+    policy.admit(job)
+    policy.admit(job, [CDN_B])
+    policy.succeeded(job)
+    policy.settle(job)
+
+
+def test_permanent_error_in_half_open_trial_does_not_block_the_host():
+    policy = failing_policy()
+    trial = DownloadJob(PAGE, "/tmp")
+    policy.admit(trial)
+    policy.admit(trial, [CDN_A])
+    assert policy.breaker(CDN_A).state == CircuitBreaker.HALF_OPEN
+    assert policy.failed(trial, Exception("Video unavailable")) is None
+    policy.settle(trial)
+
+    job = DownloadJob(PAGE, "/tmp")
+    policy.admit(job)
+    policy.admit(job, [CDN_A])
+    policy.succeeded(job)
+    policy.settle(job)
+    assert policy.breaker(CDN_A).state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_defers_jobs():
+    policy = RetryPolicy(breaker_threshold=1, breaker_cooldown=60)
+    job = DownloadJob(PAGE, "/tmp")
+    policy.admit(job)
+    policy.admit(job, [CDN_A])
+    policy.failed(job, ConnectionResetError("Connection reset by peer"))
+    policy.settle(job)
+
+    with pytest.raises(RetryLater) as raised:
+        policy.admit(job, [CDN_A])
+    assert raised.value.reason == 'circuit_open' and host_of(CDN_A) in str(raised.value)
+    policy.settle(job)
+
+
+def test_call_releases_its_trial_on_permanent_errors():
+    policy = RetryPolicy(breaker_threshold=1, breaker_cooldown=0)
+    policy.breaker(PAGE).failure()
+
+    def unavailable():
+        raise Exception("Video unavailable")
+
+    with pytest.raises(Exception, match="unavailable"):
+        policy.call(PAGE, unavailable)
+    assert policy.call(PAGE, lambda: "info") == "info"
+    assert policy.breaker(PAGE).state == CircuitBreaker.CLOSED
@@ -0,0 +1,76 @@
+import json
+import os
+
+import pytest
+
+from benchmarks.server import synthetic_bytes
+from downloader.segmented import SegmentedDownload, SegmentError
+
+SIZE = 4 * 1024 * 1024
+
+
+class FaultyDownload(SegmentedDownload):
+    """Fails writes with a connection reset once ``fail_after`` bytes were written"""
+    def __init__(self, *args, fail_after, failures=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_after = fail_after
+        self.failures = failures
+        self.written = 0
+
+    def _write(self, fd, data, offset):
+        with self._lock:
+            fail = self.failures and self.written >= self.fail_after
+            if fail:
+                self.failures -= 1
+            else:
+                self.written += len(data)
+        if fail:
+            raise ConnectionResetError("injected")
+        super()._write(fd, data, offset)
+
+
+@pytest.fixture
+def server(media_server):
+    media_server.size = SIZE
+    return media_server
+
+
+def segmented(cls, server, path, **kwargs):
+    reports = []
+    download = cls(server.url(), str(path), connections=2, min_segment_size=1024 * 1024,
+                   progress=lambda downloaded, total, speed: reports.append(downloaded), **kwargs)
+    return download, reports
+
+
+def test_retried_segment_resumes_without_counting_twice(tmp_path, server):
+    path = tmp_path / "video.mp4"
+    charged = []
+    download, reports = segmented(FaultyDownload, server, path, fail_after=1536 * 1024,
+                                  throttle=lambda nbytes, check: charged.append(nbytes))
+    transfer = download.run()
+
+    assert transfer['retries'] == 1
+    assert download._downloaded == SIZE
+    assert max(reports) == SIZE
+    assert sum(charged) == SIZE
+    assert path.read_bytes() == synthetic_bytes(0, SIZE)
+
+
+def test_failed_download_resumes_from_checkpointed_positions(tmp_path, server):
+    path = tmp_path / "video.mp4"
+    download, _ = segmented(FaultyDownload, server, path, fail_after=1536 * 1024, failures=10, retries=0)
+    with pytest.raises(SegmentError):
+        download.run()
+
+    with open(str(path) + ".part.segments") as f:
+        state = json.load(f)
+    saved = sum(position - download._segments[int(index)][0] for index, position in state['positions'].items())
+    saved += sum(end - start + 1 for index, (start, end) in enumerate(download._segments) if index in state['done'])
+    assert 0 < saved == download._downloaded < SIZE
+
+    resumed, reports = segmented(SegmentedDownload, server, path)
+    transfer = resumed.run()
+    assert transfer['fetched_bytes'] == SIZE - saved
+    assert max(reports) == SIZE
+    assert path.read_bytes() == synthetic_bytes(0, SIZE)
+    assert not os.path.exists(str(path) + ".part.segments")
@@ -0,0 +1,149 @@
+import threading
+from io import BytesIO
+
+import pytest
+
+from benchmarks.server import MediaRequestHandler, MediaServer
+from downloader.thumbnails import THUMBNAIL_SIZE, ThumbnailService
+
+Image = pytest.importorskip("PIL.Image")
+
+ETAG = '"thumb-1"'
+LAST_MODIFIED = "Mon, 05 Oct 2026 12:00:00 GMT"
+
+
+class ThumbnailHandler(MediaRequestHandler):
+    """Serves one JPEG with validators, answering 304 when the client already has it"""
+    def _serve(self, send_body):
+        server = self.server
+        server.seen.append((self.path, self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')))
+        server.gate.wait(5)
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.send_header('Content-Length', "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', server.content_type)
+        self.send_header('Content-Length', str(len(server.image)))
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(server.image)
+
+
+@pytest.fixture
+def server():
+    image = BytesIO()
+    Image.new('RGB', (640, 360), (200, 30, 30)).save(image, "JPEG")
+    server = MediaServer(content_type="image/jpeg")
+    server.RequestHandlerClass = ThumbnailHandler
+    server.image = image.getvalue()
+    server.seen = []
+    server.gate = threading.Event()
+    server.gate.set()
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def services(tmp_path):
+    """Makes services sharing one disk cache, closing them afterwards"""
+    created = []
+
+    def make(**kwargs):
+        service = ThumbnailService(cache_dir=str(tmp_path / "thumbnails"), **kwargs)
+        created.append(service)
+        return service
+
+    yield make
+    for service in created:
+        service.close()
+
+
+def load(service, url):
+    delivered = threading.Event()
+    images = []
+    service.request(url, lambda image, token: (images.append(image), delivered.set()))
+    assert delivered.wait(10)
+    return images[0]
+
+
+def offline(monkeypatch, service):
+    """Fail the test if ``service`` touches the network or decodes a download"""
+    def fail(*args, **kwargs):
+        raise AssertionError("unexpected network or decode work")
+    monkeypatch.setattr(service, '_get', fail)
+    monkeypatch.setattr(service, '_decode', fail)
+
+
+def drain(service):
+    """Wait until every load already submitted to the (single worker) pool has finished"""
+    service._executor.submit(lambda: None).result(10)
+
+
+def test_fresh_disk_cache_is_used_without_the_network(server, services, monkeypatch):
+    url = server.url("/vi/abc/hqdefault.jpg")
+    load(services(), url)
+
+    cached = services()
+    offline(monkeypatch, cached)
+    image = load(cached, url)
+
+    assert image.size == THUMBNAIL_SIZE
+    assert len(server.seen) == 1
+    assert cached.stats == {'memory_hits': 0, 'disk_hits': 1, 'revalidated': 0, 'downloads': 0}
+
+
+def test_stale_disk_cache_is_revalidated(server, services, monkeypatch):
+    url = server.url("/vi/abc/hqdefault.jpg")
+    load(services(), url)
+
+    stale = services(max_age=0)
+    monkeypatch.setattr(stale, '_decode', lambda data: pytest.fail("an unchanged thumbnail was decoded"))
+    image = load(stale, url)
+
+    assert image.size == THUMBNAIL_SIZE
+    assert server.seen[-1] == ("/vi/abc/hqdefault.jpg", ETAG, LAST_MODIFIED)
+    assert stale.stats == {'memory_hits': 0, 'disk_hits': 0, 'revalidated': 1, 'downloads': 0}
+
+
+def test_memory_hit_is_delivered_immediately(server, services, monkeypatch):
+    url = server.url("/vi/abc/hqdefault.jpg")
+    service = services()
+    first = load(service, url)
+
+    offline(monkeypatch, service)
+    monkeypatch.setattr(service, '_open_cached', lambda path: pytest.fail("the disk cache was read"))
+    delivered = []
+    service.request(url, lambda image, token: delivered.append(image))
+
+    assert len(delivered) == 1 and delivered[0] is first
+    assert len(server.seen) == 1
+    assert service.stats['memory_hits'] == 1
+    assert service.stats['downloads'] == 1
+
+
+def test_superseded_and_cancelled_requests_are_dropped(server, services):
+    service = services(max_workers=1)
+    delivered = []
+    server.gate.clear()
+    old = service.request(server.url("/vi/old/hqdefault.jpg"), lambda image, token: delivered.append(token))
+    new = service.request(server.url("/vi/new/hqdefault.jpg"), lambda image, token: delivered.append(token))
+    server.gate.set()
+    drain(service)
+
+    assert old != new
+    assert delivered == [new]
+
+    server.gate.clear()
+    service.request(server.url("/vi/cancelled/hqdefault.jpg"), lambda image, token: delivered.append(token))
+    service.cancel()
+    server.gate.set()
+    drain(service)
+
+    assert delivered == [new]